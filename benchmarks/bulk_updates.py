@@ -0,0 +1,49 @@
+"""
+Soft delete n rows with the chunked IN (...) updates and with a single
+UPDATE joined to the staged pks, to find the crossover point which
+PERMANENT_BULK_UPDATE_THRESHOLD should be set to.
+
+    python benchmarks/bulk_updates.py [max rows]
+"""
+import sys
+
+from utils import bench, setup
+
+
+SIZES = (100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000, 1000000)
+
+
+def main(rows=100000):
+    setup()
+    from django.db import transaction
+    from django.utils.timezone import now
+    from django_permanent.bulk import update_batch, update_staged
+    from django_permanent.tests.test_app.models import MyPermanentModel
+
+    MyPermanentModel.objects.bulk_create(
+        [MyPermanentModel() for _ in range(rows)], batch_size=10000
+    )
+    pks = list(MyPermanentModel.objects.values_list('pk', flat=True))
+    values = {'removed': now()}
+
+    def run(strategy, pk_list):
+        def func():
+            with transaction.atomic():
+                strategy(MyPermanentModel, pk_list, values, 'default')
+                transaction.set_rollback(True)
+        return func
+
+    for size in SIZES:
+        if size > rows:
+            break
+        pk_list = pks[:size]
+        number = max(1, 10000 // size)
+        batch = bench('%d rows: IN (...) chunks' % size,
+                      run(update_batch, pk_list), number, 3)
+        staged = bench('%d rows: staged' % size,
+                       run(update_staged, pk_list), number, 3)
+        print('%d rows: staged/chunks %.2f' % (size, staged / batch))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
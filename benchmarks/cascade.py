@@ -0,0 +1,91 @@
+"""
+Collect and soft delete a model with dozens of reverse relations, with
+the precomputed cascade plans and with per-call _meta introspection.
+
+    python benchmarks/cascade.py [relations]
+"""
+import sys
+from contextlib import contextmanager
+
+from utils import bench, setup
+
+
+def create_models(relations):
+    from django.db import connection, models
+    from django_permanent.models import PermanentModel
+
+    class Hub(PermanentModel):
+        class Meta:
+            app_label = 'django_permanent'
+
+    children = []
+    for i in range(relations):
+        # Half of the children are permanent, half set null
+        base = PermanentModel if i % 2 else models.Model
+        on_delete = models.CASCADE if i % 2 else models.SET_NULL
+        children.append(type('HubChild%d' % i, (base,), {
+            '__module__': __name__,
+            'hub': models.ForeignKey(Hub, on_delete=on_delete, null=True),
+            'Meta': type('Meta', (), {'app_label': 'django_permanent'}),
+        }))
+    with connection.schema_editor() as editor:
+        for model in [Hub] + children:
+            editor.create_model(model)
+    return Hub, children
+
+
+@contextmanager
+def introspection():
+    """Collect with the unpatched Django relation discovery."""
+    from django.db.models import deletion
+    from django.db.models.deletion import Collector
+    from django_permanent import cascade
+    from django_permanent import deletion as permanent_deletion
+
+    patched = (
+        deletion.get_candidate_relations_to_delete,
+        Collector.can_fast_delete,
+    )
+    deletion.get_candidate_relations_to_delete = (
+        cascade.get_candidate_relations_to_delete
+    )
+    Collector.can_fast_delete = permanent_deletion._can_fast_delete
+    try:
+        yield
+    finally:
+        (deletion.get_candidate_relations_to_delete,
+         Collector.can_fast_delete) = patched
+
+
+def main(relations=40):
+    setup()
+    from django.db import transaction
+    from django.db.models.deletion import Collector
+    from django_permanent.cascade import CascadePlan, clear_plans, get_plan
+
+    Hub, children = create_models(relations)
+    hub = Hub.objects.create()
+    for model in children:
+        model.objects.create(hub=hub)
+
+    def collect():
+        Collector(using='default').collect([hub])
+
+    def delete():
+        with transaction.atomic():
+            hub.delete()
+            transaction.set_rollback(True)
+
+    bench('build plan (%d relations)' % relations,
+          lambda: CascadePlan(Hub), 100)
+    bench('cached plan lookup', lambda: get_plan(Hub), 10000)
+    clear_plans()
+    bench('collect: plan', collect, 100)
+    bench('delete: plan', delete, 20)
+    with introspection():
+        bench('collect: introspection', collect, 100)
+        bench('delete: introspection', delete, 20)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
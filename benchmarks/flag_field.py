@@ -0,0 +1,75 @@
+"""
+Compare the timestamp marker with the dual-column mode: size of the
+marker indexes and speed of the live / deleted scans, with 10% of the
+rows deleted. Every mode runs in a process of its own.
+
+    python benchmarks/flag_field.py [rows]
+"""
+import os
+import subprocess
+import sys
+
+from utils import bench, setup
+
+
+MODES = (('timestamp', None), ('flag', 'is_removed'))
+
+
+def index_size(connection, sql):
+    """Return the size in KiB of the index created by sql."""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        before = cursor.fetchone()[0]
+        cursor.execute(sql)
+        cursor.execute('PRAGMA page_count')
+        after = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return (after - before) * cursor.fetchone()[0] / 1024
+
+
+def run(mode, rows):
+    flag = dict(MODES)[mode]
+    setup(PERMANENT_FLAG_FIELD=flag) if flag else setup()
+    from django.db import connection
+    from django.utils.timezone import now
+    from django_permanent import settings
+    from django_permanent.tests.test_app.models import MyPermanentModel
+
+    removed = now()
+    MyPermanentModel.objects.bulk_create([
+        MyPermanentModel(removed=removed if i % 10 == 0 else None)
+        for i in range(rows)
+    ], batch_size=10000)
+
+    table = MyPermanentModel._meta.db_table
+    column = settings.LOOKUP_FIELD
+    deleted = '"%s" IS NOT NULL' % column if not flag else '"%s"' % column
+    print('%s: full index %.0f KiB, partial index of deleted rows %.0f KiB'
+          % (mode, index_size(connection, 'CREATE INDEX full_marker ON '
+                              '"%s" ("%s")' % (table, column)),
+             index_size(connection, 'CREATE INDEX deleted_marker ON '
+                        '"%s" ("%s") WHERE %s' % (table, column, deleted))))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    bench('%s: objects.count()' % mode,
+          lambda: MyPermanentModel.objects.count(), 20)
+    bench('%s: deleted_objects.count()' % mode,
+          lambda: MyPermanentModel.deleted_objects.count(), 20)
+    bench('%s: deleted_objects page' % mode,
+          lambda: list(MyPermanentModel.deleted_objects.order_by('pk')[:100]),
+          20)
+
+
+def main(rows=200000):
+    if os.environ.get('BENCH_MODE'):
+        return run(os.environ['BENCH_MODE'], rows)
+    for mode, flag in MODES:
+        subprocess.run(
+            [sys.executable, __file__, str(rows)], check=True,
+            env=dict(os.environ, BENCH_MODE=mode)
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
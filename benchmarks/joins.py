@@ -0,0 +1,61 @@
+"""
+Compile and run multi-join queries over PermanentModel relations.
+
+    python benchmarks/joins.py [parents]
+"""
+import sys
+
+from utils import bench, setup
+
+
+def main(parents=1000):
+    setup()
+    from django.utils.timezone import now
+    from django_permanent.tests.test_app.models import (
+        CountedChild, CountedNullableChild, CountedParent, M2MFrom, M2MTo,
+        PermanentM2MThrough,
+    )
+
+    removed = now()
+    CountedParent.objects.bulk_create([
+        CountedParent(removed=removed if i % 10 == 0 else None)
+        for i in range(parents)
+    ])
+    pks = list(CountedParent.all_objects.values_list('pk', flat=True))
+    for model in (CountedChild, CountedNullableChild):
+        model.objects.bulk_create([
+            model(parent_id=pk, removed=removed if i % 3 == 0 else None)
+            for pk in pks for i in range(10)
+        ])
+    M2MFrom.objects.bulk_create([M2MFrom() for _ in range(parents)])
+    M2MTo.objects.bulk_create([M2MTo() for _ in range(parents)])
+    PermanentM2MThrough.objects.bulk_create([
+        PermanentM2MThrough(
+            m2m_from_id=i + 1, m2m_to_id=(i * 7) % parents + 1,
+            removed=removed if i % 5 == 0 else None
+        )
+        for i in range(parents)
+    ])
+
+    queries = {
+        'forward join': lambda: CountedChild.objects.filter(
+            parent__live_children=0
+        ),
+        'reverse join': lambda: CountedParent.objects.filter(
+            countedchild__name__isnull=True
+        ).distinct(),
+        'chained joins': lambda: CountedChild.objects.filter(
+            parent__countednullablechild__isnull=False
+        ),
+        'm2m join': lambda: M2MTo.objects.filter(m2m_from__id__gt=0),
+        'select_related': lambda: CountedChild.objects.select_related(
+            'parent'
+        ),
+    }
+    for name, queryset in queries.items():
+        bench('%s: compile' % name, lambda: str(queryset().query), 1000)
+        bench('%s: count' % name, lambda: queryset().count(), 10)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,259 @@
+"""
+Run creates with restore_on_create, cascading soft deletes, restores and
+reads of the test models from concurrent threads against a file based
+SQLite database in WAL mode. Print the throughput, the time lost waiting
+for locks and the invariant violations: names with several rows, which
+get_restore_or_create() should prevent, and live children of deleted
+parents, which the cascade should prevent. Exit with status 1 when an
+invariant is violated.
+
+    python benchmarks/stress.py [--threads 8] [--seconds 10] [--keys 20]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from utils import setup
+
+
+# Operations and their weights
+WORKLOAD = {
+    'create': 20,
+    'delete': 10,
+    'restore': 10,
+    'attach': 15,
+    'delete_parent': 5,
+    'restore_parent': 5,
+    'read': 35,
+}
+
+
+def operations():
+    from django_permanent.tests.test_app.models import (
+        MyPermanentModel, PermanentDepended, RestoreOnCreateModel
+    )
+
+    def attach(key):
+        parent = MyPermanentModel.objects.filter(name=key).first()
+        if parent is not None:
+            PermanentDepended.objects.create(dependence=parent)
+
+    def read(key):
+        RestoreOnCreateModel.objects.filter(name=key).count()
+        list(PermanentDepended.objects.select_related('dependence').filter(
+            dependence__name=key
+        )[:50])
+
+    return {
+        'create': lambda key: RestoreOnCreateModel.objects.create(name=key),
+        'delete': lambda key: RestoreOnCreateModel.objects.filter(
+            name=key
+        ).delete(),
+        'restore': lambda key: RestoreOnCreateModel.deleted_objects.filter(
+            name=key
+        ).restore(),
+        'attach': attach,
+        'delete_parent': lambda key: MyPermanentModel.objects.filter(
+            name=key
+        ).delete(),
+        'restore_parent': lambda key: MyPermanentModel.deleted_objects.filter(
+            name=key
+        ).restore(),
+        'read': read,
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.ops = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.lock_errors = 0
+        self.lock_wait = 0.0
+        self.examples = {}
+
+    def merge(self, other):
+        for name in other.ops:
+            self.ops[name] += other.ops[name]
+            self.errors[name] += other.errors[name]
+            self.seconds[name] += other.seconds[name]
+        self.lock_errors += other.lock_errors
+        self.lock_wait += other.lock_wait
+        self.examples.update(other.examples)
+
+
+def is_locked(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def worker(seed, deadline, args, stats):
+    from django.db import OperationalError, connections
+
+    rng = random.Random(seed)
+    funcs = operations()
+    names, weights = zip(*WORKLOAD.items())
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            key = str(rng.randrange(args.keys))
+            started = time.perf_counter()
+            for attempt in range(args.retries):
+                attempt_started = time.perf_counter()
+                try:
+                    funcs[name](key)
+                    break
+                except OperationalError as e:
+                    if not is_locked(e):
+                        stats.errors[name] += 1
+                        stats.examples[name] = repr(e)
+                        break
+                    stats.lock_errors += 1
+                    time.sleep(rng.uniform(0, args.backoff))
+                    stats.lock_wait += time.perf_counter() - attempt_started
+                except Exception as e:
+                    stats.errors[name] += 1
+                    stats.examples[name] = repr(e)
+                    break
+            else:
+                stats.errors[name] += 1
+                stats.examples[name] = 'gave up after %d locked attempts' % (
+                    args.retries
+                )
+            stats.ops[name] += 1
+            stats.seconds[name] += time.perf_counter() - started
+    finally:
+        connections.close_all()
+
+
+def violations():
+    from django.db.models import Count
+    from django_permanent.tests.test_app.models import (
+        MyPermanentModel, PermanentDepended, RestoreOnCreateModel
+    )
+
+    def duplicates(queryset):
+        return queryset.values('name').annotate(
+            rows=Count('pk')
+        ).filter(rows__gt=1).count()
+
+    return {
+        'names with several live rows': duplicates(
+            RestoreOnCreateModel.objects.all()
+        ),
+        'names with several rows': duplicates(
+            RestoreOnCreateModel.all_objects.all()
+        ),
+        'live children of deleted parents': PermanentDepended.objects.filter(
+            dependence__in=MyPermanentModel.deleted_objects.values('pk')
+        ).count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument(
+        '--keys', type=int, default=20,
+        help='Distinct names the operations pick from, fewer collide more.'
+    )
+    parser.add_argument(
+        '--busy-timeout', type=float, default=0.1,
+        help='Seconds SQLite waits for a lock before raising.'
+    )
+    parser.add_argument('--retries', type=int, default=20)
+    parser.add_argument(
+        '--backoff', type=float, default=0.01,
+        help='Maximum seconds to sleep before retrying a locked operation.'
+    )
+    parser.add_argument(
+        '--immediate', action='store_true',
+        help='Begin transactions with BEGIN IMMEDIATE, Django 5.1+.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='permanent-stress-')
+    path = os.path.join(directory, 'stress.sqlite3')
+    options = {'timeout': args.busy_timeout}
+    if args.immediate:
+        options['transaction_mode'] = 'IMMEDIATE'
+    try:
+        setup(DATABASES={'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'TEST': {'NAME': path},
+            'OPTIONS': options,
+        }})
+        from django.db import connection
+        from django_permanent.tests.test_app.models import MyPermanentModel
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        # Names of RestoreOnCreateModel are created by the workload
+        MyPermanentModel.objects.bulk_create([
+            MyPermanentModel(name=str(key)) for key in range(args.keys)
+        ])
+        connection.close()
+
+        deadline = time.monotonic() + args.seconds
+        stats = [Stats() for _ in range(args.threads)]
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(args.seed + i, deadline, args, stats[i])
+            )
+            for i in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = Stats()
+        for thread_stats in stats:
+            total.merge(thread_stats)
+
+        print('%d threads, %.1fs, %d keys' % (
+            args.threads, elapsed, args.keys
+        ))
+        print('%-20s %10s %10s %10s %12s' % (
+            'operation', 'ops', 'ops/s', 'errors', 'mean ms'
+        ))
+        for name in WORKLOAD:
+            ops = total.ops[name]
+            print('%-20s %10d %10.1f %10d %12.3f' % (
+                name, ops, ops / elapsed, total.errors[name],
+                total.seconds[name] / ops * 1000 if ops else 0,
+            ))
+        ops = sum(total.ops.values())
+        print('%-20s %10d %10.1f %10d' % (
+            'total', ops, ops / elapsed, sum(total.errors.values())
+        ))
+        print('lock waits: %d, %.3fs, %.1f%% of the thread time' % (
+            total.lock_errors, total.lock_wait,
+            total.lock_wait / (elapsed * args.threads) * 100,
+        ))
+        for name, example in sorted(total.examples.items()):
+            print('%s error: %s' % (name, example))
+
+        failed = False
+        for name, count in violations().items():
+            print('%s: %d' % (name, count))
+            failed = failed or bool(count)
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+Shared setup of the benchmarks: configure Django with the settings of
+runtests.py and create the test database with the test models.
+"""
+import os
+import sys
+import timeit
+
+import django
+import django.conf
+
+
+def setup(**settings):
+    parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, parent)
+    from runtests import DEFAULT_SETTINGS
+
+    if not django.conf.settings.configured:
+        django.conf.settings.configure(**dict(DEFAULT_SETTINGS, **settings))
+    django.setup()
+
+    # Register the test models before the tables are created
+    import django_permanent.tests.test_app.models  # NOQA
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0)
+
+
+def bench(name, func, number=100, repeat=5):
+    """Print the best time per call of func in milliseconds."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    print('%-50s %10.3f ms' % (name, best / number * 1000))
+    return best / number
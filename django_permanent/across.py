@@ -0,0 +1,93 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import QuerySet
+
+
+class AcrossError(Exception):
+    """
+    Raised when an operation run across database aliases failed on some
+    of them. errors maps these aliases to their exceptions, results maps
+    the other aliases to their results, which are committed.
+    """
+    def __init__(self, errors, results):
+        self.errors = errors
+        self.results = results
+        super().__init__('Failed on %s' % ', '.join(
+            '%s (%s: %s)' % (alias, type(error).__name__, error)
+            for alias, error in sorted(errors.items())
+        ))
+
+
+def _call(func, alias, args):
+    try:
+        return func(alias, *args)
+    finally:
+        # Every thread opens its own connection
+        connections[alias].close()
+
+
+def run_across(func, args_by_alias, max_workers=None):
+    """
+    Call func(alias, *args) for every alias in args_by_alias, in threads
+    of their own, at most max_workers of them at a time, one per alias
+    by default. Return the results and the exceptions by alias.
+    """
+    results, errors = {}, {}
+    if not args_by_alias:
+        return results, errors
+    with ThreadPoolExecutor(
+            max_workers=max_workers or len(args_by_alias),
+            thread_name_prefix='permanent') as executor:
+        futures = {
+            alias: executor.submit(_call, func, alias, args)
+            for alias, args in args_by_alias.items()
+        }
+    for alias, future in futures.items():
+        try:
+            results[alias] = future.result()
+        except Exception as e:
+            errors[alias] = e
+    return results, errors
+
+
+def _delete(alias, querysets, force):
+    count, rows_count = 0, Counter()
+    with transaction.atomic(using=alias):
+        for queryset in querysets:
+            queryset = queryset.using(alias)
+            if force:
+                deleted, per_label = queryset.delete(force=True)
+            else:
+                deleted, per_label = queryset.delete()
+            count += deleted
+            rows_count.update(per_label)
+    return count, dict(rows_count)
+
+
+def permanent_delete_across(querysets_by_alias, max_workers=None,
+                            force=False):
+    """
+    Delete the queryset, or the querysets, of every database alias in
+    querysets_by_alias, concurrently with run_across(), one transaction
+    per alias. Return the total number of deleted objects and the number
+    per model label like QuerySet.delete(), raise AcrossError if any
+    alias failed.
+    """
+    args_by_alias = {
+        alias: (
+            [querysets] if isinstance(querysets, QuerySet) else
+            list(querysets),
+            force,
+        )
+        for alias, querysets in querysets_by_alias.items()
+    }
+    results, errors = run_across(_delete, args_by_alias, max_workers)
+    if errors:
+        raise AcrossError(errors, results)
+    count, rows_count = 0, Counter()
+    for deleted, per_label in results.values():
+        count += deleted
+        rows_count.update(per_label)
+    return count, dict(rows_count)
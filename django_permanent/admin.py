@@ -0,0 +1,115 @@
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _, ngettext
+
+from .stats import estimate_count
+
+
+STATUS_PARAMETER = 'permanent'
+
+# Filter values mapped onto the PermanentModel managers
+STATUS_MANAGERS = {
+    'live': 'objects',
+    'deleted': 'deleted_objects',
+    'all': 'all_objects',
+}
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which trusts the planner estimate instead of an exact
+    count() once the estimate exceeds threshold.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'explain'):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate
+        return super().count
+
+
+class PermanentStatusFilter(admin.SimpleListFilter):
+    title = _('status')
+    parameter_name = STATUS_PARAMETER
+
+    def lookups(self, request, model_admin):
+        return (
+            ('live', _('Live')),
+            ('deleted', _('Deleted')),
+            ('all', _('All')),
+        )
+
+    def choices(self, changelist):
+        value = self.value() or 'live'
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': value == lookup,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: lookup}
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        manager = STATUS_MANAGERS.get(self.value() or 'live', 'all_objects')
+        if manager == 'all_objects':
+            return queryset
+        return queryset & getattr(queryset.model, manager).all()
+
+
+class PermanentModelAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for PermanentModel subclasses with a live/deleted/all
+    filter and set-based delete and restore actions.
+    """
+    list_filter = (PermanentStatusFilter,)
+    actions = ('soft_delete_selected', 'restore_selected')
+    tombstone_paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Filtering by status is done by PermanentStatusFilter,
+        # deleted objects stay reachable from the change view.
+        qs = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            qs = qs.order_by(*ordering)
+        return qs
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        if request.GET.get(STATUS_PARAMETER, 'live') != 'live':
+            return self.tombstone_paginator(
+                queryset, per_page, orphans, allow_empty_first_page
+            )
+        return super().get_paginator(
+            request, queryset, per_page, orphans, allow_empty_first_page
+        )
+
+    @admin.action(
+        permissions=['delete'],
+        description=_('Soft delete selected %(verbose_name_plural)s'),
+    )
+    def soft_delete_selected(self, request, queryset):
+        # Tombstones are already deleted, only live rows are collected
+        live = queryset & self.model.objects.all()
+        _count, rows_count = live.delete()
+        # Selected objects only, not the cascaded ones
+        count = rows_count.get(self.model._meta.label, 0)
+        self.message_user(request, ngettext(
+            '%d object was deleted.', '%d objects were deleted.', count
+        ) % count)
+
+    @admin.action(
+        permissions=['change'],
+        description=_('Restore selected %(verbose_name_plural)s'),
+    )
+    def restore_selected(self, request, queryset):
+        count = queryset.restore()
+        self.message_user(request, ngettext(
+            '%d object was restored.', '%d objects were restored.', count
+        ) % count)
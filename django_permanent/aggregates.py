@@ -0,0 +1,124 @@
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import (
+    Count, Expression, IntegerField, OuterRef, Subquery, Sum, Value
+)
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Coalesce
+
+
+def related_lookups(model, name):
+    """
+    Return the model related through the to-many relation name of model
+    and the lookups filtering its rows related to the outer query row.
+    """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist as e:
+        raise FieldError(str(e))
+    if not (field.is_relation and (field.one_to_many or field.many_to_many)):
+        raise FieldError(
+            "%s.%s is not a reverse foreign key, many-to-many or generic "
+            "relation." % (model._meta.object_name, name)
+        )
+    if hasattr(field, 'bulk_related_objects'):
+        # GenericRelation
+        return field.related_model, {
+            field.object_id_field_name: OuterRef('pk'),
+            field.content_type_field_name: field.get_content_type(),
+        }
+    if field.auto_created and field.one_to_many:
+        # Reverse foreign key, maybe to a to_field
+        return field.related_model, {
+            field.field.attname: OuterRef(field.field.target_field.attname)
+        }
+    if field.auto_created:
+        return field.related_model, {field.field.name: OuterRef('pk')}
+    return field.related_model, {field.related_query_name(): OuterRef('pk')}
+
+
+class PermanentAggregate(Expression):
+    """
+    Aggregate the rows of a to-many relation visible through manager,
+    in a correlated subquery carrying the soft delete predicate of
+    the related model instead of a join of the outer query:
+
+        Parent.objects.annotate(
+            children=LiveCount('children'),
+            total=LiveSum('children__amount', default=0),
+        )
+
+    lookup is the relation optionally followed by the aggregated field,
+    filter a Q object restricting the related rows and default the value
+    of rows without related rows.
+    """
+    aggregate = Count
+    manager = 'objects'
+
+    def __init__(self, lookup, filter=None, default=None,
+                 output_field=None):
+        super().__init__(output_field=output_field)
+        self.lookup = lookup
+        self.filter = filter
+        self.default = default
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.lookup)
+
+    def get_queryset(self, model):
+        """Return the subquery for the rows of the outer model."""
+        from .models import PermanentModel
+
+        name, _sep, target = self.lookup.partition(LOOKUP_SEP)
+        related_model, lookups = related_lookups(model, name)
+        if issubclass(related_model, PermanentModel):
+            manager = getattr(related_model, self.manager)
+        elif self.manager == 'deleted_objects':
+            raise FieldError(
+                '%s is not a PermanentModel.' % related_model._meta.label
+            )
+        else:
+            manager = related_model._default_manager
+        queryset = manager.filter(**lookups)
+        if self.filter is not None:
+            queryset = queryset.filter(self.filter)
+        # Grouped by the correlated column, there is a single group
+        return queryset.order_by().values(next(iter(lookups))).annotate(
+            result=self.aggregate(target or 'pk')
+        ).values('result')
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None,
+                           summarize=False, for_save=False):
+        output_field = self._output_field_or_none
+        if output_field is None and self.aggregate is Count:
+            output_field = IntegerField()
+        expression = Subquery(
+            self.get_queryset(query.model), output_field=output_field
+        )
+        if self.aggregate is Count:
+            # No group without related rows
+            expression = Coalesce(expression, Value(self.default or 0))
+        elif self.default is not None:
+            expression = Coalesce(expression, Value(self.default))
+        return expression.resolve_expression(
+            query, allow_joins, reuse, summarize, for_save
+        )
+
+
+class LiveCount(PermanentAggregate):
+    """Count the live related rows."""
+
+
+class LiveSum(PermanentAggregate):
+    """Sum a field of the live related rows."""
+    aggregate = Sum
+
+
+class DeletedCount(PermanentAggregate):
+    """Count the deleted related rows."""
+    manager = 'deleted_objects'
+
+
+class DeletedSum(PermanentAggregate):
+    """Sum a field of the deleted related rows."""
+    aggregate = Sum
+    manager = 'deleted_objects'
@@ -0,0 +1,14 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import class_prepared
+
+
+class PermanentConfig(AppConfig):
+    name = 'django_permanent'
+    verbose_name = 'Django Permanent'
+
+    def ready(self):
+        from .cascade import build_plans, clear_plans
+        class_prepared.connect(clear_plans, dispatch_uid='permanent_plans')
+        build_plans(apps.get_models(include_auto_created=True))
+        if apps.is_installed('django.contrib.contenttypes'):
+            from . import generic  # NOQA
@@ -0,0 +1,244 @@
+import csv
+import gzip
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.apps import apps
+from django.core.serializers import python
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+FORMATS = ('jsonl', 'csv')
+
+
+def open_archive(path, mode):
+    """Open an archive in text mode, gzip compressed if it ends with .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def _m2m_fields(model):
+    return [
+        field for field in model._meta.many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+
+
+def _value(obj, field):
+    # DjangoJSONEncoder truncates datetimes to milliseconds,
+    # only JSON native values are kept as is.
+    value = field.value_from_object(obj)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return field.value_to_string(obj)
+
+
+def _m2m_values(field, pk_list, using):
+    """Return {pk: [related pks]} of the objects with a single query."""
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    values = defaultdict(list)
+    rows = through._default_manager.using(using).filter(**{
+        '%s__in' % source: pk_list,
+    }).values_list(source, target).order_by(source, target)
+    for pk, related_pk in rows:
+        values[pk].append(related_pk)
+    return values
+
+
+def iter_records(queryset, batch_size=1000):
+    """
+    Stream the queryset as serializer-compatible dicts with keyset
+    pagination, fetching many-to-many values once per batch.
+    """
+    model = queryset.model
+    # Inherited fields too, the parent rows aren't exported on their own
+    fields = model._meta.concrete_fields
+    m2m_fields = _m2m_fields(model)
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        batch_qs = queryset
+        if last_pk is not None:
+            batch_qs = batch_qs.filter(pk__gt=last_pk)
+        batch = list(batch_qs[:batch_size])
+        if not batch:
+            return
+        pk_list = [obj.pk for obj in batch]
+        m2m_values = {
+            field.name: _m2m_values(field, pk_list, queryset.db)
+            for field in m2m_fields
+        }
+        for obj in batch:
+            record = {
+                field.name: _value(obj, field)
+                for field in fields if not field.primary_key
+            }
+            for name, values in m2m_values.items():
+                record[name] = values.get(obj.pk, [])
+            yield {
+                'model': model._meta.label_lower,
+                'pk': _value(obj, model._meta.pk),
+                'fields': record,
+            }
+        last_pk = batch[-1].pk
+
+
+def export_deleted(queryset, stream, format='jsonl', batch_size=1000):
+    """
+    Write the objects of the queryset, typically Model.deleted_objects,
+    to the text stream as JSONL or CSV and return their count.
+    """
+    model = queryset.model
+    records = iter_records(queryset, batch_size)
+
+    count = 0
+    if format == 'csv':
+        names = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key
+        ] + [field.name for field in _m2m_fields(model)]
+        m2m_names = {field.name for field in _m2m_fields(model)}
+        writer = csv.writer(stream)
+        writer.writerow(['model', 'pk'] + names)
+        for record in records:
+            row = [record['model'], record['pk']]
+            for name in names:
+                value = record['fields'][name]
+                if name in m2m_names:
+                    value = json.dumps(value, cls=DjangoJSONEncoder)
+                row.append('' if value is None else value)
+            writer.writerow(row)
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record, cls=DjangoJSONEncoder))
+            stream.write('\n')
+            count += 1
+    return count
+
+
+def _csv_records(stream):
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = header[2:]
+    models = {}
+    for row in reader:
+        label, pk = row[0], row[1]
+        if label not in models:
+            models[label] = apps.get_model(label)
+        opts = models[label]._meta
+        fields = {}
+        for name, value in zip(names, row[2:]):
+            field = opts.get_field(name)
+            if field.many_to_many:
+                value = json.loads(value)
+            elif value == '' and field.null:
+                value = None
+            fields[name] = value
+        yield {'model': label, 'pk': pk, 'fields': fields}
+
+
+def _jsonl_records(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def import_deleted(stream, format='jsonl', batch_size=1000, restore=True,
+                   using=DEFAULT_DB_ALIAS):
+    """
+    Load an archive written by export_deleted(). Rows missing from the
+    database are bulk inserted, one object at a time for multi-table
+    inherited models, then every batch is restored unless
+    restore=False. Return the (inserted, restored) counts.
+    """
+    if format == 'csv':
+        records = _csv_records(stream)
+    else:
+        records = _jsonl_records(stream)
+    objects = python.Deserializer(records, using=using)
+
+    inserted = restored = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return inserted, restored
+        by_model = defaultdict(list)
+        for deserialized in batch:
+            by_model[type(deserialized.object)].append(deserialized)
+        with transaction.atomic(using=using):
+            for model, deserialized_list in by_model.items():
+                count, restored_count = _load_batch(
+                    model, deserialized_list, restore, using
+                )
+                inserted += count
+                restored += restored_count
+
+
+def _insert_inherited(obj, using):
+    """
+    Insert the rows of every table of a multi-table inherited object,
+    parents first, raw like loaddata, which bulk_create() can't do.
+    """
+    model = type(obj)
+    chain = [model, *model._meta.get_parent_list()]
+    # Only the primary key of the child is exported
+    for cls in chain:
+        for parent, field in cls._meta.parents.items():
+            if field is not None:
+                setattr(
+                    obj, parent._meta.pk.attname, getattr(obj, field.attname)
+                )
+    for cls in reversed(chain):
+        obj._save_table(raw=True, cls=cls, force_insert=True, using=using)
+    obj._state.adding = False
+    obj._state.db = using
+
+
+def _load_batch(model, deserialized_list, restore, using):
+    pk_list = [item.object.pk for item in deserialized_list]
+    existing = set(
+        model.all_objects.using(using).filter(
+            pk__in=pk_list
+        ).values_list('pk', flat=True)
+    )
+    missing = [
+        item for item in deserialized_list if item.object.pk not in existing
+    ]
+    if model._meta.parents:
+        for item in missing:
+            _insert_inherited(item.object, using)
+    else:
+        model.all_objects.using(using).bulk_create(
+            [item.object for item in missing]
+        )
+    for field in _m2m_fields(model):
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(
+            field.m2m_reverse_field_name()
+        ).attname
+        through._default_manager.using(using).bulk_create([
+            through(**{source: item.object.pk, target: related_pk})
+            for item in missing
+            for related_pk in (item.m2m_data or {}).get(field.name, [])
+        ])
+
+    restored = 0
+    if restore:
+        restored = model.deleted_objects.using(using).filter(
+            pk__in=pk_list
+        ).restore()
+    return len(missing), restored
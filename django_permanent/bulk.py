@@ -0,0 +1,94 @@
+import uuid
+
+from django.db import connections
+from django.db.models import sql
+from django.db.models.sql.where import ExtraWhere
+
+from . import settings
+
+
+def _is_local(model, values):
+    """Check if the values update the table of the model only."""
+    concrete_model = model._meta.concrete_model
+    return all(
+        model._meta.get_field(name).model._meta.concrete_model is
+        concrete_model
+        for name in values
+    )
+
+
+def can_stage(model, values, using):
+    """Check if the pks can be staged on the backend for the update."""
+    return (connections[using].vendor in ('postgresql', 'sqlite', 'mysql') and
+            _is_local(model, values))
+
+
+def update_batch(model, pk_list, values, using):
+    """
+    Update the rows with an IN (...) UPDATE per GET_ITERATOR_CHUNK_SIZE
+    pks, Django's own strategy.
+    """
+    sql.UpdateQuery(model).update_batch(pk_list, values, using)
+
+
+def _execute(query, where, params, using):
+    query.where.add(ExtraWhere([where], params), 'AND')
+    compiled, compiled_params = query.get_compiler(using).as_sql()
+    with connections[using].cursor() as cursor:
+        cursor.execute(compiled, compiled_params)
+        return cursor.rowcount
+
+
+def update_staged(model, pk_list, values, using):
+    """
+    Update the rows with a single UPDATE joined to the staged pks, an
+    array parameter on PostgreSQL and a temporary table elsewhere.
+    Return the number of updated rows.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    pk_column = '%s.%s' % (qn(opts.db_table), qn(opts.pk.column))
+    pk_list = [opts.pk.get_db_prep_value(pk, connection) for pk in pk_list]
+    query = sql.UpdateQuery(model)
+    query.add_update_values(values)
+
+    if connection.vendor == 'postgresql':
+        return _execute(
+            query, '%s = ANY(%%s)' % pk_column, [pk_list], using
+        )
+
+    table = qn('permanent_pks_%s' % uuid.uuid4().hex[:12])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE %s (pk %s PRIMARY KEY)' % (
+                table, opts.pk.rel_db_type(connection)
+            )
+        )
+        try:
+            cursor.executemany(
+                'INSERT INTO %s (pk) VALUES (%%s)' % table,
+                [(pk,) for pk in pk_list]
+            )
+            return _execute(
+                query, '%s IN (SELECT pk FROM %s)' % (pk_column, table), [],
+                using
+            )
+        finally:
+            # A plain DROP TABLE commits the transaction on MySQL
+            cursor.execute('DROP %sTABLE %s' % (
+                'TEMPORARY ' if connection.vendor == 'mysql' else '', table
+            ))
+
+
+def update_pks(model, pk_list, values, using):
+    """
+    Update the rows of the pks with the values, batches of at least
+    PERMANENT_BULK_UPDATE_THRESHOLD pks are staged for a single UPDATE.
+    """
+    threshold = settings.BULK_UPDATE_THRESHOLD
+    if (threshold and len(pk_list) >= threshold and
+            can_stage(model, values, using)):
+        update_staged(model, pk_list, values, using)
+    else:
+        update_batch(model, pk_list, values, using)
@@ -0,0 +1,83 @@
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import settings
+
+
+# Cached value of pks which do not exist at all
+MISSING = 'missing'
+
+
+def is_cached(model):
+    """Check if the object cache is enabled for the model."""
+    return getattr(getattr(model, 'Permanent', None), 'cache', False)
+
+
+def get_cache():
+    return caches[settings.CACHE_ALIAS]
+
+
+def cache_key(model, pk, using):
+    # Shards may hold different rows under the same pk
+    return 'permanent:%s:%s:%s' % (
+        using, model._meta.label_lower, model._meta.pk.to_python(pk)
+    )
+
+
+def get_many(model, pk_list, using):
+    """
+    Return {pk: instance} for the pks which exist in the database, including
+    deleted ones. Cache misses are fetched with a single query and cached
+    as {attname: value}, pks which do not exist are cached as MISSING.
+    """
+    cache = get_cache()
+    keys = {
+        cache_key(model, pk, using): model._meta.pk.to_python(pk)
+        for pk in pk_list
+    }
+    cached = cache.get_many(keys)
+
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    result = {}
+    for key, values in list(cached.items()):
+        if values == MISSING:
+            continue
+        # Entries cached before fields were added or removed are misses
+        if not isinstance(values, dict) or values.keys() != set(attnames):
+            del cached[key]
+            continue
+        result[keys[key]] = model.from_db(
+            using, attnames, [values[attname] for attname in attnames]
+        )
+
+    misses = [pk for key, pk in keys.items() if key not in cached]
+    if misses:
+        fetched = model.all_objects.using(using).in_bulk(misses)
+        timeout = getattr(model.Permanent, 'cache_timeout', DEFAULT_TIMEOUT)
+        to_cache = {}
+        for pk in misses:
+            obj = fetched.get(pk)
+            if obj is None:
+                to_cache[cache_key(model, pk, using)] = MISSING
+            else:
+                to_cache[cache_key(model, pk, using)] = {
+                    attname: getattr(obj, attname) for attname in attnames
+                }
+                result[pk] = obj
+        cache.set_many(to_cache, timeout)
+    return result
+
+
+def invalidate(model, pk_list, using=DEFAULT_DB_ALIAS):
+    """
+    Drop the cached objects of the database alias now and once more when
+    the surrounding transaction commits, so that concurrent readers can't
+    cache the state being replaced.
+    """
+    if not is_cached(model) or not pk_list:
+        return
+    keys = [cache_key(model, pk, using) for pk in pk_list]
+    cache = get_cache()
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys), using=using)
@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+from django.apps import apps
+from django.db.models import DO_NOTHING
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from . import settings
+from .related import marker_model
+
+
+# A relation to delete along with the model, rel is the reverse relation
+Relation = namedtuple(
+    'Relation', ['rel', 'field', 'model', 'on_delete', 'permanent']
+)
+
+
+def defers_field_updates(model):
+    """
+    Check if SET_NULL / SET_DEFAULT updates of the children are deferred
+    until the hard delete of a soft deleted model.
+    """
+    return getattr(
+        getattr(model, 'Permanent', None), 'defer_field_updates',
+        settings.DEFER_FIELD_UPDATES
+    )
+
+
+class CascadePlan:
+    """
+    Soft delete properties of a model and its relations to delete,
+    computed once instead of introspecting _meta on every delete.
+    """
+    def __init__(self, model):
+        from .models import PermanentModel
+        opts = model._meta
+        self.model = model
+        self.permanent = issubclass(model, PermanentModel)
+        self.marker_model = marker_model(model) if self.permanent else None
+        self.defers_field_updates = (
+            self.permanent and defers_field_updates(model)
+        )
+        self.relations = tuple(
+            Relation(
+                rel, rel.field, rel.related_model,
+                rel.field.remote_field.on_delete,
+                issubclass(rel.related_model, PermanentModel),
+            )
+            for rel in get_candidate_relations_to_delete(opts)
+        )
+        self.candidates = tuple(relation.rel for relation in self.relations)
+        self.parent_links = tuple(opts.concrete_model._meta.parents.values())
+        # Collector.can_fast_delete() less the signal listeners and
+        # parent links, checked on every call
+        self.fast_delete = all(
+            relation.on_delete is DO_NOTHING for relation in self.relations
+        ) and not any(
+            hasattr(field, 'bulk_related_objects')
+            for field in opts.private_fields
+        )
+
+    def __repr__(self):
+        return '<CascadePlan: %s>' % self.model._meta.label
+
+
+_plans = {}
+
+
+def get_plan(model):
+    """Return the CascadePlan of the model, a dict lookup once built."""
+    try:
+        return _plans[model]
+    except KeyError:
+        pass
+    if model._meta.apps is not apps:
+        # Historical models of migrations and models of other registries
+        # keep their plan, which is released with them
+        plan = getattr(model._meta, 'permanent_plan', None)
+        if plan is None:
+            plan = model._meta.permanent_plan = CascadePlan(model)
+        return plan
+    plan = _plans[model] = CascadePlan(model)
+    return plan
+
+
+def build_plans(models):
+    """Build the plans of the models, called at app ready."""
+    for model in models:
+        get_plan(model)
+
+
+def clear_plans(sender=None, **kwargs):
+    """
+    Drop the plans, a model registered later can add relations
+    to any of them. Historical models of migrations and models of other
+    registries can't, they are ignored.
+    """
+    if sender is not None and sender._meta.apps is not apps:
+        return
+    _plans.clear()
@@ -8,7 +8,7 @@ def _check_permanent_model_relations(app_configs, **kwargs):
     to non-PermanentModel. This configuration causes IntegrityError
     when the related non-PermanentModel is deleted.
     """
-    from .models import PermanentModel
+    from .cascade import get_plan
 
     errors = []
 
@@ -21,7 +21,7 @@ def _check_permanent_model_relations(app_configs, **kwargs):
             models_to_check.extend(app_config.get_models())
 
     for model in models_to_check:
-        if not issubclass(model, PermanentModel) or model is PermanentModel:
+        if not get_plan(model).permanent:
             continue
 
         for field in model._meta.get_fields():
@@ -32,7 +32,7 @@ def _check_permanent_model_relations(app_configs, **kwargs):
             on_delete = field.remote_field.on_delete
 
             if (on_delete == models.CASCADE and
-                    not issubclass(related_model, PermanentModel)):
+                    not get_plan(related_model).permanent):
                 errors.append(
                     checks.Warning(
                         f'{model.__name__}.{field.name} has CASCADE to '
@@ -56,3 +56,56 @@ def _check_permanent_model_relations(app_configs, **kwargs):
 check_permanent_model_relations = checks.register(checks.Tags.models)(
     _check_permanent_model_relations
 )
+
+
+def _check_permanent_counters(app_configs, **kwargs):
+    """
+    Check that Permanent.counters map ForeignKeys onto existing fields
+    of the related models.
+    """
+    from django.apps import apps
+    from django.core.exceptions import FieldDoesNotExist
+
+    errors = []
+
+    if app_configs is None:
+        models_to_check = apps.get_models()
+    else:
+        models_to_check = []
+        for app_config in app_configs:
+            models_to_check.extend(app_config.get_models())
+
+    for model in models_to_check:
+        permanent = getattr(model, 'Permanent', None)
+        counters = getattr(permanent, 'counters', None) or {}
+        for name, counter in counters.items():
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if not isinstance(field, models.ForeignKey):
+                errors.append(checks.Error(
+                    f'{model.__name__}.Permanent.counters refers to '
+                    f'{name!r}, which is not a ForeignKey',
+                    obj=model,
+                    id='django_permanent.E001',
+                ))
+                continue
+            related_model = field.remote_field.model
+            try:
+                related_model._meta.get_field(counter)
+            except FieldDoesNotExist:
+                errors.append(checks.Error(
+                    f'{model.__name__}.Permanent.counters refers to '
+                    f'{related_model.__name__}.{counter}, which does not '
+                    f'exist',
+                    obj=model,
+                    id='django_permanent.E001',
+                ))
+
+    return errors
+
+
+check_permanent_counters = checks.register(checks.Tags.models)(
+    _check_permanent_counters
+)
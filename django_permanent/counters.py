@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import settings
+from .markers import is_live
+
+
+def get_counters(model):
+    """
+    Return [(foreign key, counter field name)] declared in
+    Permanent.counters as {foreign key name: counter field name}.
+    """
+    counters = getattr(getattr(model, 'Permanent', None), 'counters', None)
+    if not counters:
+        return []
+    return [
+        (model._meta.get_field(name), counter)
+        for name, counter in counters.items()
+    ]
+
+
+def _manager(model):
+    from .models import PermanentModel
+    if issubclass(model, PermanentModel):
+        # Counters of deleted parents are maintained too
+        return model.all_objects
+    return model._base_manager
+
+
+def count_live(model, objs, fields=None, local=False):
+    """
+    Count the live objects of objs, model instances or a queryset, per
+    related object of every counted foreign key, optionally limited to
+    the given fields. local=True skips foreign keys inherited from
+    multi-table inheritance parents, counted with the parents instead.
+    A queryset is counted with a single query.
+    Return {(foreign key, counter field name): Counter}.
+    """
+    counters = [
+        (fk, counter) for fk, counter in get_counters(model)
+        if (fields is None or fk in fields) and
+        not (local and fk.model is not model._meta.concrete_model)
+    ]
+    if not counters:
+        return {}
+
+    attnames = [fk.attname for fk, counter in counters]
+    live = {settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT}
+    if hasattr(objs, 'values_list'):
+        rows = objs.filter(**live).order_by().values_list(*attnames)
+    else:
+        rows = [
+            [getattr(obj, attname) for attname in attnames]
+            for obj in objs
+            if is_live(obj)
+        ]
+
+    counts = {key: Counter() for key in counters}
+    for row in rows:
+        for key, value in zip(counters, row):
+            if value is not None:
+                counts[key][value] += 1
+    return counts
+
+
+def update_counters(counts, sign, using):
+    """
+    Apply the counts returned by count_live() multiplied by sign with
+    F() increments, one UPDATE per distinct count of every counter.
+    """
+    for (fk, counter), counter_counts in counts.items():
+        pks_by_count = defaultdict(list)
+        for pk, count in counter_counts.items():
+            pks_by_count[count].append(pk)
+        target = fk.target_field.attname
+        for count, pk_list in pks_by_count.items():
+            _manager(fk.related_model).using(using).filter(**{
+                '%s__in' % target: pk_list
+            }).update(**{counter: F(counter) + sign * count})
+
+
+def rebuild_counters(model, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute the counters of the model from scratch, one UPDATE
+    per counter. Use it to fill counters added to existing data.
+    """
+    for fk, counter in get_counters(model):
+        live = model.all_objects.using(using).filter(**{
+            settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT,
+            fk.attname: OuterRef(fk.target_field.attname),
+        }).order_by().values(fk.attname).annotate(
+            count=Count('pk')
+        ).values('count')
+        _manager(fk.related_model).using(using).update(**{
+            counter: Coalesce(Subquery(live), 0)
+        })
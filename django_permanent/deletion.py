@@ -1,15 +1,67 @@
 # -*- coding: utf-8 -*-
-from collections import Counter
+from collections import Counter, defaultdict
 from functools import partial, reduce
 from operator import attrgetter, or_
 
 from django.db import models, transaction
-from django.db.models import signals, sql
+from django.db.models import CASCADE, Q, signals, sql
+from django.db.models import deletion
 from django.db.models.deletion import Collector
 from django.utils.timezone import now
 
-from .settings import FIELD
-from .related import deletion_context
+from .bulk import update_pks
+from .cache import invalidate, is_cached
+from .cascade import get_plan
+from .counters import count_live, get_counters, update_counters
+from .markers import deleted_values, set_values
+from .query import update_marker
+from .related import _is_forced, deletion_context
+
+
+def move_counters(model, objs, field, value, using):
+    """
+    Move the live objs counted by the foreign key from their current
+    related objects to value, set by SET_NULL / SET_DEFAULT.
+    """
+    counts = count_live(model, objs, fields=[field])
+    if not counts:
+        return
+    update_counters(counts, -1, using)
+    if value is not None:
+        moved = sum(sum(counter.values()) for counter in counts.values())
+        if moved:
+            update_counters({
+                key: {value: moved} for key in counts
+            }, 1, using)
+
+
+def merge_fast_deletes(self):
+    """
+    Merge the querysets of generic related objects, collected per batch
+    of deleted objects, into one per model and content type and batch of
+    the object ids
+    """
+    batches = {}
+    fast_deletes = []
+    for qs in self.fast_deletes:
+        batch = getattr(qs, '_permanent_batch', None)
+        if batch is None:
+            fast_deletes.append(qs)
+            continue
+        key, base, field_name, values = batch
+        if key in batches:
+            batches[key][2].extend(values)
+        else:
+            batches[key] = [base, field_name, list(values)]
+
+    for base, field_name, values in batches.values():
+        values = list(dict.fromkeys(values))
+        field = base.model._meta.get_field(field_name)
+        for batch in self.get_del_batches(values, [field]):
+            fast_deletes.append(
+                base.filter(**{'%s__in' % field_name: batch})
+            )
+    return fast_deletes
 
 
 def delete(self, force=False):
@@ -17,7 +69,6 @@ def delete(self, force=False):
     Patched the BaseCollector.delete with soft delete support
     for PermanentModel
     """
-    from .models import PermanentModel
     time = now()
 
     # sort instance collections
@@ -37,15 +88,22 @@ def delete(self, force=False):
         if len(instances) == 1:
             instance = instances[0]
             if self.can_fast_delete(instance):
-                with transaction.mark_for_rollback_on_error(
-                        self.using):
-                    if issubclass(model, PermanentModel) and not force:
+                invalidate(model, [instance.pk], self.using)
+                counts = count_live(model, [instance])
+                if counts:
+                    handling = partial(transaction.atomic, savepoint=False)
+                else:
+                    handling = transaction.mark_for_rollback_on_error
+                with handling(using=self.using):
+                    update_counters(counts, -1, self.using)
+                    plan = get_plan(model)
+                    if plan.permanent and not force:
                         # Soft delete for PermanentModel
-                        query = sql.UpdateQuery(model)
+                        query = sql.UpdateQuery(plan.marker_model)
                         query.update_batch(
-                            [instance.pk], {FIELD: time}, self.using
+                            [instance.pk], deleted_values(time), self.using
                         )
-                        setattr(instance, FIELD, time)
+                        set_values(instance, deleted_values(time))
                         count = 1
                     else:
                         # Hard delete
@@ -75,13 +133,19 @@ def delete(self, force=False):
                 signals.pre_delete.send(**signal_kwargs)
 
         # fast deletes
+        self.fast_deletes = merge_fast_deletes(self)
         for qs in self.fast_deletes:
+            if is_cached(qs.model):
+                invalidate(
+                    qs.model, list(qs.values_list('pk', flat=True)),
+                    self.using
+                )
+            if get_counters(qs.model):
+                update_counters(count_live(qs.model, qs), -1, self.using)
             # Update PermanentModel instance
-            if issubclass(qs.model, PermanentModel) and not force:
-                pk_list = [obj.pk for obj in qs]
-                qs = sql.UpdateQuery(qs.model)
-                qs.update_batch(pk_list, {FIELD: time}, self.using)
-                count = len(pk_list)
+            if get_plan(qs.model).permanent and not force:
+                # Single set-based UPDATE, no need to fetch the rows
+                count = update_marker(qs, deleted_values(time))
             else:
                 count = qs._raw_delete(using=self.using)
 
@@ -89,6 +153,13 @@ def delete(self, force=False):
                 deleted_counter[qs.model._meta.label] += count
 
         # update fields
+        if not force:
+            # Children keep links to soft deleted parents which defer
+            # field updates, they are hidden by the join restriction.
+            for field, value in list(self.field_updates):
+                if get_plan(field.remote_field.model).defers_field_updates:
+                    del self.field_updates[field, value]
+
         for (field, value), instances_list in self.field_updates.items():
             updates = []
             objs = []
@@ -101,28 +172,56 @@ def delete(self, force=False):
 
             if updates:
                 combined_updates = reduce(or_, updates)
+                if is_cached(combined_updates.model):
+                    invalidate(combined_updates.model, list(
+                        combined_updates.values_list('pk', flat=True)
+                    ), self.using)
+                move_counters(
+                    combined_updates.model, combined_updates, field, value,
+                    self.using
+                )
                 combined_updates.update(**{field.name: value})
             if objs:
                 model = objs[0].__class__
-                query = sql.UpdateQuery(model)
-                query.update_batch(
-                    list({obj.pk for obj in objs}),
-                    {field.name: value},
-                    self.using
+                invalidate(model, [obj.pk for obj in objs], self.using)
+                move_counters(model, objs, field, value, self.using)
+                update_pks(
+                    model, list({obj.pk for obj in objs}),
+                    {field.name: value}, self.using
                 )
 
         # reverse instance collections
         for instances in self.data.values():
             instances.reverse()
 
+        # Models of a multi-table inheritance chain share the marker
+        # column, it's updated once for all of them.
+        marker_pks = defaultdict(set)
+        if not force:
+            for model, instances in self.data.items():
+                plan = get_plan(model)
+                if plan.permanent:
+                    marker_pks[plan.marker_model].update(
+                        obj.pk for obj in instances
+                    )
+
         # delete instances
         for model, instances in self.data.items():
             pk_list = [obj.pk for obj in instances]
-            if issubclass(model, PermanentModel) and not force:
-                query = sql.UpdateQuery(model)
-                query.update_batch(pk_list, {FIELD: time}, self.using)
+            invalidate(model, pk_list, self.using)
+            update_counters(
+                count_live(model, instances, local=True), -1, self.using
+            )
+            plan = get_plan(model)
+            if plan.permanent and not force:
+                owner = plan.marker_model
+                if owner in marker_pks:
+                    update_pks(
+                        owner, sorted(marker_pks.pop(owner)),
+                        deleted_values(time), self.using
+                    )
                 for instance in instances:
-                    setattr(instance, FIELD, time)
+                    set_values(instance, deleted_values(time))
                 count = len(pk_list)
             else:
                 query = sql.DeleteQuery(model)
@@ -145,15 +244,66 @@ def delete(self, force=False):
         # update collected instances
         for (field, value), objs_list in self.field_updates.items():
             for instances in objs_list:
+                # Lazy querysets were updated in bulk, don't fetch them
+                if (isinstance(instances, models.QuerySet) and
+                        instances._result_cache is None):
+                    continue
                 for obj in instances:
                     setattr(obj, field.attname, value)
         for model, instances in self.data.items():
+            if get_plan(model).permanent and not force:
+                continue
             for instance in instances:
-                if issubclass(model, PermanentModel) and not force:
-                    continue
                 setattr(instance, model._meta.pk.attname, None)
 
         return sum(deleted_counter.values()), dict(deleted_counter)
 
 
+def related_objects(self, related_model, related_fields, objs):
+    """
+    Patched the Collector.related_objects to collect the soft deleted
+    PermanentModel children too within forced_context()
+    """
+    if not (_is_forced.get() and get_plan(related_model).permanent):
+        return _related_objects(self, related_model, related_fields, objs)
+    predicate = reduce(or_, (
+        Q(**{'%s__in' % related_field.name: objs})
+        for related_field in related_fields
+    ))
+    return related_model.all_objects.using(self.using).filter(predicate)
+
+
+def can_fast_delete(self, objs, from_field=None):
+    """
+    Patched the Collector.can_fast_delete to check the precomputed
+    CascadePlan instead of the model relations
+    """
+    if from_field and from_field.remote_field.on_delete is not CASCADE:
+        return False
+    if hasattr(objs, '_meta'):
+        model = objs._meta.model
+    elif hasattr(objs, 'model') and hasattr(objs, '_raw_delete'):
+        model = objs.model
+    else:
+        return False
+    if self._has_signal_listeners(model):
+        return False
+    plan = get_plan(model)
+    # The use of from_field comes from the need to avoid cascade back to
+    # parent when parent delete is cascading to child.
+    return plan.fast_delete and all(
+        link == from_field for link in plan.parent_links
+    )
+
+
+def get_candidate_relations_to_delete(opts):
+    """Return the precomputed relations collected by Collector.collect()"""
+    return get_plan(opts.model).candidates
+
+
+_related_objects = Collector.related_objects
+_can_fast_delete = Collector.can_fast_delete
 Collector.delete = delete
+Collector.related_objects = related_objects
+Collector.can_fast_delete = can_fast_delete
+deletion.get_candidate_relations_to_delete = get_candidate_relations_to_delete
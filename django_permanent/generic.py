@@ -0,0 +1,64 @@
+from django.contrib.contenttypes.fields import GenericRel, GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS
+
+from .cascade import get_plan
+from .related import _is_deleting, _is_forced, restrict
+
+
+def get_rel_extra_restriction(self, alias, related_alias):
+    """
+    Join of a GenericRelation: alias is the table of the related objects,
+    joined from the table of the model defining it.
+    """
+    cond = _get_extra_restriction(self.field, related_alias, alias)
+    # NOTE: not during DELETE/CASCADE, like the reverse relations
+    if _is_deleting.get():
+        return cond
+    return restrict(self.model, alias, cond)
+
+
+def get_extra_restriction_patch(func):
+    def wrapper(self, alias, remote_alias):
+        # Reverse join through the related_query_name: alias is the table
+        # of the model defining the relation, joined from the related
+        # objects at remote_alias.
+        return restrict(self.model, alias, func(self, alias, remote_alias))
+    return wrapper
+
+
+def bulk_related_objects_patch(func):
+    def wrapper(self, objs, using=DEFAULT_DB_ALIAS):
+        model = self.remote_field.model
+        if not get_plan(model).permanent:
+            return func(self, objs, using)
+        # A hard delete removes the soft deleted related objects too
+        forced = _is_forced.get()
+        manager = model.all_objects if forced else model._base_manager
+        content_type = ContentType.objects.db_manager(using).get_for_model(
+            self.model, for_concrete_model=self.for_concrete_model
+        )
+        base = manager.db_manager(using).filter(**{
+            '%s__pk' % self.content_type_field_name: content_type.pk,
+        })
+        values = [obj.pk for obj in objs]
+        queryset = base.filter(**{
+            '%s__in' % self.object_id_field_name: values
+        })
+        # The collector calls it per batch of objs, see merge_fast_deletes()
+        queryset._permanent_batch = (
+            (model, content_type.pk, self.object_id_field_name, forced),
+            base, self.object_id_field_name, values,
+        )
+        return queryset
+    return wrapper
+
+
+_get_extra_restriction = GenericRelation.get_extra_restriction
+GenericRel.get_extra_restriction = get_rel_extra_restriction
+GenericRelation.get_extra_restriction = get_extra_restriction_patch(
+    GenericRelation.get_extra_restriction
+)
+GenericRelation.bulk_related_objects = bulk_related_objects_patch(
+    GenericRelation.bulk_related_objects
+)
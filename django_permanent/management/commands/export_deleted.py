@@ -0,0 +1,45 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ...archive import FORMATS, export_deleted, open_archive
+from ...models import PermanentModel
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream the deleted objects of a PermanentModel into a compressed '
+        'JSONL or CSV archive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model label, app_label.ModelName')
+        parser.add_argument(
+            '-o', '--output',
+            help='Archive path, <model>.deleted.<format>.gz by default.'
+        )
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        if not issubclass(model, PermanentModel):
+            raise CommandError(
+                '%s is not a PermanentModel.' % model._meta.label
+            )
+
+        output = options['output'] or '%s.deleted.%s.gz' % (
+            model._meta.label_lower, options['format']
+        )
+        queryset = model.deleted_objects.using(options['database'])
+        with open_archive(output, 'w') as stream:
+            count = export_deleted(
+                queryset, stream, options['format'], options['batch_size']
+            )
+        self.stdout.write('Exported %d %s objects to %s' % (
+            count, model._meta.label, output
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from ...archive import FORMATS, guess_format, import_deleted, open_archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Load an archive written by export_deleted, inserting purged rows '
+        'and restoring them in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Archive format, guessed from the file name by default.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--no-restore', action='store_false', dest='restore',
+            help='Keep the loaded objects deleted.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['archive']
+        with open_archive(path, 'r') as stream:
+            inserted, restored = import_deleted(
+                stream, options['format'] or guess_format(path),
+                options['batch_size'], options['restore'],
+                options['database']
+            )
+        self.stdout.write('Inserted %d and restored %d objects from %s' % (
+            inserted, restored, path
+        ))
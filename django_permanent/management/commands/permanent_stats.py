@@ -0,0 +1,56 @@
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+
+from ...models import PermanentModel
+from ...stats import collect_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the live and deleted row counts, deleted row ages, table '
+        'sizes and index use of PermanentModels as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help='Model labels, app_label.ModelName, every PermanentModel '
+                 'by default.'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--threshold', type=int, default=1000000,
+            help='Estimate the counts of tables with at least this many '
+                 'rows where the backend allows it.'
+        )
+        parser.add_argument(
+            '--sample-size', type=int, default=10000,
+            help='Rows sampled for the ages of estimated tables.'
+        )
+        parser.add_argument('--indent', type=int)
+
+    def handle(self, *args, **options):
+        models = []
+        for label in options['models']:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            if not issubclass(model, PermanentModel):
+                raise CommandError(
+                    '%s is not a PermanentModel.' % model._meta.label
+                )
+            models.append(model)
+
+        stats = collect_stats(
+            models, using=options['database'],
+            threshold=options['threshold'],
+            sample_size=options['sample_size'],
+        )
+        self.stdout.write(json.dumps(
+            stats, cls=DjangoJSONEncoder, indent=options['indent']
+        ))
@@ -1,31 +1,116 @@
+import copyreg
+import hashlib
+
 from django.db.models import Manager
 
 
-def QuerySetManager(qs):
-    """Factory function to create a manager from a QuerySet class."""
-    class QuerySetManager(Manager):
-        qs_class = qs
+# Composite classes by their components, one per distinct combination
+_classes = {}
+
 
-        def get_queryset(self):
-            return self.qs_class(self.model, using=self._db)
+def _qualname(cls):
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
 
-        def get_restore_or_create(self, *args, **kwargs):
-            return self.get_queryset().get_restore_or_create(*args, **kwargs)
 
-        def restore(self, *args, **kwargs):
-            return self.get_queryset().restore(*args, **kwargs)
-    return QuerySetManager()
+def _publish(name, components, cls):
+    """
+    Publish cls in this module under a unique name derived from the
+    components, so that it can be imported and pickled by reference.
+    """
+    registry = globals()
+    if name in registry and registry[name] is not cls:
+        # Components of other modules named alike
+        name += hashlib.md5(
+            '|'.join(map(_qualname, components)).encode()
+        ).hexdigest()[:8]
+    cls.__name__ = cls.__qualname__ = name
+    cls.__module__ = __name__
+    registry[name] = cls
+    return cls
 
 
-def MultiPassThroughManager(*classes):
+def _rebuild_queryset(components, state):
+    """Unpickle a composite queryset, recreating its class if needed."""
+    cls = composite_queryset(*components)
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    return obj
+
+
+def _reduce_queryset(self):
+    if '_components' not in type(self).__dict__:
+        # Subclasses of composite classes pickle by reference
+        return copyreg.__newobj__, (type(self),), self.__getstate__()
+    return _rebuild_queryset, (self._components, self.__getstate__())
+
+
+def composite_queryset(*classes):
     """
-    Create a manager from multiple QuerySet classes
-    using multiple inheritance.
+    Return the QuerySet class inheriting from the classes, created once
+    per combination. Its querysets pickle with the component classes,
+    so they can be loaded by processes which didn't create it.
     """
+    try:
+        return _classes[classes]
+    except KeyError:
+        pass
     name = "".join([cls.__name__ for cls in classes])
-    result_class = type(name, classes, {})
-    result = result_class.as_manager()
+    result_class = type(name, classes, {
+        '_components': classes,
+        '__reduce__': _reduce_queryset,
+    })
+    _classes[classes] = _publish(name, classes, result_class)
+    return result_class
+
+
+class BaseQuerySetManager(Manager):
+    qs_class = None
+
+    def get_queryset(self):
+        return self.qs_class(self.model, using=self._db, hints=self._hints)
 
-    globals()[name] = result_class
+    def get_restore_or_create(self, *args, **kwargs):
+        return self.get_queryset().get_restore_or_create(*args, **kwargs)
 
-    return result
+    def restore(self, *args, **kwargs):
+        return self.get_queryset().restore(*args, **kwargs)
+
+    def claim(self, *args, **kwargs):
+        return self.get_queryset().claim(*args, **kwargs)
+
+    def as_of(self, *args, **kwargs):
+        return self.get_queryset().as_of(*args, **kwargs)
+
+    def get_cached(self, *args, **kwargs):
+        return self.get_queryset().get_cached(*args, **kwargs)
+
+    def in_bulk_cached(self, *args, **kwargs):
+        return self.get_queryset().in_bulk_cached(*args, **kwargs)
+
+
+def QuerySetManager(qs):
+    """Factory function to create a manager from a QuerySet class."""
+    key = (BaseQuerySetManager, qs)
+    if key not in _classes:
+        name = qs.__name__ + 'Manager'
+        _classes[key] = _publish(name, (qs,), type(
+            name, (BaseQuerySetManager,), {'qs_class': qs}
+        ))
+    return _classes[key]()
+
+
+def MultiPassThroughManager(*classes):
+    """
+    Create a manager from multiple QuerySet classes
+    using multiple inheritance.
+    """
+    queryset_class = composite_queryset(*classes)
+    key = (Manager, queryset_class)
+    if key not in _classes:
+        name = queryset_class.__name__ + 'Manager'
+        _classes[key] = _publish(
+            name, classes, Manager.from_queryset(queryset_class, name)
+        )
+    manager = _classes[key]()
+    manager._built_with_as_manager = True
+    return manager
@@ -0,0 +1,82 @@
+from django.db import models
+from django.db.models import Case, Value, When
+from django.db.models.lookups import Exact, IsNull
+from django.utils.module_loading import import_string
+
+from . import settings
+
+
+def marker_fields():
+    """Return [(name, field)] of new marker fields, as configured."""
+    fields = [(
+        settings.FIELD,
+        import_string(settings.FIELD_CLASS)(**settings.FIELD_KWARGS)
+    )]
+    if settings.FLAG_FIELD:
+        fields.append((
+            settings.FLAG_FIELD,
+            models.BooleanField(**settings.FLAG_FIELD_KWARGS)
+        ))
+    return fields
+
+
+def live_values():
+    """Return {field name: value} of the marker fields of live rows."""
+    values = {settings.FIELD: settings.FIELD_DEFAULT}
+    if settings.FLAG_FIELD:
+        values[settings.FLAG_FIELD] = settings.LOOKUP_DEFAULT
+    return values
+
+
+def deleted_values(time):
+    """
+    Return {field name: value} of the marker fields of rows deleted
+    at the given time.
+    """
+    values = {settings.FIELD: time}
+    if settings.FLAG_FIELD:
+        values[settings.FLAG_FIELD] = not settings.LOOKUP_DEFAULT
+    return values
+
+
+def set_values(obj, values):
+    for name, value in values.items():
+        setattr(obj, name, value)
+
+
+def is_live(obj):
+    return getattr(obj, settings.LOOKUP_FIELD) == settings.LOOKUP_DEFAULT
+
+
+def flag_value(value):
+    """
+    Return the flag value of a removal time, or a conditional expression
+    of it when the removal time is an expression.
+    """
+    if hasattr(value, 'resolve_expression'):
+        if settings.FIELD_DEFAULT is None:
+            cond = IsNull(value, True)
+        else:
+            cond = Exact(value, settings.FIELD_DEFAULT)
+        return Case(
+            When(cond, then=Value(settings.LOOKUP_DEFAULT)),
+            default=Value(not settings.LOOKUP_DEFAULT),
+            output_field=models.BooleanField(),
+        )
+    if value == settings.FIELD_DEFAULT:
+        return settings.LOOKUP_DEFAULT
+    return not settings.LOOKUP_DEFAULT
+
+
+def sync_flag(obj):
+    """
+    Set the flag of an object from its removal time, which may have been
+    set or cleared directly, return whether the flag changed.
+    """
+    if not settings.FLAG_FIELD:
+        return False
+    flag = flag_value(getattr(obj, settings.FIELD))
+    if getattr(obj, settings.FLAG_FIELD) == flag:
+        return False
+    setattr(obj, settings.FLAG_FIELD, flag)
+    return True
@@ -1,12 +1,19 @@
-from django.db import models, router
+from contextlib import nullcontext
+
+from django.db import models, router, transaction
 from django.db.models.deletion import Collector
-from django.utils.module_loading import import_string
 
 from . import settings
+from .cache import invalidate
+from .counters import count_live, get_counters, update_counters
 from .deletion import *  # NOQA
 from .related import *  # NOQA
+from .related import forced_context
 from .query import NonDeletedQuerySet, DeletedQuerySet, PermanentQuerySet
 from .managers import QuerySetManager
+from .markers import (
+    is_live, live_values, marker_fields, set_values, sync_flag
+)
 from .signals import pre_restore, post_restore
 
 
@@ -23,6 +30,27 @@ class PermanentModel(models.Model):
     class Permanent:
         restore_on_create = False
 
+    def save(self, *args, **kwargs):
+        if sync_flag(self):
+            update_fields = kwargs.get('update_fields')
+            if (update_fields is not None and
+                    settings.FIELD in update_fields):
+                kwargs['update_fields'] = {
+                    *update_fields, settings.FLAG_FIELD
+                }
+        if self._state.adding and get_counters(self.__class__):
+            using = kwargs.get('using') or router.db_for_write(
+                self.__class__, instance=self
+            )
+            with transaction.atomic(using=using, savepoint=False):
+                super().save(*args, **kwargs)
+                update_counters(count_live(self.__class__, [self]), 1, using)
+        else:
+            super().save(*args, **kwargs)
+        invalidate(self.__class__, [self.pk], self._state.db)
+
+    save.alters_data = True
+
     def delete(self, using=None, force=False, keep_parents=False):
         using = using or router.db_for_write(self.__class__, instance=self)
         assert self._get_pk_val() is not None, (
@@ -30,17 +58,37 @@ class PermanentModel(models.Model):
             "set to None." % (self._meta.object_name, self._meta.pk.attname)
         )
         collector = Collector(using=using)
-        collector.collect([self], keep_parents=keep_parents)
+        with forced_context() if force else nullcontext():
+            collector.collect([self], keep_parents=keep_parents)
         collector.delete(force=force)
 
     delete.alters_data = True
 
+    def schedule_purge(self, using=None):
+        """
+        Soft delete the object now and queue its hard delete for the
+        process_purge_queue command.
+        """
+        from .purge.queue import enqueue
+        using = using or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            self.delete(using=using)
+            enqueue(self.__class__, [self.pk], using)
+
+    schedule_purge.alters_data = True
+
     def restore(self):
         pre_restore.send(sender=self.__class__, instance=self)
-        setattr(self, settings.FIELD, settings.FIELD_DEFAULT)
-        self.save(update_fields=[settings.FIELD])
+        deleted = not is_live(self)
+        set_values(self, live_values())
+        with transaction.atomic(using=self._state.db, savepoint=False):
+            self.save(update_fields=settings.MARKER_FIELDS)
+            if deleted:
+                update_counters(
+                    count_live(self.__class__, [self]), 1, self._state.db
+                )
         post_restore.send(sender=self.__class__, instance=self)
 
 
-field = import_string(settings.FIELD_CLASS)
-PermanentModel.add_to_class(settings.FIELD, field(**settings.FIELD_KWARGS))
+for name, field in marker_fields():
+    PermanentModel.add_to_class(name, field)
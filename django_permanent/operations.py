@@ -0,0 +1,169 @@
+import time
+
+from django.db.migrations.operations.base import Operation
+from django.db.models import Index, NOT_PROVIDED, Q
+from django.utils.timezone import now
+
+from . import settings
+from .markers import deleted_values, live_values, marker_fields
+
+
+class MakePermanent(Operation):
+    """
+    Convert the table of an existing model to a PermanentModel without
+    a maintenance window: the marker columns are added nullable without
+    a default, which doesn't rewrite the table, rows flagged by
+    legacy_field with legacy_value are marked removed_value, the time
+    of the migration by default, in keyset-paginated batches of
+    batch_size, sleeping throttle seconds between them, and an index of
+    the deleted rows is built, concurrently on PostgreSQL when the
+    migration is not atomic.
+    """
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name, legacy_field=None, legacy_value=True,
+                 removed_value=None, batch_size=10000, throttle=0,
+                 index=True):
+        self.model_name = model_name
+        self.legacy_field = legacy_field
+        self.legacy_value = legacy_value
+        self.removed_value = removed_value
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self.index = index
+
+    def deconstruct(self):
+        kwargs = {'model_name': self.model_name}
+        defaults = {
+            'legacy_field': None, 'legacy_value': True,
+            'removed_value': None, 'batch_size': 10000, 'throttle': 0,
+            'index': True,
+        }
+        for name, default in defaults.items():
+            if getattr(self, name) != default:
+                kwargs[name] = getattr(self, name)
+        return self.__class__.__name__, [], kwargs
+
+    @property
+    def model_name_lower(self):
+        return self.model_name.lower()
+
+    def state_forwards(self, app_label, state):
+        for name, field in marker_fields():
+            state.add_field(
+                app_label, self.model_name_lower, name, field, True
+            )
+
+    def state_backwards(self, app_label, state):
+        for name, field in marker_fields():
+            state.remove_field(app_label, self.model_name_lower, name)
+
+    def _index(self, model, schema_editor):
+        opts = model._meta
+        kwargs = {}
+        if schema_editor.connection.features.supports_partial_indexes:
+            kwargs['condition'] = ~Q(**{
+                settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT
+            })
+        return Index(
+            fields=[settings.LOOKUP_FIELD],
+            name=schema_editor._create_index_name(
+                opts.db_table, [opts.get_field(settings.LOOKUP_FIELD).column],
+                suffix='_deleted'
+            ),
+            **kwargs
+        )
+
+    def _concurrently(self, schema_editor):
+        connection = schema_editor.connection
+        return (connection.vendor == 'postgresql' and
+                not connection.in_atomic_block)
+
+    def _update(self, model, schema_editor, lookups, values):
+        """Update the rows matching the lookups in batches."""
+        manager = model._base_manager.using(schema_editor.connection.alias)
+        last_pk = None
+        while True:
+            batch = manager.filter(**lookups)
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pk_list = list(
+                batch.order_by('pk').values_list('pk', flat=True)[
+                    :self.batch_size
+                ]
+            )
+            if not pk_list:
+                return
+            manager.filter(pk__in=pk_list).update(**values)
+            last_pk = pk_list[-1]
+            if self.throttle:
+                time.sleep(self.throttle)
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(
+                schema_editor.connection.alias, model):
+            return
+        # Nullable without a default and an index the columns are added
+        # in place, the configured definitions are applied once filled.
+        columns = []
+        for name, column in marker_fields():
+            column.null, column.default, column.db_index = True, None, False
+            column.set_attributes_from_name(name)
+            column.model = model
+            schema_editor.add_field(model, column)
+            columns.append(column)
+
+        if self.legacy_field:
+            value = self.removed_value
+            if value is None:
+                value = now()
+            self._update(
+                model, schema_editor,
+                {self.legacy_field: self.legacy_value}, deleted_values(value)
+            )
+        for column in columns:
+            field = model._meta.get_field(column.name)
+            if field.null and field.default in (None, NOT_PROVIDED):
+                continue
+            if not field.null:
+                self._update(
+                    model, schema_editor, {'%s__isnull' % field.name: True},
+                    {field.name: live_values()[field.name]}
+                )
+            schema_editor.alter_field(model, column, field)
+
+        if self.index:
+            index = self._index(model, schema_editor)
+            if self._concurrently(schema_editor):
+                schema_editor.execute(
+                    index.create_sql(model, schema_editor, concurrently=True)
+                )
+            else:
+                schema_editor.add_index(model, index)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(
+                schema_editor.connection.alias, model):
+            return
+        if self.index:
+            index = self._index(model, schema_editor)
+            if self._concurrently(schema_editor):
+                schema_editor.execute(index.remove_sql(
+                    model, schema_editor, concurrently=True
+                ))
+            else:
+                schema_editor.remove_index(model, index)
+        for name, field in marker_fields():
+            schema_editor.remove_field(model, model._meta.get_field(name))
+
+    def describe(self):
+        return 'Make %s permanent' % self.model_name
+
+    @property
+    def migration_name_fragment(self):
+        return 'make_permanent_%s' % self.model_name_lower
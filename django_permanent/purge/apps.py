@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class PurgeConfig(AppConfig):
+    name = 'django_permanent.purge'
+    label = 'permanent_purge'
+    verbose_name = 'Permanent purge queue'
+    default_auto_field = 'django.db.models.BigAutoField'
@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ...queue import process_queue, process_queues
+
+
+class Command(BaseCommand):
+    help = (
+        'Hard delete the objects queued by schedule_purge() in bounded '
+        'batches, one transaction per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Stop after this many batches, the queue is drained '
+                 'by default.'
+        )
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument(
+            '--retry-delay', type=float, default=300,
+            help='Seconds before the first retry of a failed object, '
+                 'doubled on every attempt.'
+        )
+        parser.add_argument(
+            '--sleep', type=float,
+            help='Keep polling the queue, sleeping this many seconds '
+                 'when it is empty.'
+        )
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Process the queue of this database, can be repeated.'
+        )
+        parser.add_argument(
+            '--parallel', type=int, nargs='?', const=0,
+            help='Process the databases in threads, at most this many at '
+                 'a time, one per database by default.'
+        )
+
+    def handle(self, *args, **options):
+        databases = options['databases'] or [DEFAULT_DB_ALIAS]
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'max_batches': options['max_batches'],
+            'max_attempts': options['max_attempts'],
+            'retry_delay': timedelta(seconds=options['retry_delay']),
+        }
+        while True:
+            if options['parallel'] is None:
+                results = {
+                    alias: process_queue(using=alias, **kwargs)
+                    for alias in databases
+                }
+                errors = {}
+            else:
+                results, errors = process_queues(
+                    databases, options['parallel'] or None, **kwargs
+                )
+            busy = any(stats.batches for stats in results.values())
+            if busy or options['sleep'] is None:
+                for alias, stats in results.items():
+                    if len(databases) > 1:
+                        self.stdout.write('%s: %s' % (alias, stats))
+                    else:
+                        self.stdout.write(str(stats))
+            for alias, error in errors.items():
+                self.stderr.write(
+                    '%s: %s: %s' % (alias, type(error).__name__, error)
+                )
+            if options['sleep'] is None:
+                if errors:
+                    raise CommandError(
+                        'Failed on %s.' % ', '.join(sorted(errors))
+                    )
+                return
+            if not busy:
+                time.sleep(options['sleep'])
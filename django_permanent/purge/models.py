@@ -0,0 +1,24 @@
+from django.db import models
+from django.utils.timezone import now
+
+
+class PurgeRequest(models.Model):
+    """A soft deleted object waiting for its hard delete."""
+    model = models.CharField(max_length=255)
+    object_pk = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=now)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('available_at', 'pk')
+        indexes = [
+            models.Index(
+                fields=['available_at', 'attempts'],
+                name='permanent_purge_available',
+            ),
+        ]
+
+    def __str__(self):
+        return '%s:%s' % (self.model, self.object_pk)
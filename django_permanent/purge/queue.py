@@ -0,0 +1,186 @@
+import time
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.timezone import now
+
+from .. import settings
+from ..across import run_across
+
+
+def get_queue_model():
+    if not apps.is_installed('django_permanent.purge'):
+        raise ImproperlyConfigured(
+            "Add 'django_permanent.purge' to INSTALLED_APPS to schedule "
+            "purges."
+        )
+    return apps.get_model('permanent_purge', 'PurgeRequest')
+
+
+def enqueue(model, pk_list, using=DEFAULT_DB_ALIAS):
+    """Queue the hard delete of the objects of the model."""
+    PurgeRequest = get_queue_model()
+    PurgeRequest.objects.using(using).bulk_create([
+        PurgeRequest(model=model._meta.label_lower, object_pk=str(pk))
+        for pk in pk_list
+    ])
+
+
+def schedule_purge(queryset):
+    """
+    Soft delete the objects of the queryset now and queue their hard
+    delete. Return the number of queued objects.
+    """
+    get_queue_model()
+    model = queryset.model
+    with transaction.atomic(using=queryset.db):
+        pk_list = list(queryset.values_list('pk', flat=True))
+        # Objects deleted already keep their removal time
+        model.all_objects.using(queryset.db).filter(**{
+            'pk__in': pk_list, settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT,
+        }).delete()
+        enqueue(model, pk_list, queryset.db)
+    return len(pk_list)
+
+
+class PurgeStats:
+    """Throughput metrics of a process_queue() run."""
+    def __init__(self):
+        self.batches = 0
+        self.purged = 0
+        self.rows = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        """Purged objects per second."""
+        return self.purged / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            'Purged %d objects (%d rows) in %d batches, %d failed, '
+            '%.3fs, %.1f objects/s' % (
+                self.purged, self.rows, self.batches, self.failed,
+                self.seconds, self.rate
+            )
+        )
+
+
+def _purge(model, requests, using):
+    """Hard delete the objects of the requests, return the deleted rows."""
+    pk_list = [
+        model._meta.pk.to_python(request.object_pk) for request in requests
+    ]
+    with transaction.atomic(using=using):
+        count, _rows_count = model.all_objects.using(using).filter(
+            pk__in=pk_list
+        ).delete(force=True)
+    return count
+
+
+def _fail(requests, error, retry_delay, using):
+    for request in requests:
+        request.attempts += 1
+        request.last_error = '%s: %s' % (type(error).__name__, error)
+        # Exponential backoff
+        request.available_at = now() + retry_delay * 2 ** (
+            request.attempts - 1
+        )
+    type(requests[0]).objects.using(using).bulk_update(
+        requests, ['attempts', 'last_error', 'available_at']
+    )
+
+
+def process_batch(batch_size=100, max_attempts=5,
+                  retry_delay=timedelta(minutes=5), using=DEFAULT_DB_ALIAS,
+                  stats=None):
+    """
+    Hard delete a batch of queued objects in a single transaction.
+    A failing model is retried object by object, failing objects are
+    retried later with exponential backoff up to max_attempts times.
+    Return the number of processed requests.
+    """
+    PurgeRequest = get_queue_model()
+    stats = stats or PurgeStats()
+    started = time.monotonic()
+    features = connections[using].features
+    with transaction.atomic(using=using):
+        requests = PurgeRequest.objects.using(using).filter(
+            available_at__lte=now(), attempts__lt=max_attempts
+        ).select_for_update(
+            skip_locked=features.has_select_for_update_skip_locked
+        )
+        requests = list(requests[:batch_size])
+        if not requests:
+            return 0
+
+        done = []
+        requests.sort(key=attrgetter('model'))
+        for label, group in groupby(requests, attrgetter('model')):
+            group = list(group)
+            try:
+                model = apps.get_model(label)
+            except LookupError as e:
+                stats.failed += len(group)
+                _fail(group, e, retry_delay, using)
+                continue
+            try:
+                stats.rows += _purge(model, group, using)
+                done.extend(group)
+                continue
+            except Exception as e:
+                if len(group) == 1:
+                    stats.failed += 1
+                    _fail(group, e, retry_delay, using)
+                    continue
+            # Isolate the failing objects of the model
+            for request in group:
+                try:
+                    stats.rows += _purge(model, [request], using)
+                    done.append(request)
+                except Exception as e:
+                    stats.failed += 1
+                    _fail([request], e, retry_delay, using)
+
+        PurgeRequest.objects.using(using).filter(
+            pk__in=[request.pk for request in done]
+        ).delete()
+        stats.purged += len(done)
+
+    stats.batches += 1
+    stats.seconds += time.monotonic() - started
+    return len(requests)
+
+
+def process_queue(batch_size=100, max_batches=None, max_attempts=5,
+                  retry_delay=timedelta(minutes=5), using=DEFAULT_DB_ALIAS):
+    """
+    Drain the available requests in batches of batch_size, at most
+    max_batches of them, and return the PurgeStats.
+    """
+    stats = PurgeStats()
+    while max_batches is None or stats.batches < max_batches:
+        if not process_batch(batch_size, max_attempts, retry_delay, using,
+                             stats):
+            break
+    return stats
+
+
+def _process_queue(alias, kwargs):
+    return process_queue(using=alias, **kwargs)
+
+
+def process_queues(aliases, max_workers=None, **kwargs):
+    """
+    Drain the queues of the database aliases concurrently with
+    run_across(), process_queue() takes the kwargs. Return the PurgeStats
+    and the exceptions by alias.
+    """
+    return run_across(
+        _process_queue, {alias: (kwargs,) for alias in aliases}, max_workers
+    )
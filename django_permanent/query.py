@@ -1,16 +1,126 @@
 import copy
-from functools import partial
-
+from contextlib import contextmanager, nullcontext
+from functools import partial, reduce
+from operator import or_
+
+from django.db import IntegrityError, connections, transaction
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import (
+    Exists, Model, OuterRef, UniqueConstraint, sql
+)
 from django.db.models.deletion import Collector
 from django.db.models.query import QuerySet
 
 from django.db.models.query_utils import Q
 from django.db.models.sql.where import WhereNode
+from django.utils.timezone import now
 
 from . import settings
 
-from .signals import pre_restore, post_restore
-from .related import show_all_context
+from .bulk import update_pks
+from .cache import get_many, invalidate, is_cached
+from .cascade import get_plan
+from .counters import count_live, get_counters, update_counters
+from .markers import (
+    deleted_values, flag_value, is_live, live_values, set_values,
+    sync_flag
+)
+from .signals import (
+    pre_restore, post_restore, pre_bulk_restore, post_bulk_restore
+)
+from .related import (
+    as_of_context, forced_context, show_all_context
+)
+
+
+def can_update_returning(using):
+    """Check if the backend supports UPDATE ... RETURNING."""
+    connection = connections[using]
+    return (connection.vendor in ('postgresql', 'sqlite') and
+            connection.features.can_return_columns_from_insert)
+
+
+def update_returning(queryset, values):
+    """
+    Update the queryset in a single UPDATE ... RETURNING statement
+    and return the updated model instances.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    query.clear_select_clause()
+    compiler = query.get_compiler(queryset.db)
+    update_sql, params = compiler.as_sql()
+    if not update_sql:
+        return []
+
+    fields = model._meta.concrete_fields
+    update_sql += ' RETURNING %s' % ', '.join(
+        connection.ops.quote_name(field.column) for field in fields
+    )
+    converters = []
+    for field in fields:
+        col = field.get_col(model._meta.db_table)
+        converters.append((col, (
+            connection.ops.get_db_converters(col) +
+            field.get_db_converters(connection)
+        )))
+
+    with transaction.mark_for_rollback_on_error(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute(update_sql, params)
+            rows = cursor.fetchall()
+
+    attnames = [field.attname for field in fields]
+    objs = []
+    for row in rows:
+        row = list(row)
+        for i, (col, col_converters) in enumerate(converters):
+            for converter in col_converters:
+                row[i] = converter(row[i], col, connection)
+        objs.append(model.from_db(queryset.db, attnames, row))
+    return objs
+
+
+def sort_instances(model, objs, order_by):
+    """
+    Sort the instances in place like the order_by field names, NULLs last.
+    Leave them as they are if order_by has expressions or lookups.
+    """
+    opts = model._meta
+    keys = []
+    for name in order_by:
+        if not isinstance(name, str):
+            return
+        try:
+            field = opts.get_field(name.lstrip('-'))
+        except FieldDoesNotExist:
+            if name.lstrip('-') != 'pk':
+                return
+            field = opts.pk
+        keys.append((field.attname, name.startswith('-')))
+    for attname, descending in reversed(keys):
+        def key(obj, attname=attname, descending=descending):
+            value = getattr(obj, attname)
+            return (value is None) != descending, value
+        objs.sort(key=key, reverse=descending)
+
+
+def update_marker(queryset, values):
+    """
+    Set the marker values of the queryset rows with a single UPDATE of the
+    table holding them. Django pre-selects the pks of multi-table inheritance
+    children and updates every table of the chain, the owner is updated
+    through a subquery instead where the backend allows it.
+    """
+    owner = get_plan(queryset.model).marker_model
+    if (owner is queryset.model._meta.concrete_model or
+            not connections[queryset.db].features.update_can_self_select):
+        return queryset.update(**values)
+    return owner.all_objects.using(queryset.db).filter(
+        pk__in=queryset.values('pk')
+    ).update(**values)
 
 
 class BasePermanentQuerySet(QuerySet):
@@ -27,11 +137,13 @@ class BasePermanentQuerySet(QuerySet):
         super().__init__(*args, **kwargs)
 
         self._unpatched = False
+        self._as_of = None
 
     def create(self, **kwargs):
         if not self._unpatched:
-            if (self.model.Permanent.restore_on_create and
-                    not kwargs.get(settings.FIELD)):
+            permanent = self.model.Permanent
+            if (getattr(permanent, 'restore_on_create', False) and
+                    not any(map(kwargs.get, settings.MARKER_FIELDS))):
                 qs = self.get_unpatched()
                 return qs.get_restore_or_create(**kwargs)
         return super().create(**kwargs)
@@ -44,12 +156,19 @@ class BasePermanentQuerySet(QuerySet):
         else:
             geter, seter = partial(getattr, obj), partial(setattr, obj)
 
-        if not created and geter(settings.FIELD, True):
+        if (not created and
+                geter(settings.LOOKUP_FIELD, True) != settings.LOOKUP_DEFAULT):
             pre_restore.send(sender=self.model, instance=obj)
-            seter(settings.FIELD, settings.FIELD_DEFAULT)
-            self.model.all_objects.filter(id=geter('id')).update(
-                **{settings.FIELD: settings.FIELD_DEFAULT}
-            )
+            values = live_values()
+            for name, value in values.items():
+                seter(name, value)
+            restored = self.model.all_objects.filter(id=geter('id'))
+            with transaction.atomic(using=restored.db, savepoint=False):
+                restored.update(**values)
+                if get_counters(self.model):
+                    update_counters(
+                        count_live(self.model, restored), 1, restored.db
+                    )
             post_restore.send(sender=self.model, instance=obj)
 
         return obj
@@ -79,7 +198,8 @@ class BasePermanentQuerySet(QuerySet):
         del_query.query.clear_ordering(force=True)
 
         collector = Collector(using=del_query.db, origin=self)
-        collector.collect(del_query)
+        with forced_context() if force else nullcontext():
+            collector.collect(del_query)
         deleted, _rows_count = collector.delete(force=force)
 
         # Clear the result cache, in case this QuerySet gets reused.
@@ -89,15 +209,315 @@ class BasePermanentQuerySet(QuerySet):
 
     delete.alters_data = True
 
-    def restore(self):
-        return self.get_unpatched().update(
-            **{settings.FIELD: settings.FIELD_DEFAULT}
+    def schedule_purge(self):
+        """
+        Soft delete the records in the current QuerySet now and queue their
+        hard delete for the process_purge_queue command. Return the number
+        of queued records.
+        """
+        from .purge.queue import schedule_purge
+        return schedule_purge(self)
+
+    schedule_purge.alters_data = True
+
+    def claim(self, batch_size, order_by=None):
+        """
+        Soft delete the first batch_size live records of the current
+        QuerySet by order_by, the pk by default, and return them. Records
+        locked by concurrent claims are skipped, the batch is claimed with
+        a single UPDATE ... WHERE pk IN (SELECT ... FOR UPDATE SKIP LOCKED)
+        RETURNING statement where the backend allows it. Like update(), it
+        doesn't cascade and sends no signals.
+
+        Without SELECT ... FOR UPDATE and UPDATE ... RETURNING, on SQLite
+        before 3.35, concurrent claims need BEGIN IMMEDIATE transactions
+        not to claim the same records.
+        """
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with claim().")
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        order_by = list(order_by or ['pk'])
+
+        qs = self.get_unpatched()
+        qs._for_write = True
+        using = qs.db
+        features = connections[using].features
+        live = {settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT}
+        batch = qs.using(using).filter(**live).order_by(*order_by)
+        batch = batch[:batch_size]
+        if features.has_select_for_update:
+            batch = batch.select_for_update(
+                skip_locked=features.has_select_for_update_skip_locked,
+                of=('self',) if features.has_select_for_update_of else (),
+            )
+        values = deleted_values(now())
+        owner = get_plan(self.model).marker_model
+
+        with transaction.atomic(using=using, savepoint=False):
+            if (can_update_returning(using) and
+                    owner is self.model._meta.concrete_model and
+                    not get_counters(self.model)):
+                # Rows claimed meanwhile are no longer live
+                objs = update_returning(
+                    self.model.all_objects.using(using).filter(
+                        pk__in=batch.values('pk'), **live
+                    ), values
+                )
+                sort_instances(self.model, objs, order_by)
+            else:
+                objs = list(batch)
+                update_pks(owner, [obj.pk for obj in objs], values, using)
+                update_counters(count_live(self.model, objs), -1, using)
+                for obj in objs:
+                    set_values(obj, values)
+            invalidate(self.model, [obj.pk for obj in objs], using)
+        return objs
+
+    claim.alters_data = True
+
+    def restore(self, returning=False, signals=None, on_conflict=None):
+        """
+        Restore the deleted records in the current QuerySet with a single
+        UPDATE. Return the number of restored rows or, with returning=True,
+        the restored instances.
+
+        signals='batch' sends pre_bulk_restore and post_bulk_restore once
+        for the whole batch. on_conflict='error' raises IntegrityError
+        before writing anything if a restored row would collide with a live
+        unique row, on_conflict='skip' leaves such rows deleted.
+        """
+        if signals not in (None, 'batch'):
+            raise ValueError("signals must be None or 'batch'.")
+        if on_conflict not in (None, 'skip', 'error'):
+            raise ValueError("on_conflict must be None, 'skip' or 'error'.")
+
+        qs = self.get_unpatched()
+        # The negated patch of deleted_objects survives get_unpatched()
+        if not isinstance(self, DeletedQuerySet) or self._unpatched:
+            qs.query.add_q(
+                ~Q(**{settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT})
+            )
+
+        if on_conflict is not None:
+            conflicts = qs._restore_conflicts()
+            if conflicts is not None:
+                if on_conflict == 'error':
+                    pk_list = list(
+                        qs.filter(conflicts).values_list('pk', flat=True)
+                    )
+                    if pk_list:
+                        raise IntegrityError(
+                            "Restoring %s objects %r would violate a unique "
+                            "constraint." % (
+                                self.model._meta.object_name, pk_list
+                            )
+                        )
+                else:
+                    qs.query.add_q(~conflicts)
+
+        values = live_values()
+        if not (returning or signals or is_cached(self.model) or
+                get_counters(self.model)):
+            return update_marker(qs, values)
+
+        with transaction.atomic(using=qs.db, savepoint=False):
+            if signals:
+                pre_bulk_restore.send(
+                    sender=self.model, queryset=qs, using=qs.db
+                )
+            owner = get_plan(self.model).marker_model
+            if (can_update_returning(qs.db) and
+                    owner is self.model._meta.concrete_model):
+                objs = update_returning(qs, values)
+            else:
+                objs = list(qs.select_for_update())
+                update_pks(owner, [obj.pk for obj in objs], values, qs.db)
+                for obj in objs:
+                    set_values(obj, values)
+            invalidate(self.model, [obj.pk for obj in objs], qs.db)
+            update_counters(count_live(self.model, objs), 1, qs.db)
+            if signals:
+                post_bulk_restore.send(
+                    sender=self.model, instances=objs, using=qs.db
+                )
+
+        return objs if returning else len(objs)
+
+    def update(self, **kwargs):
+        if (settings.FLAG_FIELD and settings.FIELD in kwargs and
+                settings.FLAG_FIELD not in kwargs):
+            # The flag follows the removal time written
+            kwargs[settings.FLAG_FIELD] = flag_value(kwargs[settings.FIELD])
+        if is_cached(self.model):
+            invalidate(
+                self.model, list(self.values_list('pk', flat=True)), self.db
+            )
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            sync_flag(obj)
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # New pks might have been cached as missing
+        invalidate(
+            self.model, [obj.pk for obj in objs if obj.pk is not None],
+            self.db
         )
+        # Rows skipped or updated on conflict can't be told apart
+        if not (kwargs.get('ignore_conflicts') or
+                kwargs.get('update_conflicts')):
+            update_counters(count_live(self.model, objs), 1, self.db)
+        return objs
+
+    def get_cached(self, pk):
+        """
+        Return the object with the given pk from the object cache,
+        respecting the visibility of the queryset.
+        """
+        obj = self.in_bulk_cached([pk]).get(self.model._meta.pk.to_python(pk))
+        if obj is None:
+            raise self.model.DoesNotExist(
+                "%s matching query does not exist." %
+                self.model._meta.object_name
+            )
+        return obj
+
+    def in_bulk_cached(self, pk_list):
+        """
+        Return {pk: object} for the given pks from the object cache,
+        respecting the visibility of the queryset. Other filters of the
+        queryset are not applied.
+        """
+        if not is_cached(self.model):
+            return self.in_bulk(pk_list)
+        objs = get_many(self.model, pk_list, self.db)
+        return {pk: obj for pk, obj in objs.items() if self._is_visible(obj)}
+
+    def _is_visible(self, obj):
+        return True
+
+    def _restore_conflicts(self):
+        """
+        Build the anti-join condition matching rows of the current QuerySet
+        which would collide with a live row, or with a restored row with
+        a lower pk, on any unique field set.
+        """
+        opts = self.model._meta
+        unique_sets = [
+            ((field.name,), None) for field in opts.local_concrete_fields
+            if field.unique and not field.primary_key
+        ]
+        unique_sets.extend(
+            (tuple(fields), None) for fields in opts.unique_together
+        )
+        unique_sets.extend(
+            (constraint.fields, constraint.condition)
+            for constraint in opts.constraints
+            if isinstance(constraint, UniqueConstraint) and constraint.fields
+        )
+
+        conditions = []
+        for fields, condition in unique_sets:
+            if settings.LOOKUP_FIELD in fields:
+                if settings.LOOKUP_DEFAULT is None:
+                    # NULL markers never collide
+                    continue
+                fields = [
+                    name for name in fields
+                    if name not in settings.MARKER_FIELDS
+                ]
+            match = Q(**{name: OuterRef(name) for name in fields})
+            live = self.model.objects.filter(match).exclude(pk=OuterRef('pk'))
+            if condition is not None:
+                live = live.filter(condition)
+            peers = self.filter(match, pk__lt=OuterRef('pk'))
+            conditions.extend([Exists(live), Exists(peers)])
+
+        if not conditions:
+            return None
+        return reduce(or_, conditions)
+
+    def as_of(self, timestamp):
+        """
+        Return objects which were live at the given time: created before it
+        (when Permanent.created_field is set) and not removed until it.
+        Joins are restricted the same way while the query runs.
+        """
+        qs = self.get_unpatched()
+        cond = Q(**{settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT}) | Q(
+            **{'%s__gt' % settings.FIELD: timestamp}
+        )
+        created_field = getattr(self.model.Permanent, 'created_field', None)
+        if created_field:
+            cond &= Q(**{'%s__lte' % created_field: timestamp})
+        qs.query.add_q(cond)
+        qs._as_of = timestamp
+        return qs
+
+    def _fetch_context(self):
+        """Context the results of the queryset are fetched in."""
+        return self._as_of_context()
+
+    def _fetch_all(self):
+        with self._fetch_context():
+            return super()._fetch_all()
+
+    def _iterator(self, use_chunked_fetch, chunk_size):
+        # The context is only held while the iterator advances, including
+        # the prefetch of every chunk. It must not leak into the code
+        # consuming the results between the steps.
+        iterator = super()._iterator(use_chunked_fetch, chunk_size)
+        while True:
+            with self._fetch_context():
+                try:
+                    obj = next(iterator)
+                except StopIteration:
+                    return
+            yield obj
+
+    async def aiterator(self, chunk_size=2000):
+        iterator = super().aiterator(chunk_size).__aiter__()
+        while True:
+            with self._fetch_context():
+                try:
+                    obj = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield obj
+
+    def count(self):
+        with self._as_of_context():
+            return super().count()
+
+    def exists(self):
+        with self._as_of_context():
+            return super().exists()
+
+    def aggregate(self, *args, **kwargs):
+        with self._as_of_context():
+            return super().aggregate(*args, **kwargs)
+
+    def _as_of_context(self):
+        if self._as_of is None:
+            return nullcontext()
+        return as_of_context(self._as_of)
 
     def _update(self, values, *args, **kwargs):
         # Modifying trigger field has to affect all objects
         field_names = [field.attname for field, _, _ in values]
-        if (settings.FIELD in field_names and
+        if (settings.FLAG_FIELD and settings.FIELD in field_names and
+                settings.FLAG_FIELD not in field_names):
+            # The flag follows the removal time written
+            field, model, value = values[field_names.index(settings.FIELD)]
+            values = [*values, (
+                field.model._meta.get_field(settings.FLAG_FIELD), model,
+                flag_value(value),
+            )]
+        if (set(settings.MARKER_FIELDS).intersection(field_names) and
                 not getattr(self, '_unpatched', False)):
             return self.get_unpatched()._update(values, *args, **kwargs)
         return super()._update(values, *args, **kwargs)
@@ -110,9 +530,13 @@ class BasePermanentQuerySet(QuerySet):
     def _clone(self, *args, **kwargs):
         c = super()._clone(*args, **kwargs)
         # We need clones stay unpatched
+        c._as_of = self._as_of
         if getattr(self, '_unpatched', False):
             c._unpatched = True
-            c._unpatch()
+            # Only an empty where gets patched again in __init__, user
+            # filters on the marker field must survive cloning.
+            if not self.query.where:
+                c._unpatch()
         return c
 
     def _patch(self, q_object):
@@ -135,7 +559,7 @@ class BasePermanentQuerySet(QuerySet):
         #   -> negated 'isnull' or NOT with None
         is_auto_patch = False
         if (hasattr(condition, 'lhs') and
-                condition.lhs.target.name == settings.FIELD):
+                condition.lhs.target.name == settings.LOOKUP_FIELD):
             # Check if it's a simple isnull or exact lookup
             # (not range, gte, etc.)
             lookup_name = getattr(condition, 'lookup_name', None)
@@ -150,7 +574,10 @@ class NonDeletedQuerySet(BasePermanentQuerySet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not self.query.where:
-            self._patch(Q(**{settings.FIELD: settings.FIELD_DEFAULT}))
+            self._patch(Q(**{settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT}))
+
+    def _is_visible(self, obj):
+        return is_live(obj)
 
 
 class DeletedWhereNode(WhereNode):
@@ -162,7 +589,18 @@ class DeletedQuerySet(BasePermanentQuerySet):
         super().__init__(*args, **kwargs)
         if not self.query.where:
             self.query.where_class = DeletedWhereNode
-            self._patch(~Q(**{settings.FIELD: settings.FIELD_DEFAULT}))
+            self._patch(
+                ~Q(**{settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT})
+            )
+
+    def _is_visible(self, obj):
+        return not is_live(obj)
+
+
+def _mark_show_all(obj):
+    if isinstance(obj, Model):
+        obj._permanent_show_all = True
+    return obj
 
 
 class AllWhereNode(WhereNode):
@@ -175,8 +613,19 @@ class PermanentQuerySet(BasePermanentQuerySet):
         if not self.query.where:
             self.query.where_class = AllWhereNode
 
-    def _fetch_all(self):
+    @contextmanager
+    def _fetch_context(self):
         # Set context variable before fetching to indicate all objects
         # should be shown (async-safe with contextvars)
-        with show_all_context():
-            return super()._fetch_all()
+        with show_all_context(), super()._fetch_context():
+            yield
+
+    # Streamed objects are consumed once the fetch context is gone, they
+    # are marked for their forward relations to show deleted objects too.
+    def _iterator(self, use_chunked_fetch, chunk_size):
+        for obj in super()._iterator(use_chunked_fetch, chunk_size):
+            yield _mark_show_all(obj)
+
+    async def aiterator(self, chunk_size=2000):
+        async for obj in super().aiterator(chunk_size):
+            yield _mark_show_all(obj)
@@ -1,9 +1,16 @@
 import contextvars
 from contextlib import contextmanager
 
+from django.db import router, transaction
 from django.db.models.fields.related import ForeignObject
+from django.db.models.fields.reverse_related import ForeignObjectRel
 from django.db.models.expressions import Col
-from django.db.models.sql.where import WhereNode
+from django.db.models.lookups import In
+from django.db.models.sql.query import Query
+from django.db.models.sql.where import AND, OR, WhereNode
+from django.db.models.utils import resolve_callables
+from django.db.models import Max, signals
+from django.db.models.fields import related_descriptors
 from django.db.models.fields.related_descriptors import (
     ForwardManyToOneDescriptor as Descriptor
 )
@@ -17,6 +24,9 @@ _show_all_permanent = contextvars.ContextVar(
     default=False
 )
 _is_deleting = contextvars.ContextVar('is_deleting', default=False)
+_as_of = contextvars.ContextVar('permanent_as_of', default=None)
+_is_forced = contextvars.ContextVar('permanent_forced', default=False)
+_identity_map = contextvars.ContextVar('permanent_identity_map', default=None)
 
 
 @contextmanager
@@ -30,106 +40,360 @@ def deletion_context():
 
 
 @contextmanager
-def show_all_context():
+def forced_context():
+    """
+    Context manager for collecting a hard delete, which cascades to
+    the soft deleted children too (async-safe).
+    """
+    token = _is_forced.set(True)
+    try:
+        yield
+    finally:
+        _is_forced.reset(token)
+
+
+@contextmanager
+def identity_map_context():
+    """
+    Context manager memoizing the related objects which forward relations
+    fetch through all_objects, by database alias, model and primary key,
+    until it exits.
+    Nested contexts share the outer map (async-safe).
+    """
+    if _identity_map.get() is not None:
+        yield
+        return
+    token = _identity_map.set({})
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+@contextmanager
+def show_all_context(identity_map=False):
     """
         Context manager for showing all objects including deleted (async-safe).
+        identity_map=True memoizes the related objects within it, see
+        identity_map_context().
     """
     token = _show_all_permanent.set(True)
     try:
-        yield
+        if identity_map:
+            with identity_map_context():
+                yield
+        else:
+            yield
     finally:
         _show_all_permanent.reset(token)
 
 
+@contextmanager
+def as_of_context(timestamp):
+    """
+    Context manager restricting joins to objects which were live
+    at the given time (async-safe).
+    """
+    token = _as_of.set(timestamp)
+    try:
+        yield
+    finally:
+        _as_of.reset(token)
+
+
+def marker_model(model):
+    """
+    Return the concrete model whose table holds the marker column,
+    a parent of multi-table inheritance children.
+    """
+    return model._meta.get_field(
+        settings.LOOKUP_FIELD
+    ).model._meta.concrete_model
+
+
+def visibility_condition(model, alias):
+    """
+    Build the condition restricting model rows at alias to live ones,
+    or to the ones live at the as_of_context() time.
+    """
+    lookup_field = model._meta.get_field(settings.LOOKUP_FIELD)
+    lookup_col = Col(alias, lookup_field, lookup_field)
+    if settings.LOOKUP_DEFAULT is None:
+        live = lookup_field.get_lookup('isnull')(lookup_col, True)
+    else:
+        live = lookup_field.get_lookup('exact')(
+            lookup_col, settings.LOOKUP_DEFAULT
+        )
+
+    timestamp = _as_of.get()
+    if timestamp is None:
+        return live
+
+    field = model._meta.get_field(settings.FIELD)
+    removed_later = field.get_lookup('gt')(
+        Col(alias, field, field), timestamp
+    )
+    cond = WhereNode([live, removed_later], connector=OR)
+    created_field = getattr(model.Permanent, 'created_field', None)
+    if created_field:
+        created = model._meta.get_field(created_field)
+        created_before = created.get_lookup('lte')(
+            Col(alias, created, created), timestamp
+        )
+        cond = WhereNode([created_before, cond], connector=AND)
+    return cond
+
+
+def restrict(model, alias, cond):
+    """
+    Add the visibility condition of a PermanentModel joined at alias
+    to the join condition.
+    """
+    from .models import PermanentModel
+
+    # Check if we're in an all_objects context - don't filter if so.
+    # Point-in-time queries always restrict joins.
+    if not issubclass(model, PermanentModel) or (
+            _show_all_permanent.get() and _as_of.get() is None):
+        return cond
+    if cond is None:
+        cond = WhereNode()
+    owner = marker_model(model)
+    if owner is model._meta.concrete_model:
+        cond.add(visibility_condition(model, alias), AND)
+    else:
+        cond.add(visible_pks(model, owner, alias), AND)
+    return cond
+
+
+def visible_pks(model, owner, alias):
+    """
+    Build the condition restricting rows of a multi-table inheritance
+    child at alias to the visible rows of the parent table holding the
+    marker, which the query may not join or only join after the child.
+    """
+    query = Query(owner)
+    query.where.add(
+        visibility_condition(owner, query.get_initial_alias()), AND
+    )
+    query.add_fields([owner._meta.pk.attname])
+    query.subquery = True
+    pk = model._meta.pk
+    return In(Col(alias, pk, pk), query)
+
+
 def get_extra_restriction_patch(func):
     def wrapper(self, alias, related_alias):
         cond = func(self, alias, related_alias)
 
-        from .models import PermanentModel
-
         # In Django 5.2+, get_extra_restriction is called with
         # (alias, related_alias) where alias is the table being joined TO
         # (target of ForeignKey) and related_alias is the table containing
-        # the ForeignKey
+        # the ForeignKey.
+        #
+        # Only the joined table is restricted, in the ON clause where it
+        # keeps LEFT OUTER joins intact. The table it is joined from is
+        # restricted once already, in the WHERE clause by the manager or
+        # by its own join.
+        if alias is not None:
+            # Parent link joins of multi-table inheritance extend the same
+            # row, which is restricted already: by the manager or by the
+            # join of the child.
+            if self.remote_field.parent_link:
+                return cond
+            return restrict(self.remote_field.model, alias, cond)
 
-        # Check if we're in an all_objects context - don't filter if so
-        if _show_all_permanent.get():
+        # The first join of an exclude() subquery is trimmed, the table
+        # containing the ForeignKey becomes its base table. NOTE: not
+        # during DELETE/CASCADE to avoid IntegrityError.
+        if _is_deleting.get():
             return cond
+        return restrict(self.model, related_alias, cond)
+    return wrapper
+
+
+def get_reverse_extra_restriction_patch(func):
+    def wrapper(self, alias, related_alias):
+        # Reverse join: alias is the table containing the ForeignKey,
+        # joined from the table it points to. Skip the underlying
+        # ForeignObject patch which would restrict the latter.
+        if (type(self.field).get_extra_restriction is
+                ForeignObject.get_extra_restriction):
+            cond = func(self.field, related_alias, alias)
+        else:
+            cond = self.field.get_extra_restriction(related_alias, alias)
 
-        if cond is None:
-            cond = WhereNode()
-
-        # Case 1: Filter the target model if it's PermanentModel
-        # (e.g., when joining from PermanentDepended to MyPermanentModel)
-        target_model = self.remote_field.model
-        if issubclass(target_model, PermanentModel):
-            try:
-                field = target_model._meta.get_field(settings.FIELD)
-                if settings.FIELD_DEFAULT is None:
-                    lookup = field.get_lookup('isnull')(
-                        Col(alias, field, field), True
-                    )
-                else:
-                    lookup = field.get_lookup('exact')(
-                        Col(alias, field, field), settings.FIELD_DEFAULT
-                    )
-                cond.add(lookup, 'AND')
-            except Exception:
-                pass
-
-        # Case 2: Also filter the source model if it's PermanentModel
-        # (e.g., when joining through PermanentM2MThrough)
         # NOTE: We ONLY do this for SELECT queries, NOT for DELETE/CASCADE
         # operations to avoid IntegrityError during CASCADE deletion
-        if not _is_deleting.get():
-            source_model = self.model
-            if (issubclass(source_model, PermanentModel) and
-                    source_model != target_model):
-                try:
-                    field = source_model._meta.get_field(settings.FIELD)
-                    if settings.FIELD_DEFAULT is None:
-                        lookup = field.get_lookup('isnull')(
-                            Col(related_alias, field, field), True
-                        )
-                    else:
-                        lookup = field.get_lookup('exact')(
-                            Col(related_alias, field, field),
-                            settings.FIELD_DEFAULT
-                        )
-                    cond.add(lookup, 'AND')
-                except Exception:
-                    pass
-
-        return cond
+        if _is_deleting.get():
+            return cond
+        return restrict(self.field.model, alias, cond)
     return wrapper
 
 
+ForeignObjectRel.get_extra_restriction = get_reverse_extra_restriction_patch(
+    ForeignObject.get_extra_restriction
+)
 ForeignObject.get_extra_restriction = get_extra_restriction_patch(
     ForeignObject.get_extra_restriction
 )
 
 
+def shows_all(instance):
+    """
+    Check if the forward relations of the instance include deleted
+    objects: within show_all_context(), for objects fetched through
+    all_objects and for deleted objects.
+    """
+    from .models import PermanentModel
+
+    # If we're in show_all_context, or the instance was fetched
+    # through all_objects, use all_objects to include deleted
+    if _show_all_permanent.get() or getattr(
+            instance, '_permanent_show_all', False):
+        return True
+
+    # If the instance itself is deleted, use all_objects
+    return bool(instance and isinstance(instance, PermanentModel) and
+                getattr(instance, settings.LOOKUP_FIELD) !=
+                settings.LOOKUP_DEFAULT)
+
+
 def get_queryset_patch(func):
     def wrapper(self, **hints):
-        from .models import PermanentModel
         instance = hints.get('instance')
         model = self.field.remote_field.model
 
-        # If we're in show_all_context, use all_objects to include deleted
-        if _show_all_permanent.get():
-            if hasattr(model, 'all_objects'):
-                return model.all_objects
-            return model.objects
+        # Point-in-time context shows objects live at that time
+        timestamp = _as_of.get()
+        if timestamp is not None and hasattr(model, 'all_objects'):
+            return model.all_objects.db_manager(hints=hints).as_of(timestamp)
 
-        # If the instance itself is deleted, use all_objects
-        if (instance and isinstance(instance, PermanentModel) and
-                getattr(instance, settings.FIELD)):
+        # The hints route the query to the database of the instance
+        if shows_all(instance):
             if hasattr(model, 'all_objects'):
-                return model.all_objects
-            return model.objects
+                return model.all_objects.db_manager(hints=hints).all()
+            return model.objects.db_manager(hints=hints).all()
 
         return func(self, **hints)
     return wrapper
 
 
+def get_object_patch(func):
+    def wrapper(self, instance):
+        identity_map = _identity_map.get()
+        if (identity_map is None or _as_of.get() is not None or
+                not shows_all(instance)):
+            return func(self, instance)
+
+        # The same pk may name different rows on other database aliases
+        key = (
+            instance._state.db,
+            self.field.remote_field.model,
+            tuple(f.attname for f in self.field.foreign_related_fields),
+            self.field.get_local_related_value(instance),
+        )
+        try:
+            return identity_map[key]
+        except KeyError:
+            obj = identity_map[key] = func(self, instance)
+            return obj
+    return wrapper
+
+
 Descriptor.get_queryset = get_queryset_patch(Descriptor.get_queryset)
+Descriptor.get_object = get_object_patch(Descriptor.get_object)
+
+
+def create_forward_many_to_many_manager_patch(func):
+    def wrapper(superclass, rel, reverse):
+        from .models import PermanentModel
+
+        manager_class = func(superclass, rel, reverse)
+        if not issubclass(rel.through, PermanentModel):
+            return manager_class
+
+        class PermanentManyRelatedManager(manager_class):
+            """
+            Restore deleted through rows on add() instead of inserting new
+            ones, reported by the m2m_changed add signals like inserted
+            ones. remove() and clear() soft delete through rows with a single
+            UPDATE via the fast delete path of the patched Collector.
+            """
+            def _restore_items(self, source_field_name, target_field_name,
+                               db, target_ids):
+                """
+                Restore the latest deleted through row of each target
+                and return the ids of the restored targets.
+                """
+                deleted = dict(
+                    self.through.deleted_objects.using(db).filter(**{
+                        source_field_name: self.related_val[0],
+                        '%s__in' % target_field_name: target_ids,
+                    }).values_list(target_field_name).annotate(
+                        last_pk=Max('pk')
+                    ).order_by()
+                )
+                if deleted:
+                    self.through.all_objects.using(db).filter(
+                        pk__in=deleted.values()
+                    ).restore()
+                return set(deleted)
+
+            def _add_items(self, source_field_name, target_field_name,
+                           *objs, through_defaults=None):
+                # Django's _add_items, restoring deleted through rows in
+                # the transaction of the m2m_changed signals, the restored
+                # targets are part of their pk_set.
+                if not objs:
+                    return
+
+                through_defaults = dict(
+                    resolve_callables(through_defaults or {})
+                )
+                target_ids = self._get_target_ids(target_field_name, objs)
+                db = router.db_for_write(self.through, instance=self.instance)
+                can_ignore_conflicts, must_send_signals, _can_fast_add = (
+                    self._get_add_plan(db, source_field_name)
+                )
+                missing_target_ids = self._get_missing_target_ids(
+                    source_field_name, target_field_name, db, target_ids
+                )
+                with transaction.atomic(using=db, savepoint=False):
+                    if must_send_signals:
+                        signals.m2m_changed.send(
+                            sender=self.through, action='pre_add',
+                            instance=self.instance, reverse=self.reverse,
+                            model=self.model, pk_set=missing_target_ids,
+                            using=db,
+                        )
+                    restored = set()
+                    if missing_target_ids:
+                        restored = self._restore_items(
+                            source_field_name, target_field_name, db,
+                            missing_target_ids
+                        )
+                    self.through._default_manager.using(db).bulk_create([
+                        self.through(**through_defaults, **{
+                            '%s_id' % source_field_name: self.related_val[0],
+                            '%s_id' % target_field_name: target_id,
+                        })
+                        for target_id in missing_target_ids - restored
+                    ], ignore_conflicts=can_ignore_conflicts)
+                    if must_send_signals:
+                        signals.m2m_changed.send(
+                            sender=self.through, action='post_add',
+                            instance=self.instance, reverse=self.reverse,
+                            model=self.model, pk_set=missing_target_ids,
+                            using=db,
+                        )
+
+        return PermanentManyRelatedManager
+    return wrapper
+
+
+related_descriptors.create_forward_many_to_many_manager = (
+    create_forward_many_to_many_manager_patch(
+        related_descriptors.create_forward_many_to_many_manager
+    )
+)
@@ -13,3 +13,31 @@ FIELD_KWARGS = getattr(settings, 'PERMANENT_FIELD_KWARGS', dict(
 ))
 
 FIELD_DEFAULT = FIELD_KWARGS['default']
+
+# Defer SET_NULL / SET_DEFAULT updates of children until a hard delete
+DEFER_FIELD_UPDATES = getattr(settings, 'PERMANENT_DEFER_FIELD_UPDATES', False)
+
+# Cache used by the per-model object cache (Permanent.cache = True)
+CACHE_ALIAS = getattr(settings, 'PERMANENT_CACHE_ALIAS', 'default')
+
+# Batches of at least this many pks are updated with a single UPDATE
+# joined to the staged pks, None disables it
+BULK_UPDATE_THRESHOLD = getattr(
+    settings, 'PERMANENT_BULK_UPDATE_THRESHOLD', 1000
+)
+
+# Dual-column mode: a compact flag column filters and indexes the deleted
+# rows, the FIELD column keeps the removal time for bookkeeping
+FLAG_FIELD = getattr(settings, 'PERMANENT_FLAG_FIELD', None)
+FLAG_FIELD_KWARGS = getattr(settings, 'PERMANENT_FLAG_FIELD_KWARGS', dict(
+    default=False,
+    blank=True,
+    editable=False
+))
+
+# Field and value live rows are filtered by
+LOOKUP_FIELD = FLAG_FIELD or FIELD
+LOOKUP_DEFAULT = FLAG_FIELD_KWARGS['default'] if FLAG_FIELD else FIELD_DEFAULT
+
+# Fields written by delete and restore
+MARKER_FIELDS = (FIELD, FLAG_FIELD) if FLAG_FIELD else (FIELD,)
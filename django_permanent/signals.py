@@ -2,3 +2,5 @@ from django.dispatch import Signal
 
 pre_restore = Signal()
 post_restore = Signal()
+pre_bulk_restore = Signal()
+post_bulk_restore = Signal()
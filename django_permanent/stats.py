@@ -0,0 +1,247 @@
+import json
+import re
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils.timezone import now
+
+from . import settings
+from .cascade import get_plan
+
+
+# Age buckets of the deleted rows by their upper bound
+AGE_BUCKETS = (
+    ('1d', timedelta(days=1)),
+    ('7d', timedelta(days=7)),
+    ('30d', timedelta(days=30)),
+    ('90d', timedelta(days=90)),
+    ('365d', timedelta(days=365)),
+)
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for the queryset or None
+    if the backend does not expose one.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def permanent_models():
+    """Return the concrete PermanentModels of the installed apps."""
+    from .models import PermanentModel
+    return [
+        model for model in apps.get_models()
+        if issubclass(model, PermanentModel) and not model._meta.proxy
+    ]
+
+
+def relation_size(model, using=DEFAULT_DB_ALIAS):
+    """
+    Return the sizes in bytes of the table of the model and of its
+    indexes, or Nones if the backend doesn't expose them: SQLite built
+    without the dbstat table, backends other than PostgreSQL and MySQL.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT pg_relation_size(%s::regclass), '
+                'pg_indexes_size(%s::regclass)',
+                [connection.ops.quote_name(table)] * 2
+            )
+            return tuple(cursor.fetchone())
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT data_length, index_length FROM '
+                'information_schema.tables WHERE table_schema = DATABASE() '
+                'AND table_name = %s', [table]
+            )
+            row = cursor.fetchone()
+            return tuple(row) if row else (None, None)
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(CASE WHEN name = %s THEN pgsize END), "
+                    "SUM(CASE WHEN name != %s THEN pgsize END) FROM dbstat "
+                    "WHERE name = %s OR name IN (SELECT name FROM "
+                    "sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table] * 4
+                )
+            except DatabaseError:
+                return None, None
+            table_bytes, index_bytes = cursor.fetchone()
+            return table_bytes, index_bytes or 0
+    return None, None
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def is_index_backed(queryset):
+    """
+    Check with EXPLAIN if the rows of the queryset are found in the table
+    holding the marker through an index rather than a full scan.
+    PostgreSQL is asked with sequential scans disabled, its planner
+    prefers them on small tables. Return None on other backends than
+    SQLite and PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    table = get_plan(queryset.model).marker_model._meta.db_table
+    if connection.vendor == 'sqlite':
+        # Rows of id, parent, notused and detail, like
+        # SEARCH table USING INDEX name (column=?)
+        return any(
+            re.match(r'(SCAN|SEARCH) %s\b.* USING (COVERING )?INDEX ' % (
+                re.escape(table)
+            ), line.split(None, 3)[-1])
+            for line in queryset.explain().splitlines()
+        )
+    if connection.vendor != 'postgresql':
+        return None
+    with transaction.atomic(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+    # A partial index matching the predicate has no condition left,
+    # a full scan of another index filters the rows instead
+    return any(
+        node.get('Relation Name') == table and (
+            'Index Cond' in node or 'Filter' not in node
+        )
+        for node in _plan_nodes(plan) if 'Index Name' in node
+    )
+
+
+def _buckets(ages, timestamp):
+    """
+    Return the Q conditions of the age buckets of the removal times
+    relative to timestamp, from the most recent.
+    """
+    field = settings.FIELD
+    lower = None
+    for name, age in ages:
+        cond = Q(**{'%s__gt' % field: timestamp - age})
+        if lower is not None:
+            cond &= Q(**{'%s__lte' % field: timestamp - lower})
+        yield '<' + name, cond
+        lower = age
+    yield '>=' + name, Q(**{'%s__lte' % field: timestamp - lower})
+
+
+def _sampled_ages(model, using, percent, timestamp):
+    """Count the deleted rows of a TABLESAMPLE per age bucket."""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    owner = get_plan(model).marker_model
+    column = owner._meta.get_field(settings.FIELD).column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT %s FROM %s TABLESAMPLE SYSTEM (%%s) WHERE %s IS NOT '
+            'NULL' % (qn(column), qn(owner._meta.db_table), qn(column)),
+            [percent]
+        )
+        removed = [row[0] for row in cursor.fetchall()]
+    ages = {}
+    lower = timedelta(0)
+    for name, age in AGE_BUCKETS:
+        ages['<' + name] = sum(
+            lower <= timestamp - value < age for value in removed
+        )
+        lower = age
+    ages['>=' + name] = sum(timestamp - value >= lower for value in removed)
+    return ages, len(removed)
+
+
+def model_stats(model, using=DEFAULT_DB_ALIAS, threshold=1000000,
+                sample_size=10000):
+    """
+    Return the tombstone statistics of a PermanentModel as a JSON
+    serializable dict: live and deleted row counts, the number of deleted
+    rows per age bucket, the oldest and newest removal times, table and
+    index sizes with the share of the deleted rows, and whether the live
+    and deleted predicates are index-backed.
+
+    Tables with a planner estimate of at least threshold rows, on
+    PostgreSQL, report estimated counts and the ages of a sample of
+    about sample_size rows, scaled to the deleted rows.
+    """
+    timestamp = now()
+    live = model.objects.using(using)
+    deleted = model.deleted_objects.using(using)
+    field = settings.FIELD
+
+    total = estimate_count(model.all_objects.using(using))
+    estimated = total is not None and total >= threshold
+    if estimated:
+        live_count = estimate_count(live)
+        deleted_count = estimate_count(deleted)
+        ages, sampled = _sampled_ages(
+            model, using, min(100.0, sample_size * 100.0 / total), timestamp
+        )
+        if sampled:
+            ages = {
+                name: round(count * deleted_count / sampled)
+                for name, count in ages.items()
+            }
+        oldest = newest = None
+    else:
+        live_count = live.count()
+        buckets = dict(_buckets(AGE_BUCKETS, timestamp))
+        aggregates = deleted.aggregate(
+            count=Count('pk'), oldest=Min(field), newest=Max(field),
+            **{
+                name: Count('pk', filter=cond)
+                for name, cond in buckets.items()
+            }
+        )
+        deleted_count = aggregates.pop('count')
+        oldest = aggregates.pop('oldest')
+        newest = aggregates.pop('newest')
+        ages = aggregates
+
+    rows = live_count + deleted_count
+    table_bytes, index_bytes = relation_size(model, using)
+    return {
+        'model': model._meta.label,
+        'table': model._meta.db_table,
+        'database': using,
+        'estimated': estimated,
+        'live': live_count,
+        'deleted': deleted_count,
+        'deleted_ratio': deleted_count / rows if rows else 0.0,
+        'deleted_ages': ages,
+        'oldest_removed': oldest.isoformat() if oldest else None,
+        'newest_removed': newest.isoformat() if newest else None,
+        'table_bytes': table_bytes,
+        'index_bytes': index_bytes,
+        # Share of the table taken by deleted rows, assuming even rows
+        'deleted_bytes': (
+            round(table_bytes * deleted_count / rows)
+            if table_bytes is not None and rows else None
+        ),
+        'live_indexed': is_index_backed(live),
+        'deleted_indexed': is_index_backed(deleted),
+    }
+
+
+def collect_stats(models=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Return the model_stats() of the models, every PermanentModel by
+    default, the most deleted rows first.
+    """
+    stats = [
+        model_stats(model, using, **kwargs)
+        for model in (models or permanent_models())
+    ]
+    stats.sort(key=lambda item: (-item['deleted'], item['model']))
+    return stats
@@ -1 +1,3 @@
 from .cases import *   # NOQA
+from .query_budgets import *   # NOQA
+from .sql_snapshots import *   # NOQA
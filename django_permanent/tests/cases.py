@@ -1,15 +1,32 @@
-from django_permanent.signals import post_restore, pre_restore
+from django_permanent import settings
+from django_permanent.signals import (
+    post_bulk_restore, post_restore, pre_bulk_restore, pre_restore
+)
+
+import os
+import tempfile
+from io import StringIO
 
-from django.db import models
+from django.core.exceptions import FieldError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, models
 from django.db.models.signals import post_delete
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils.timezone import now
 
 from django_permanent.tests.test_app.models import (
     RegularModel, RemovableRegularDepended
 )
 from .test_app.models import (
+    CachedPermanent,
+    CommentedPermanent,
+    CommentedRegular,
+    CountedChild,
+    CountedNullableChild,
+    CountedParent,
     CustomQsPermanent,
+    DeferredNullableDepended,
+    DeferringPermanent,
     LazyReferencePermanent,
     M2MFrom,
     M2MTo,
@@ -18,10 +35,23 @@ from .test_app.models import (
     NonRemovableDepended,
     NonRemovableNullableDepended,
     RemovableNullableDepended,
+    PermanentChild,
+    PermanentChildHolder,
+    PermanentComment,
     PermanentDepended,
+    PermanentGrandChild,
+    PermanentInvoice,
+    PermanentInvoiceLine,
+    PermanentInvoicePayment,
+    PermanentParent,
     PermanentM2MThrough,
+    PermanentOwnedChild,
     RemovableDepended,
     RestoreOnCreateModel,
+    TaggedPermanent,
+    TimestampedDepended,
+    TimestampedPermanent,
+    UniqueNamePermanent,
 )
 
 
@@ -149,6 +179,14 @@ class TestDelete(TestCase):
         self.permanent.delete(force=True)
         self.assertEqual(MyPermanentModel.all_objects.count(), 0)
 
+    def test_forced_delete_removed_cascade(self):
+        PermanentDepended.objects.create(dependence=self.permanent)
+        self.permanent.delete()
+        MyPermanentModel.all_objects.get(pk=self.permanent.pk).delete(
+            force=True
+        )
+        self.assertFalse(PermanentDepended.all_objects.exists())
+
     def test_forced_querset_delete_removed(self):
         self.permanent.delete()
         MyPermanentModel.all_objects.all().delete(force=True)
@@ -193,6 +231,77 @@ class TestIntegration(TestCase):
         self.assertEqual(M2MFrom.objects.count(), 1)
         self.assertEqual(M2MTo.objects.count(), 1)
 
+    def test_m2m_manager_remove(self):
+        _from = M2MFrom.objects.create()
+        _to = M2MTo.objects.create()
+        _to.m2m_from.add(_from)
+        with self.assertNumQueries(1):
+            _to.m2m_from.remove(_from)
+        self.assertEqual(_to.m2m_from.count(), 0)
+        self.assertEqual(PermanentM2MThrough.deleted_objects.count(), 1)
+
+    def test_m2m_manager_add_restores(self):
+        _from = M2MFrom.objects.create()
+        _to = M2MTo.objects.create()
+        _to.m2m_from.add(_from)
+        through = PermanentM2MThrough.objects.get()
+        _to.m2m_from.clear()
+        _to.m2m_from.add(_from)
+        self.assertSequenceEqual(_to.m2m_from.all(), [_from])
+        self.assertSequenceEqual(
+            PermanentM2MThrough.all_objects.all(), [through]
+        )
+        self.assertIsNone(PermanentM2MThrough.objects.get().removed)
+
+    def test_m2m_manager_add_restores_signals(self):
+        from django.db import transaction
+        from django.db.models.signals import m2m_changed
+
+        _from = M2MFrom.objects.create()
+        _to = M2MTo.objects.create()
+        _to.m2m_from.add(_from)
+        _to.m2m_from.clear()
+        calls = []
+
+        def receiver(action, pk_set, **kwargs):
+            if action in ('pre_add', 'post_add'):
+                calls.append((action, set(pk_set)))
+                self.assertEqual(
+                    PermanentM2MThrough.objects.exists(), action == 'post_add'
+                )
+
+        m2m_changed.connect(receiver, sender=PermanentM2MThrough)
+        try:
+            _to.m2m_from.add(_from)
+        finally:
+            m2m_changed.disconnect(receiver, sender=PermanentM2MThrough)
+        self.assertEqual(
+            calls, [('pre_add', {_from.pk}), ('post_add', {_from.pk})]
+        )
+
+        _to.m2m_from.clear()
+
+        def failing(action, **kwargs):
+            if action == 'post_add':
+                raise ValueError
+
+        m2m_changed.connect(failing, sender=PermanentM2MThrough)
+        try:
+            with self.assertRaises(ValueError), transaction.atomic():
+                _to.m2m_from.add(_from)
+        finally:
+            m2m_changed.disconnect(failing, sender=PermanentM2MThrough)
+        self.assertFalse(PermanentM2MThrough.objects.exists())
+
+    def test_m2m_manager_set(self):
+        first, second = M2MFrom.objects.create(), M2MFrom.objects.create()
+        _to = M2MTo.objects.create()
+        _to.m2m_from.set([first])
+        _to.m2m_from.set([second])
+        _to.m2m_from.set([first, second])
+        self.assertEqual(_to.m2m_from.count(), 2)
+        self.assertEqual(PermanentM2MThrough.all_objects.count(), 2)
+
     def test_m2m_prefetch_related(self):
         _from = M2MFrom.objects.create()
         _to = M2MTo.objects.create()
@@ -618,3 +727,1902 @@ class AsyncDeletionTestCase(TestCase):
 
         deleted_count = await MyPermanentModel.deleted_objects.acount()
         self.assertEqual(deleted_count, 3)
+
+
+class PermanentModelAdminTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.admin import AdminSite
+        from django.test import RequestFactory
+        from django_permanent.admin import PermanentModelAdmin
+
+        self.factory = RequestFactory()
+        self.admin = PermanentModelAdmin(MyPermanentModel, AdminSite())
+        self.admin.message_user = lambda request, message: None
+        self.live = MyPermanentModel.objects.create(name='live')
+        self.deleted = MyPermanentModel.objects.create(
+            name='deleted', removed=now()
+        )
+
+    def filtered(self, status=None):
+        from django_permanent.admin import PermanentStatusFilter
+
+        import django
+
+        params = {}
+        if status is not None:
+            # Filters get lists of values since Django 5.0
+            params['permanent'] = (
+                [status] if django.VERSION >= (5, 0) else status
+            )
+        request = self.factory.get('/', params)
+        list_filter = PermanentStatusFilter(
+            request, dict(params), MyPermanentModel, self.admin
+        )
+        return request, list_filter.queryset(
+            request, self.admin.get_queryset(request)
+        )
+
+    def test_status_filter(self):
+        self.assertEqual(list(self.filtered()[1]), [self.live])
+        self.assertEqual(list(self.filtered('live')[1]), [self.live])
+        self.assertEqual(list(self.filtered('deleted')[1]), [self.deleted])
+        self.assertEqual(
+            list(self.filtered('all')[1].order_by('pk')),
+            [self.live, self.deleted]
+        )
+
+    def test_action_labels(self):
+        from django.contrib.admin.actions import delete_selected
+
+        self.assertNotEqual(
+            self.admin.soft_delete_selected.short_description,
+            delete_selected.short_description
+        )
+
+    def test_change_view_reaches_deleted(self):
+        request = self.factory.get('/')
+        obj = self.admin.get_object(request, str(self.deleted.pk))
+        self.assertEqual(obj, self.deleted)
+
+    def test_restore_action(self):
+        request, queryset = self.filtered('deleted')
+        with self.assertNumQueries(1):
+            self.admin.restore_selected(request, queryset)
+        self.assertEqual(MyPermanentModel.objects.count(), 2)
+
+    def test_soft_delete_action(self):
+        messages = []
+        self.admin.message_user = lambda request, message: messages.append(
+            message
+        )
+        PermanentDepended.objects.create(dependence=self.live)
+        request, queryset = self.filtered('all')
+        self.admin.soft_delete_selected(request, queryset)
+        # Cascaded children are not counted
+        self.assertEqual(messages, ['1 object was deleted.'])
+        self.assertFalse(PermanentDepended.objects.exists())
+        self.assertEqual(MyPermanentModel.objects.count(), 0)
+        self.assertEqual(MyPermanentModel.all_objects.count(), 2)
+        self.assertEqual(
+            MyPermanentModel.all_objects.get(pk=self.deleted.pk).removed,
+            self.deleted.removed
+        )
+
+    def test_paginator(self):
+        from django_permanent.admin import EstimatedCountPaginator
+
+        request, queryset = self.filtered('deleted')
+        queryset = queryset.order_by('pk')
+        paginator = self.admin.get_paginator(request, queryset, 10)
+        self.assertIsInstance(paginator, EstimatedCountPaginator)
+        # SQLite exposes no estimate, the exact count is used
+        self.assertEqual(paginator.count, 1)
+
+        request, queryset = self.filtered()
+        queryset = queryset.order_by('pk')
+        paginator = self.admin.get_paginator(request, queryset, 10)
+        self.assertNotIsInstance(paginator, EstimatedCountPaginator)
+
+
+class BulkRestoreTestCase(TestCase):
+    def setUp(self):
+        self.removed = now()
+        self.objs = [
+            UniqueNamePermanent.objects.create(
+                name=name, removed=self.removed
+            )
+            for name in ('a', 'b', 'c')
+        ]
+
+    def test_restore_returning(self):
+        restored = UniqueNamePermanent.deleted_objects.filter(
+            name__in=['a', 'b']
+        ).restore(returning=True)
+        self.assertEqual(
+            sorted(obj.pk for obj in restored),
+            [self.objs[0].pk, self.objs[1].pk]
+        )
+        for obj in restored:
+            self.assertIsNone(obj.removed)
+            self.assertIsInstance(obj, UniqueNamePermanent)
+        self.assertEqual(UniqueNamePermanent.objects.count(), 2)
+
+    def test_restore_batch_signals(self):
+        calls = []
+
+        def pre_receiver(sender, queryset, **kwargs):
+            calls.append(('pre', sender, queryset.count()))
+
+        def post_receiver(sender, instances, **kwargs):
+            calls.append(('post', sender, len(instances)))
+
+        pre_bulk_restore.connect(pre_receiver)
+        post_bulk_restore.connect(post_receiver)
+        try:
+            count = UniqueNamePermanent.deleted_objects.restore(
+                signals='batch'
+            )
+        finally:
+            pre_bulk_restore.disconnect(pre_receiver)
+            post_bulk_restore.disconnect(post_receiver)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(calls, [
+            ('pre', UniqueNamePermanent, 3),
+            ('post', UniqueNamePermanent, 3),
+        ])
+
+    def test_restore_skips_live_rows(self):
+        UniqueNamePermanent.objects.create(name='d')
+        self.assertEqual(UniqueNamePermanent.all_objects.restore(), 3)
+
+    def test_restore_conflict_error(self):
+        UniqueNamePermanent.objects.create(name='a')
+        with self.assertRaises(IntegrityError):
+            UniqueNamePermanent.deleted_objects.restore(on_conflict='error')
+        self.assertEqual(UniqueNamePermanent.deleted_objects.count(), 3)
+
+    def test_restore_conflict_skip(self):
+        live = UniqueNamePermanent.objects.create(name='a')
+        duplicate = UniqueNamePermanent.objects.create(
+            name='b', removed=self.removed
+        )
+        restored = UniqueNamePermanent.deleted_objects.restore(
+            returning=True, on_conflict='skip'
+        )
+        self.assertEqual(
+            sorted(obj.pk for obj in restored),
+            [self.objs[1].pk, self.objs[2].pk]
+        )
+        self.assertEqual(
+            sorted(UniqueNamePermanent.deleted_objects.values_list(
+                'pk', flat=True
+            )),
+            [self.objs[0].pk, duplicate.pk]
+        )
+        self.assertEqual(UniqueNamePermanent.objects.count(), 3)
+        self.assertIn(live, UniqueNamePermanent.objects.all())
+
+    def test_restore_keeps_marker_filter(self):
+        other = now()
+        UniqueNamePermanent.objects.create(name='d', removed=other)
+        count = UniqueNamePermanent.objects.filter(removed=other).restore()
+        self.assertEqual(count, 1)
+        self.assertEqual(UniqueNamePermanent.deleted_objects.count(), 3)
+
+    def test_restore_returning_fallback(self):
+        from unittest import mock
+
+        with mock.patch(
+            'django_permanent.query.can_update_returning',
+            return_value=False
+        ):
+            restored = UniqueNamePermanent.deleted_objects.restore(
+                returning=True
+            )
+        self.assertEqual(len(restored), 3)
+        self.assertTrue(all(obj.removed is None for obj in restored))
+        self.assertEqual(UniqueNamePermanent.objects.count(), 3)
+
+
+class AsOfTestCase(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        self.t0 = now() - timedelta(days=10)
+        self.t = lambda days: self.t0 + timedelta(days=days)
+        # parent lives from day 1 to day 5, child from day 2 to day 8
+        self.parent = TimestampedPermanent.objects.create(
+            name='parent', created=self.t(1), removed=self.t(5)
+        )
+        self.child = TimestampedDepended.objects.create(
+            dependence=self.parent, created=self.t(2), removed=self.t(8)
+        )
+
+    def test_as_of(self):
+        model = TimestampedPermanent
+        self.assertEqual(list(model.all_objects.as_of(self.t(0))), [])
+        self.assertEqual(
+            list(model.all_objects.as_of(self.t(3))), [self.parent]
+        )
+        self.assertEqual(list(model.all_objects.as_of(self.t(5))), [])
+        self.assertEqual(model.all_objects.as_of(self.t(3)).count(), 1)
+        self.assertEqual(model.objects.as_of(self.t(3)).count(), 1)
+
+    def test_as_of_joins(self):
+        model = TimestampedDepended
+        qs = model.all_objects.filter(dependence__name='parent')
+        self.assertEqual(list(qs.as_of(self.t(3))), [self.child])
+        # child is still live at day 6 but its parent is not
+        self.assertEqual(list(qs.as_of(self.t(6))), [])
+        self.assertEqual(qs.as_of(self.t(6)).count(), 0)
+        self.assertEqual(
+            list(model.all_objects.as_of(self.t(6))), [self.child]
+        )
+
+    def test_as_of_context(self):
+        from django_permanent.related import as_of_context
+
+        child = TimestampedDepended.all_objects.get(pk=self.child.pk)
+        with as_of_context(self.t(3)):
+            self.assertEqual(child.dependence, self.parent)
+            self.assertEqual(
+                TimestampedDepended.all_objects.filter(
+                    dependence__name='parent'
+                ).count(), 1
+            )
+        with as_of_context(self.t(6)):
+            with self.assertRaises(TimestampedPermanent.DoesNotExist):
+                TimestampedDepended.all_objects.get(
+                    pk=self.child.pk
+                ).dependence
+
+
+class DeferFieldUpdatesTestCase(TestCase):
+    def setUp(self):
+        self.parent = DeferringPermanent.objects.create()
+        self.child = DeferredNullableDepended.objects.create(
+            dependence=self.parent
+        )
+
+    def test_soft_delete_keeps_link(self):
+        with self.assertNumQueries(1):
+            self.parent.delete()
+        child = DeferredNullableDepended.objects.get(pk=self.child.pk)
+        self.assertEqual(child.dependence_id, self.parent.pk)
+        with self.assertRaises(DeferringPermanent.DoesNotExist):
+            child.dependence
+        # The join restriction hides the deleted parent
+        child = DeferredNullableDepended.objects.select_related(
+            'dependence'
+        ).get(pk=self.child.pk)
+        self.assertIsNone(child.dependence)
+
+        self.parent.restore()
+        child = DeferredNullableDepended.objects.get(pk=self.child.pk)
+        self.assertEqual(child.dependence, self.parent)
+
+    def test_hard_delete_applies_updates(self):
+        self.parent.delete()
+        DeferringPermanent.all_objects.get(pk=self.parent.pk).delete(
+            force=True
+        )
+        child = DeferredNullableDepended.objects.get(pk=self.child.pk)
+        self.assertIsNone(child.dependence_id)
+
+    def test_global_setting(self):
+        from unittest import mock
+        from django_permanent.cascade import clear_plans
+
+        parent = MyPermanentModel.objects.create()
+        child = RemovableNullableDepended.objects.create(dependence=parent)
+        # The setting is read into the cascade plans
+        self.addCleanup(clear_plans)
+        with mock.patch(
+            'django_permanent.settings.DEFER_FIELD_UPDATES', True
+        ):
+            clear_plans()
+            parent.delete()
+        child.refresh_from_db()
+        self.assertEqual(child.dependence_id, parent.pk)
+
+
+class ObjectCacheTestCase(TestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.obj = CachedPermanent.objects.create(name='cached')
+
+    def test_get_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(CachedPermanent.objects.get_cached(self.obj.pk),
+                             self.obj)
+            obj = CachedPermanent.objects.get_cached(str(self.obj.pk))
+        self.assertEqual(obj.name, 'cached')
+        self.assertIsNone(obj.removed)
+
+    def test_stale_entries(self):
+        from django.core.cache import cache
+        from django_permanent.cache import cache_key
+
+        key = cache_key(CachedPermanent, self.obj.pk, 'default')
+        values = {
+            field.attname: getattr(self.obj, field.attname)
+            for field in CachedPermanent._meta.concrete_fields
+        }
+        # Cached by an older layout or before a field was added or removed
+        for stale in (
+            tuple(values.values()),
+            {**values, 'dropped': 1},
+            {k: v for k, v in values.items() if k != 'name'},
+        ):
+            cache.set(key, stale)
+            with self.assertNumQueries(1):
+                obj = CachedPermanent.objects.get_cached(self.obj.pk)
+            self.assertEqual(obj.name, 'cached')
+            self.assertEqual(cache.get(key), values)
+
+    def test_database_alias(self):
+        CachedPermanent.objects.using('other').create(
+            pk=self.obj.pk, name='other'
+        )
+        self.assertEqual(
+            CachedPermanent.objects.get_cached(self.obj.pk).name, 'cached'
+        )
+        obj = CachedPermanent.objects.using('other').get_cached(self.obj.pk)
+        self.assertEqual((obj.name, obj._state.db), ('other', 'other'))
+
+        # Deleting on one alias leaves the other cached object alone
+        obj.delete()
+        with self.assertRaises(CachedPermanent.DoesNotExist):
+            CachedPermanent.objects.using('other').get_cached(self.obj.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                CachedPermanent.objects.get_cached(self.obj.pk), self.obj
+            )
+
+    def test_tombstone(self):
+        CachedPermanent.objects.get_cached(self.obj.pk)
+        self.obj.delete()
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(CachedPermanent.DoesNotExist):
+                    CachedPermanent.objects.get_cached(self.obj.pk)
+                self.assertEqual(
+                    CachedPermanent.deleted_objects.get_cached(self.obj.pk),
+                    self.obj
+                )
+                self.assertEqual(
+                    CachedPermanent.all_objects.get_cached(self.obj.pk),
+                    self.obj
+                )
+
+        self.obj.restore()
+        self.assertEqual(
+            CachedPermanent.objects.get_cached(self.obj.pk), self.obj
+        )
+
+    def test_queryset_operations(self):
+        CachedPermanent.objects.get_cached(self.obj.pk)
+        CachedPermanent.objects.all().delete()
+        with self.assertRaises(CachedPermanent.DoesNotExist):
+            CachedPermanent.objects.get_cached(self.obj.pk)
+        CachedPermanent.deleted_objects.restore()
+        self.assertEqual(
+            CachedPermanent.objects.get_cached(self.obj.pk), self.obj
+        )
+        CachedPermanent.objects.update(name='updated')
+        self.assertEqual(
+            CachedPermanent.objects.get_cached(self.obj.pk).name, 'updated'
+        )
+
+    def test_missing(self):
+        pk = self.obj.pk + 1
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(CachedPermanent.DoesNotExist):
+                    CachedPermanent.all_objects.get_cached(pk)
+        CachedPermanent.objects.create(pk=pk)
+        self.assertEqual(CachedPermanent.objects.get_cached(pk).pk, pk)
+
+    def test_in_bulk_cached(self):
+        deleted = CachedPermanent.objects.create(removed=now())
+        pk_list = [self.obj.pk, deleted.pk, deleted.pk + 1]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                CachedPermanent.objects.in_bulk_cached(pk_list),
+                {self.obj.pk: self.obj}
+            )
+            self.assertEqual(
+                CachedPermanent.deleted_objects.in_bulk_cached(pk_list),
+                {deleted.pk: deleted}
+            )
+
+    def test_not_cached_model(self):
+        obj = MyPermanentModel.objects.create()
+        self.assertEqual(MyPermanentModel.objects.get_cached(obj.pk), obj)
+        obj.delete()
+        with self.assertRaises(MyPermanentModel.DoesNotExist):
+            MyPermanentModel.objects.get_cached(obj.pk)
+
+
+class ArchiveTestCase(TestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        self.tag = RegularModel.objects.create(name='tag')
+        self.live = TaggedPermanent.objects.create(name='live')
+        self.deleted = []
+        for i in range(3):
+            obj = TaggedPermanent.objects.create(
+                name='deleted, "%d"' % i, created=now() if i else None
+            )
+            self.deleted.append(obj)
+        TaggedPermanent.objects.filter(name__startswith='deleted').delete()
+        # Soft delete drops the auto-created through rows,
+        # tag the tombstones afterwards.
+        for obj in self.deleted:
+            obj.tags.add(self.tag)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def round_trip(self, name, *options):
+        path = os.path.join(self.directory, name)
+        call_command(
+            'export_deleted', 'django_permanent.TaggedPermanent',
+            '--output', path, '--batch-size', '2', *options, stdout=StringIO()
+        )
+        expected = list(TaggedPermanent.deleted_objects.order_by('pk'))
+
+        TaggedPermanent.all_objects.filter(
+            pk__in=[obj.pk for obj in self.deleted[:2]]
+        ).delete(force=True)
+        self.assertEqual(TaggedPermanent.all_objects.count(), 2)
+
+        call_command(
+            'import_deleted', path, '--batch-size', '2', stdout=StringIO()
+        )
+        restored = list(TaggedPermanent.objects.order_by('pk'))
+        self.assertEqual(restored, [self.live] + expected)
+        for before, after in zip(expected, restored[1:]):
+            self.assertEqual(before.name, after.name)
+            self.assertEqual(before.created, after.created)
+            self.assertEqual(list(after.tags.all()), [self.tag])
+        self.assertFalse(TaggedPermanent.deleted_objects.exists())
+
+    def test_jsonl(self):
+        self.round_trip('tagged.jsonl.gz')
+
+    def test_multi_table_inheritance(self):
+        from django_permanent.archive import export_deleted, import_deleted
+
+        for format in ('jsonl', 'csv'):
+            with self.subTest(format=format):
+                objs = [
+                    PermanentGrandChild.objects.create(
+                        name=str(i), color='red', size=i
+                    )
+                    for i in range(2)
+                ]
+                PermanentGrandChild.objects.all().delete()
+                expected = list(
+                    PermanentGrandChild.deleted_objects.order_by('pk')
+                )
+                stream = StringIO()
+                self.assertEqual(export_deleted(
+                    PermanentGrandChild.deleted_objects.all(), stream, format
+                ), 2)
+                PermanentGrandChild.all_objects.filter(
+                    pk=objs[0].pk
+                ).delete(force=True)
+                self.assertFalse(
+                    PermanentParent.all_objects.filter(pk=objs[0].pk).exists()
+                )
+
+                stream.seek(0)
+                self.assertEqual(
+                    import_deleted(stream, format, restore=False), (1, 0)
+                )
+                loaded = list(
+                    PermanentGrandChild.deleted_objects.order_by('pk')
+                )
+                self.assertEqual(loaded, expected)
+                for before, after in zip(expected, loaded):
+                    self.assertEqual(
+                        (before.name, before.color, before.size,
+                         before.removed),
+                        (after.name, after.color, after.size, after.removed)
+                    )
+                PermanentGrandChild.all_objects.all().delete(force=True)
+
+    def test_export_database(self):
+        import json
+        from django_permanent.archive import export_deleted
+
+        # Same pk on the other alias, tagged differently
+        obj = TaggedPermanent.objects.using('other').create(
+            pk=self.deleted[0].pk
+        )
+        tag = RegularModel.objects.using('other').create(
+            pk=self.tag.pk + 1
+        )
+        obj.delete()
+        obj.tags.add(tag)
+        stream = StringIO()
+        export_deleted(
+            TaggedPermanent.deleted_objects.using('other'), stream
+        )
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            [(record['pk'], record['fields']['tags']) for record in records],
+            [(obj.pk, [tag.pk])]
+        )
+
+    def test_csv(self):
+        self.round_trip('tagged.csv.gz', '--format', 'csv')
+
+    def test_batches(self):
+        from django_permanent.archive import export_deleted
+        stream = open(os.devnull, 'w')
+        self.addCleanup(stream.close)
+        # One query for the objects and one for the tags per batch,
+        # plus the empty batch which ends the pagination.
+        with self.assertNumQueries(5):
+            self.assertEqual(export_deleted(
+                TaggedPermanent.deleted_objects.all(), stream, batch_size=2
+            ), 3)
+
+    def test_no_restore(self):
+        path = os.path.join(self.directory, 'tagged.jsonl')
+        call_command(
+            'export_deleted', 'django_permanent.TaggedPermanent',
+            '--output', path, stdout=StringIO()
+        )
+        TaggedPermanent.deleted_objects.all().delete(force=True)
+        call_command('import_deleted', path, '--no-restore', stdout=StringIO())
+        self.assertEqual(TaggedPermanent.deleted_objects.count(), 3)
+        self.assertEqual(TaggedPermanent.objects.count(), 1)
+
+
+class CounterCacheTestCase(TestCase):
+    def setUp(self):
+        self.parent = CountedParent.objects.create()
+        self.other = CountedParent.objects.create()
+        self.children = [
+            CountedChild.objects.create(parent=self.parent, name=str(i))
+            for i in range(3)
+        ]
+        CountedChild.objects.create(parent=self.other, name='other')
+
+    def assertCounters(self, *expected, field='live_children'):
+        self.assertEqual(list(
+            CountedParent.all_objects.order_by('pk').values_list(
+                field, flat=True
+            )
+        ), list(expected))
+
+    def test_create(self):
+        self.assertCounters(3, 1)
+        CountedChild.objects.bulk_create([
+            CountedChild(parent=self.parent),
+            CountedChild(parent=self.other),
+            CountedChild(parent=self.other, removed=now()),
+        ])
+        self.assertCounters(4, 2)
+
+    def test_delete(self):
+        self.children[0].delete()
+        self.assertCounters(2, 1)
+        self.children[0].delete(force=True)
+        self.assertCounters(2, 1)
+        CountedChild.all_objects.all().delete()
+        self.assertCounters(0, 0)
+
+    def test_delete_batch(self):
+        third = CountedParent.objects.create()
+        CountedChild.objects.create(parent=third, name='third')
+        # One UPDATE per distinct count: -3 and -1 for both other parents
+        with self.assertNumQueries(4):
+            CountedChild.objects.filter(name__isnull=False).delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_cascade(self):
+        self.parent.delete()
+        self.assertCounters(0, 1)
+        self.parent.restore()
+        self.assertCounters(0, 1)
+
+    def test_restore(self):
+        CountedChild.objects.all().delete()
+        self.assertCounters(0, 0)
+        child = CountedChild.deleted_objects.get(pk=self.children[0].pk)
+        child.restore()
+        self.assertCounters(1, 0)
+        child.restore()
+        self.assertCounters(1, 0)
+        self.assertEqual(CountedChild.all_objects.all().restore(), 3)
+        self.assertCounters(3, 1)
+
+    def test_restore_on_create(self):
+        self.children[0].delete()
+        self.assertCounters(2, 1)
+        CountedChild.objects.create(parent=self.parent, name='0')
+        self.assertCounters(3, 1)
+        self.assertEqual(CountedChild.all_objects.count(), 4)
+
+    def test_set_null(self):
+        CountedNullableChild.objects.create(parent=self.parent)
+        CountedNullableChild.objects.create(parent=self.parent)
+        self.assertCounters(2, 0, field='live_nullable_children')
+        CountedParent.objects.filter(pk=self.parent.pk).delete()
+        self.assertCounters(0, 0, field='live_nullable_children')
+        self.assertFalse(CountedNullableChild.objects.filter(
+            parent__isnull=False
+        ).exists())
+
+    def test_rebuild(self):
+        from django_permanent.counters import rebuild_counters
+        CountedParent.objects.update(live_children=42)
+        self.children[0].delete()
+        rebuild_counters(CountedChild)
+        self.assertCounters(2, 1)
+
+    def test_check(self):
+        from django_permanent.checks import _check_permanent_counters
+
+        class MockAppConfig:
+            def get_models(self):
+                return [CountedChild, CountedNullableChild, MyPermanentModel]
+
+        self.assertEqual(
+            _check_permanent_counters(app_configs=[MockAppConfig()]), []
+        )
+        CountedChild.Permanent.counters = {'parent': 'missing', 'name': 'x'}
+        try:
+            errors = _check_permanent_counters(app_configs=[MockAppConfig()])
+        finally:
+            CountedChild.Permanent.counters = {'parent': 'live_children'}
+        self.assertEqual(
+            [error.id for error in errors], ['django_permanent.E001'] * 2
+        )
+
+
+class MultiTableInheritanceTestCase(TestCase):
+    def setUp(self):
+        self.obj = PermanentGrandChild.objects.create(name='a', size=1)
+        self.other = PermanentChild.objects.create(name='b')
+
+    def test_delete(self):
+        self.obj.delete()
+        self.assertIsNotNone(self.obj.removed)
+        for model in (PermanentGrandChild, PermanentChild, PermanentParent):
+            self.assertFalse(model.objects.filter(pk=self.obj.pk).exists())
+            self.assertTrue(
+                model.deleted_objects.filter(pk=self.obj.pk).exists()
+            )
+        self.assertEqual(list(PermanentChild.objects.all()), [self.other])
+
+    def test_queryset_delete_and_restore(self):
+        PermanentChild.objects.all().delete()
+        self.assertFalse(PermanentParent.objects.exists())
+        self.assertEqual(
+            PermanentGrandChild.deleted_objects.get().size, 1
+        )
+        self.assertEqual(
+            PermanentChild.deleted_objects.filter(name='a').restore(), 1
+        )
+        self.assertEqual(list(PermanentGrandChild.objects.all()), [self.obj])
+        self.assertEqual(list(PermanentChild.deleted_objects.all()), [
+            PermanentChild.all_objects.get(pk=self.other.pk)
+        ])
+
+    def test_restore_returning(self):
+        PermanentParent.objects.all().delete()
+        objs = PermanentGrandChild.deleted_objects.all().restore(
+            returning=True
+        )
+        self.assertEqual(objs, [self.obj])
+        self.assertIsNone(objs[0].removed)
+        self.assertEqual(PermanentParent.objects.count(), 1)
+
+    def test_joins_to_children(self):
+        from django_permanent.related import show_all_context
+
+        deleted = PermanentChild.objects.create(name='x', color='red')
+        live = PermanentChild.objects.create(name='x', color='red')
+        holders = [
+            PermanentChildHolder.objects.create(child=child)
+            for child in (deleted, live)
+        ]
+        deleted.delete()
+
+        self.assertEqual(
+            list(PermanentChildHolder.objects.filter(child__name='x')),
+            [holders[1]]
+        )
+        self.assertEqual(
+            list(PermanentChildHolder.objects.filter(child__color='red')),
+            [holders[1]]
+        )
+        self.assertEqual(
+            list(PermanentChildHolder.objects.filter(
+                child__isnull=False, child__color='red'
+            ).values_list('child__name', flat=True)),
+            ['x']
+        )
+        related = PermanentChildHolder.objects.select_related(
+            'child'
+        ).order_by('pk')
+        self.assertEqual(
+            [holder.child for holder in related], [None, live]
+        )
+        with show_all_context():
+            self.assertEqual(PermanentChildHolder.objects.filter(
+                child__color='red'
+            ).count(), 2)
+
+        # Reverse joins and reverse managers
+        owner = RegularModel.objects.create()
+        owned = [
+            PermanentOwnedChild.objects.create(owner=owner, name=str(i))
+            for i in range(2)
+        ]
+        owned[0].delete()
+        self.assertEqual(
+            list(RegularModel.objects.filter(owned_children__name='0')), []
+        )
+        self.assertEqual(
+            list(RegularModel.objects.filter(owned_children__name='1')),
+            [owner]
+        )
+        self.assertEqual(list(owner.owned_children.all()), [owned[1]])
+        self.assertEqual(list(deleted.holders.all()), [holders[0]])
+
+
+class StreamingIterationTestCase(TestCase):
+    def setUp(self):
+        self.parents = [
+            MyPermanentModel.objects.create(name=str(i)) for i in range(5)
+        ]
+        self.children = [
+            NonRemovableDepended.objects.create(dependence=parent)
+            for parent in self.parents
+        ]
+        MyPermanentModel.objects.filter(name__in=['1', '3']).delete()
+
+    def test_iterator(self):
+        names = []
+        for obj in NonRemovableDepended.all_objects.order_by('pk').iterator(
+                chunk_size=2):
+            names.append(obj.dependence.name)
+            # Visibility doesn't leak into the loop body
+            self.assertEqual(MyPermanentModel.objects.count(), 3)
+        self.assertEqual(names, ['0', '1', '2', '3', '4'])
+
+    def test_iterator_prefetch(self):
+        qs = NonRemovableDepended.all_objects.order_by('pk').prefetch_related(
+            'dependence'
+        )
+        # One query for the objects and one prefetch per chunk
+        with self.assertNumQueries(4):
+            names = [
+                obj.dependence.name for obj in qs.iterator(chunk_size=2)
+            ]
+        self.assertEqual(names, ['0', '1', '2', '3', '4'])
+
+    def test_fetch_all(self):
+        # Only streamed objects are marked, the forward relations of live
+        # objects fetched at once hide deleted objects as before
+        objs = list(NonRemovableDepended.all_objects.order_by('pk'))
+        self.assertEqual(objs[0].dependence.name, '0')
+        with self.assertRaises(MyPermanentModel.DoesNotExist):
+            objs[1].dependence
+        child = NonRemovableDepended.all_objects.get(pk=self.children[1].pk)
+        with self.assertRaises(MyPermanentModel.DoesNotExist):
+            child.dependence
+        child = NonRemovableDepended.objects.get(pk=self.children[1].pk)
+        with self.assertRaises(MyPermanentModel.DoesNotExist):
+            child.dependence
+        # Prefetched within the fetch context
+        objs = list(NonRemovableDepended.all_objects.order_by(
+            'pk'
+        ).prefetch_related('dependence'))
+        self.assertEqual(
+            [obj.dependence.name for obj in objs], ['0', '1', '2', '3', '4']
+        )
+
+    def test_objects_iterator(self):
+        objs = list(NonRemovableDepended.objects.order_by('pk').iterator(
+            chunk_size=2
+        ))
+        self.assertEqual(len(objs), 5)
+        with self.assertRaises(MyPermanentModel.DoesNotExist):
+            objs[1].dependence
+
+    def test_as_of_iterator(self):
+        from datetime import timedelta
+        removed = MyPermanentModel.deleted_objects.first().removed
+        before = removed - timedelta(seconds=1)
+        names = [
+            obj.name for obj in
+            MyPermanentModel.all_objects.as_of(before).iterator()
+        ]
+        self.assertEqual(len(names), 5)
+
+    async def test_aiterator(self):
+        import django
+
+        names = []
+        qs = NonRemovableDepended.all_objects.order_by('pk')
+        # aiterator() supports prefetch_related() since Django 5.0
+        if django.VERSION >= (5, 0):
+            qs = qs.prefetch_related('dependence')
+        else:
+            qs = qs.select_related('dependence')
+        async for obj in qs.aiterator(chunk_size=2):
+            names.append(obj.dependence.name)
+            self.assertEqual(await MyPermanentModel.objects.acount(), 3)
+        self.assertEqual(names, ['0', '1', '2', '3', '4'])
+
+
+class PurgeQueueTestCase(TestCase):
+    def setUp(self):
+        from django_permanent.purge.models import PurgeRequest
+        self.PurgeRequest = PurgeRequest
+        self.objs = [
+            MyPermanentModel.objects.create(name=str(i)) for i in range(5)
+        ]
+        self.child = PermanentDepended.objects.create(dependence=self.objs[0])
+
+    def test_schedule_instance(self):
+        obj = self.objs[0]
+        obj.schedule_purge()
+        self.assertIsNotNone(obj.removed)
+        self.assertFalse(PermanentDepended.objects.exists())
+        request = self.PurgeRequest.objects.get()
+        self.assertEqual(
+            (request.model, request.object_pk),
+            ('django_permanent.mypermanentmodel', str(obj.pk))
+        )
+
+    def test_schedule_and_process(self):
+        from django_permanent.purge.queue import process_queue
+        self.assertEqual(MyPermanentModel.objects.all().schedule_purge(), 5)
+        self.assertEqual(MyPermanentModel.deleted_objects.count(), 5)
+
+        stats = process_queue(batch_size=2, max_batches=2)
+        self.assertEqual((stats.batches, stats.purged), (2, 4))
+        self.assertEqual(MyPermanentModel.all_objects.count(), 1)
+        self.assertEqual(self.PurgeRequest.objects.count(), 1)
+
+        stats = process_queue(batch_size=2)
+        self.assertEqual((stats.batches, stats.purged), (1, 1))
+        self.assertFalse(MyPermanentModel.all_objects.exists())
+        self.assertFalse(PermanentDepended.all_objects.exists())
+        self.assertFalse(self.PurgeRequest.objects.exists())
+
+    def test_retry(self):
+        from django.db.models.signals import pre_delete
+        from django_permanent.purge.queue import process_queue
+
+        def fail(sender, instance, **kwargs):
+            if instance.name == '1':
+                raise ValueError('locked')
+
+        MyPermanentModel.objects.filter(name__in=['0', '1', '2']).delete()
+        MyPermanentModel.all_objects.filter(
+            name__in=['0', '1', '2']
+        ).schedule_purge()
+        self.PurgeRequest.objects.create(
+            model='django_permanent.missing', object_pk='1'
+        )
+        pre_delete.connect(fail, sender=MyPermanentModel)
+        try:
+            stats = process_queue()
+        finally:
+            pre_delete.disconnect(fail, sender=MyPermanentModel)
+
+        self.assertEqual((stats.purged, stats.failed), (2, 2))
+        self.assertEqual(
+            list(MyPermanentModel.all_objects.values_list('name', flat=True)
+                 .order_by('name')),
+            ['1', '3', '4']
+        )
+        failed = self.PurgeRequest.objects.order_by('model')
+        self.assertEqual([request.attempts for request in failed], [1, 1])
+        self.assertIn('ValueError: locked', failed[1].last_error)
+        self.assertTrue(all(
+            request.available_at > now() for request in failed
+        ))
+        # Not available before the retry delay
+        self.assertEqual(process_queue().batches, 0)
+
+    def test_command(self):
+        MyPermanentModel.objects.all().schedule_purge()
+        out = StringIO()
+        call_command('process_purge_queue', '--batch-size', '2', stdout=out)
+        self.assertIn('Purged 5 objects', out.getvalue())
+        self.assertIn('in 3 batches', out.getvalue())
+        self.assertFalse(MyPermanentModel.all_objects.exists())
+
+
+class CascadePlanTestCase(TestCase):
+    def test_plan(self):
+        from django_permanent.cascade import get_plan
+
+        plan = get_plan(MyPermanentModel)
+        self.assertIs(get_plan(MyPermanentModel), plan)
+        self.assertTrue(plan.permanent)
+        self.assertIs(plan.marker_model, MyPermanentModel)
+        self.assertFalse(plan.fast_delete)
+        relations = {relation.model: relation for relation in plan.relations}
+        self.assertIs(
+            relations[PermanentDepended].on_delete, models.CASCADE
+        )
+        self.assertTrue(relations[PermanentDepended].permanent)
+        self.assertFalse(relations[RemovableDepended].permanent)
+
+        plan = get_plan(RegularModel)
+        self.assertFalse(plan.permanent)
+        self.assertIsNone(plan.marker_model)
+
+    def test_inheritance(self):
+        from django_permanent.cascade import get_plan
+
+        plan = get_plan(PermanentGrandChild)
+        self.assertIs(plan.marker_model, PermanentParent)
+        self.assertTrue(plan.fast_delete)
+        self.assertEqual(
+            plan.parent_links,
+            (PermanentGrandChild._meta.get_field('permanentchild_ptr'),)
+        )
+        # Children are deleted with their parents, never fast deleted
+        from django.db.models.deletion import Collector
+        collector = Collector(using='default')
+        self.assertFalse(
+            collector.can_fast_delete(PermanentGrandChild.objects.all())
+        )
+        self.assertTrue(collector.can_fast_delete(
+            PermanentGrandChild.objects.all(),
+            from_field=plan.parent_links[0]
+        ))
+
+    def test_new_model_clears_plans(self):
+        from django.apps import apps
+        from django_permanent.cascade import _plans, clear_plans, get_plan
+
+        def unregister():
+            del apps.all_models['django_permanent']['latedepended']
+            apps.clear_cache()
+            clear_plans()
+
+        get_plan(MyPermanentModel)
+        self.addCleanup(unregister)
+
+        class LateDepended(models.Model):
+            dependence = models.ForeignKey(
+                MyPermanentModel, on_delete=models.CASCADE
+            )
+
+            class Meta:
+                app_label = 'django_permanent'
+
+        self.assertNotIn(MyPermanentModel, _plans)
+        self.assertIn(LateDepended, {
+            relation.model for relation in get_plan(MyPermanentModel).relations
+        })
+
+    def test_historical_models_keep_plans(self):
+        from django.apps import apps
+        from django.db.migrations.state import ProjectState
+        from django_permanent.cascade import _plans, clear_plans, get_plan
+
+        plan = get_plan(MyPermanentModel)
+        # Migrations render historical models of every step
+        state = ProjectState.from_apps(apps)
+        historical = state.apps.get_model(
+            'django_permanent', 'MyPermanentModel'
+        )
+        self.assertIs(get_plan(MyPermanentModel), plan)
+
+        historical_plan = get_plan(historical)
+        self.assertIsNot(historical_plan, plan)
+        self.assertIs(get_plan(historical), historical_plan)
+        # Released with the historical class, not by the global registry
+        self.assertNotIn(historical, _plans)
+        self.assertIs(historical._meta.permanent_plan, historical_plan)
+
+        clear_plans(sender=historical)
+        self.assertIs(get_plan(MyPermanentModel), plan)
+
+
+class ManagerFactoryTestCase(TestCase):
+    def setUp(self):
+        MyPermanentModelWithManager.objects.create(name='live')
+        MyPermanentModelWithManager.objects.create(name='deleted').delete()
+
+    def test_shared_classes(self):
+        from django_permanent import managers
+        from django_permanent.query import NonDeletedQuerySet
+        from .test_app.models import MyPermanentQuerySet
+
+        self.assertIs(
+            type(MyPermanentModel.objects), type(CachedPermanent.objects)
+        )
+        manager = managers.MultiPassThroughManager(
+            MyPermanentQuerySet, NonDeletedQuerySet
+        )
+        self.assertIs(
+            type(manager), type(MyPermanentModelWithManager.objects)
+        )
+        queryset_class = manager._queryset_class
+        self.assertIs(
+            getattr(managers, queryset_class.__name__), queryset_class
+        )
+        self.assertEqual(manager.deconstruct()[2], '%s.%s' % (
+            managers.__name__, queryset_class.__name__
+        ))
+
+    def test_unique_names(self):
+        from django_permanent import managers
+        from django_permanent.query import DeletedQuerySet
+
+        first = type('TestQS', (), {'__module__': 'first'})
+        second = type('TestQS', (), {'__module__': 'second'})
+        first_class = managers.composite_queryset(first, DeletedQuerySet)
+        second_class = managers.composite_queryset(second, DeletedQuerySet)
+        self.assertNotEqual(first_class.__name__, second_class.__name__)
+        for cls in (first_class, second_class):
+            self.assertIs(getattr(managers, cls.__name__), cls)
+            self.addCleanup(delattr, managers, cls.__name__)
+            self.addCleanup(managers._classes.pop, cls._components)
+
+    def test_pickle(self):
+        import pickle
+
+        for queryset in (MyPermanentModelWithManager.objects.all(),
+                         MyPermanentModelWithManager.deleted_objects.all(),
+                         MyPermanentModel.objects.all()):
+            loaded = pickle.loads(pickle.dumps(queryset))
+            self.assertIs(type(loaded), type(queryset))
+            self.assertEqual(list(loaded), list(queryset))
+
+    def test_unpickle_without_class(self):
+        import pickle
+        from django_permanent import managers
+
+        queryset = MyPermanentModelWithManager.deleted_objects.all()
+        data = pickle.dumps(queryset.filter(name='deleted'))
+        cls = type(queryset)
+        # As loaded by a process which didn't declare the manager
+        del managers._classes[cls._components]
+        delattr(managers, cls.__name__)
+        self.addCleanup(setattr, managers, cls.__name__, cls)
+        self.addCleanup(
+            managers._classes.__setitem__, cls._components, cls
+        )
+
+        loaded = pickle.loads(data)
+        self.assertIsNot(type(loaded), cls)
+        self.assertEqual(type(loaded)._components, cls._components)
+        self.assertEqual(
+            [obj.name for obj in loaded.filter(name__isnull=False)],
+            ['deleted']
+        )
+
+
+class BulkUpdateTestCase(TestCase):
+    def setUp(self):
+        from unittest import mock
+
+        patcher = mock.patch(
+            'django_permanent.settings.BULK_UPDATE_THRESHOLD', 3
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def capture(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [query['sql'] for query in queries]
+
+    def test_soft_delete(self):
+        for i in range(4):
+            obj = MyPermanentModel.objects.create(name=str(i))
+            PermanentDepended.objects.create(dependence=obj)
+        statements = self.capture(
+            lambda: MyPermanentModel.objects.filter(name__in='012').delete()
+        )
+        updates = [
+            sql for sql in statements
+            if sql.startswith('UPDATE "django_permanent_mypermanentmodel"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('IN (SELECT pk FROM', updates[0])
+        self.assertEqual(
+            sum('CREATE TEMPORARY TABLE' in sql for sql in statements), 1
+        )
+        self.assertEqual(MyPermanentModel.objects.get().name, '3')
+        self.assertEqual(PermanentDepended.objects.count(), 1)
+
+    def test_staged_rollback(self):
+        from django.db import connection, transaction
+
+        for i in range(4):
+            MyPermanentModel.objects.create(name=str(i))
+        with self.assertRaises(ValueError), transaction.atomic():
+            statements = self.capture(
+                lambda: MyPermanentModel.objects.filter(
+                    name__in='012'
+                ).delete()
+            )
+            self.assertEqual(MyPermanentModel.objects.count(), 1)
+            raise ValueError
+        # MySQL commits on a plain DROP TABLE
+        drop = (
+            'DROP TEMPORARY TABLE' if connection.vendor == 'mysql' else
+            'DROP TABLE'
+        )
+        self.assertTrue(any(sql.startswith(drop) for sql in statements))
+        self.assertEqual(MyPermanentModel.objects.count(), 4)
+
+    def test_small_batch(self):
+        objs = [MyPermanentModel.objects.create() for _ in range(2)]
+        for obj in objs:
+            PermanentDepended.objects.create(dependence=obj)
+        statements = self.capture(
+            lambda: MyPermanentModel.objects.all().delete()
+        )
+        self.assertFalse(any('TEMPORARY' in sql for sql in statements))
+        self.assertFalse(MyPermanentModel.objects.exists())
+
+    def test_update_pks(self):
+        from django_permanent.bulk import update_pks, update_staged
+
+        parents = [MyPermanentModel.objects.create() for _ in range(2)]
+        children = [
+            RemovableNullableDepended.objects.create(dependence=parents[0])
+            for _ in range(4)
+        ]
+        pk_list = [child.pk for child in children[:3]]
+        self.assertEqual(update_staged(
+            RemovableNullableDepended, pk_list,
+            {'dependence': parents[1]}, 'default'
+        ), 3)
+        self.assertEqual(
+            sorted(RemovableNullableDepended.objects.filter(
+                dependence=parents[1]
+            ).values_list('pk', flat=True)),
+            pk_list
+        )
+        update_pks(
+            RemovableNullableDepended, [children[3].pk],
+            {'dependence': None}, 'default'
+        )
+        self.assertIsNone(
+            RemovableNullableDepended.objects.get(
+                pk=children[3].pk
+            ).dependence_id
+        )
+
+    def test_inheritance_restore(self):
+        children = [PermanentChild.objects.create() for _ in range(3)]
+        PermanentChild.objects.all().delete()
+        statements = self.capture(
+            lambda: PermanentChild.deleted_objects.restore(returning=True)
+        )
+        self.assertTrue(any('TEMPORARY' in sql for sql in statements))
+        self.assertEqual(
+            sorted(PermanentChild.objects.values_list('pk', flat=True)),
+            [child.pk for child in children]
+        )
+
+
+class IdentityMapTestCase(TestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        self.parents = [MyPermanentModel.objects.create() for _ in range(2)]
+        for parent in self.parents:
+            for _ in range(3):
+                NonRemovableDepended.objects.create(dependence=parent)
+        NonRemovableDepended.objects.all().delete()
+        MyPermanentModel.objects.all().delete()
+
+    def test_deleted_instances(self):
+        from django_permanent.related import identity_map_context
+
+        children = list(NonRemovableDepended.deleted_objects.order_by('pk'))
+        with identity_map_context():
+            with self.assertNumQueries(2):
+                parents = [child.dependence for child in children]
+            self.assertIs(parents[0], parents[2])
+            self.assertEqual(parents[0], self.parents[0])
+            self.assertIsNot(parents[0], parents[3])
+
+            # Fresh instances hit the map too
+            children = list(NonRemovableDepended.deleted_objects.all())
+            with self.assertNumQueries(0):
+                [child.dependence for child in children]
+
+        # Released when the context exits
+        children = list(NonRemovableDepended.deleted_objects.all())
+        with self.assertNumQueries(6):
+            [child.dependence for child in children]
+
+    def test_show_all_context(self):
+        from django_permanent.related import show_all_context
+
+        NonRemovableDepended.deleted_objects.restore()
+        children = list(NonRemovableDepended.objects.all())
+        with show_all_context(identity_map=True):
+            with self.assertNumQueries(2):
+                [child.dependence for child in children]
+        with show_all_context():
+            children = list(NonRemovableDepended.objects.all())
+            with self.assertNumQueries(6):
+                [child.dependence for child in children]
+
+    def test_live_lookups_not_memoized(self):
+        from django_permanent.related import identity_map_context
+
+        deleted = NonRemovableDepended.deleted_objects.first()
+        NonRemovableDepended.deleted_objects.exclude(
+            pk=deleted.pk
+        ).restore()
+        live = NonRemovableDepended.objects.filter(
+            dependence=deleted.dependence_id
+        ).first()
+        with identity_map_context():
+            self.assertEqual(deleted.dependence, self.parents[0])
+            with self.assertRaises(MyPermanentModel.DoesNotExist):
+                live.dependence
+
+    def test_database_aliases(self):
+        from django_permanent.related import show_all_context
+
+        parent = self.parents[0]
+        MyPermanentModel.all_objects.filter(pk=parent.pk).update(
+            name='default'
+        )
+        MyPermanentModel.objects.using('other').create(
+            pk=parent.pk, name='other'
+        )
+        NonRemovableDepended.objects.using('other').create(
+            dependence_id=parent.pk
+        )
+        children = [
+            NonRemovableDepended.all_objects.filter(
+                dependence=parent.pk
+            ).first(),
+            NonRemovableDepended.all_objects.using('other').get(),
+        ]
+        with show_all_context(identity_map=True):
+            parents = [child.dependence for child in children]
+        self.assertEqual(
+            [(obj._state.db, obj.name) for obj in parents],
+            [('default', 'default'), ('other', 'other')],
+        )
+
+
+class MarkerSyncTestCase(TestCase):
+    """Writing the removal time directly deletes and restores in any mode."""
+
+    def setUp(self):
+        self.obj = MyPermanentModel.objects.create(name='a')
+
+    def assertLive(self, live):
+        self.assertEqual(
+            MyPermanentModel.objects.filter(pk=self.obj.pk).exists(), live
+        )
+        self.assertEqual(
+            MyPermanentModel.deleted_objects.filter(pk=self.obj.pk).exists(),
+            not live
+        )
+
+    def test_save(self):
+        self.obj.removed = now()
+        self.obj.save()
+        self.assertLive(False)
+        self.obj.removed = None
+        self.obj.save()
+        self.assertLive(True)
+        self.obj.removed = now()
+        self.obj.save(update_fields=['removed'])
+        self.assertLive(False)
+
+    def test_update(self):
+        from django.db.models.functions import Now
+
+        MyPermanentModel.objects.filter(pk=self.obj.pk).update(removed=now())
+        self.assertLive(False)
+        MyPermanentModel.all_objects.filter(pk=self.obj.pk).update(
+            removed=None
+        )
+        self.assertLive(True)
+        MyPermanentModel.objects.filter(pk=self.obj.pk).update(removed=Now())
+        self.assertLive(False)
+
+    def test_mti_update(self):
+        obj = PermanentGrandChild.objects.create()
+        PermanentGrandChild.objects.filter(pk=obj.pk).update(removed=now())
+        live = PermanentGrandChild.objects.filter(pk=obj.pk)
+        self.assertFalse(live.exists())
+        PermanentGrandChild.all_objects.filter(pk=obj.pk).update(removed=None)
+        self.assertTrue(live.exists())
+
+
+class ClaimTestCase(TestCase):
+    def setUp(self):
+        MyPermanentModel.objects.bulk_create([
+            MyPermanentModel(name=str(i % 3)) for i in range(10)
+        ])
+        self.pks = list(MyPermanentModel.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+
+    def test_claim(self):
+        with self.assertNumQueries(1):
+            objs = MyPermanentModel.objects.claim(4)
+        self.assertEqual([obj.pk for obj in objs], self.pks[:4])
+        self.assertTrue(all(obj.removed for obj in objs))
+        self.assertEqual(MyPermanentModel.objects.count(), 6)
+
+        self.assertEqual(
+            [obj.pk for obj in MyPermanentModel.all_objects.claim(4)],
+            self.pks[4:8]
+        )
+        self.assertEqual(len(MyPermanentModel.objects.claim(4)), 2)
+        self.assertEqual(MyPermanentModel.objects.claim(4), [])
+
+    def test_order_by(self):
+        objs = MyPermanentModel.objects.filter(name__in=['1', '2']).claim(
+            3, order_by=['-name', 'pk']
+        )
+        self.assertEqual(
+            [(obj.name, obj.pk) for obj in objs],
+            [('2', self.pks[2]), ('2', self.pks[5]), ('2', self.pks[8])]
+        )
+        self.assertEqual(MyPermanentModel.deleted_objects.count(), 3)
+
+    def test_no_signals(self):
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance)
+
+        post_delete.connect(receiver, sender=MyPermanentModel)
+        try:
+            MyPermanentModel.objects.claim(2)
+        finally:
+            post_delete.disconnect(receiver, sender=MyPermanentModel)
+        self.assertEqual(deleted, [])
+
+    def test_fallback(self):
+        from unittest import mock
+
+        with mock.patch(
+                'django_permanent.query.can_update_returning',
+                return_value=False):
+            objs = MyPermanentModel.objects.claim(3, order_by='-pk')
+        self.assertEqual([obj.pk for obj in objs], self.pks[:-4:-1])
+        self.assertTrue(all(obj.removed for obj in objs))
+        self.assertEqual(MyPermanentModel.deleted_objects.count(), 3)
+
+    def test_counters_and_inheritance(self):
+        parent = CountedParent.objects.create()
+        for i in range(3):
+            CountedChild.objects.create(parent=parent, name=str(i))
+        self.assertEqual(len(CountedChild.objects.claim(2)), 2)
+        parent.refresh_from_db()
+        self.assertEqual(parent.live_children, 1)
+
+        PermanentChild.objects.create(color='red')
+        PermanentChild.objects.create(color='blue')
+        objs = PermanentChild.objects.claim(1)
+        self.assertEqual([obj.color for obj in objs], ['red'])
+        self.assertEqual(PermanentParent.objects.count(), 1)
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        MyPermanentModel.objects.bulk_create(
+            [MyPermanentModel() for _ in range(7)]
+        )
+        pks = list(MyPermanentModel.objects.values_list('pk', flat=True))
+        MyPermanentModel.objects.filter(pk__in=pks[3:5]).delete()
+        for pk, days in ((pks[5], 10), (pks[6], 400)):
+            obj = MyPermanentModel.objects.get(pk=pk)
+            obj.delete()
+            MyPermanentModel.all_objects.filter(pk=pk).update(
+                removed=now() - timedelta(days=days)
+            )
+
+    def test_model_stats(self):
+        from django.db import connection
+        from django.db.models import Index, Q
+        from django_permanent.stats import model_stats
+
+        stats = model_stats(MyPermanentModel)
+        self.assertEqual(
+            (stats['live'], stats['deleted'], stats['estimated']),
+            (3, 4, False)
+        )
+        self.assertAlmostEqual(stats['deleted_ratio'], 4 / 7)
+        self.assertEqual(stats['deleted_ages'], {
+            '<1d': 2, '<7d': 0, '<30d': 1, '<90d': 0, '<365d': 0,
+            '>=365d': 1,
+        })
+        self.assertLess(stats['oldest_removed'], stats['newest_removed'])
+        if stats['table_bytes'] is not None:
+            self.assertGreater(stats['table_bytes'], 0)
+            self.assertLessEqual(stats['deleted_bytes'], stats['table_bytes'])
+        self.assertFalse(stats['deleted_indexed'])
+
+        index = Index(
+            fields=[settings.LOOKUP_FIELD], name='stats_deleted',
+            condition=~Q(**{settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT}),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(str(index.create_sql(
+                MyPermanentModel, connection.schema_editor()
+            )))
+        self.assertTrue(model_stats(MyPermanentModel)['deleted_indexed'])
+
+    def test_inheritance(self):
+        from django_permanent.stats import collect_stats, model_stats
+
+        PermanentChild.objects.create()
+        PermanentGrandChild.objects.create().delete()
+        stats = model_stats(PermanentChild)
+        self.assertEqual((stats['live'], stats['deleted']), (1, 1))
+        self.assertFalse(stats['deleted_indexed'])
+        self.assertEqual(
+            [item['model'] for item in collect_stats()[:2]],
+            ['django_permanent.MyPermanentModel',
+             'django_permanent.PermanentChild']
+        )
+
+    def test_command(self):
+        import json
+
+        out = StringIO()
+        call_command(
+            'permanent_stats', 'django_permanent.MyPermanentModel',
+            stdout=out
+        )
+        stats = json.loads(out.getvalue())
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['deleted'], 4)
+
+        with self.assertRaisesMessage(
+                CommandError, 'is not a PermanentModel'):
+            call_command('permanent_stats', 'django_permanent.RegularModel')
+
+
+class PermanentAggregateTestCase(TestCase):
+    def setUp(self):
+        self.invoice = PermanentInvoice.objects.create(name='a')
+        self.empty = PermanentInvoice.objects.create(name='b')
+        lines = [
+            PermanentInvoiceLine.objects.create(
+                invoice=self.invoice, amount=amount
+            )
+            for amount in (1, 2, 4)
+        ]
+        for amount in (8, 16):
+            PermanentInvoicePayment.objects.create(
+                invoice=self.invoice, amount=amount
+            )
+        lines[2].delete()
+
+    def test_counts_and_sums(self):
+        from django_permanent.aggregates import (
+            DeletedCount, DeletedSum, LiveCount, LiveSum
+        )
+
+        rows = PermanentInvoice.objects.annotate(
+            live=LiveCount('lines'),
+            deleted=DeletedCount('lines'),
+            total=LiveSum('lines__amount'),
+            deleted_total=DeletedSum('lines__amount', default=0),
+        ).order_by('name').values_list(
+            'live', 'deleted', 'total', 'deleted_total'
+        )
+        self.assertEqual(list(rows), [(2, 1, 3, 4), (0, 0, None, 0)])
+
+    def test_no_fan_out(self):
+        from django_permanent.aggregates import LiveCount, LiveSum
+
+        queryset = PermanentInvoice.objects.annotate(
+            lines_total=LiveSum('lines__amount', default=0),
+            payments_total=LiveSum('payments__amount', default=0),
+            payments_count=LiveCount('payments'),
+        ).filter(pk=self.invoice.pk)
+        self.assertEqual(
+            queryset.values_list(
+                'lines_total', 'payments_total', 'payments_count'
+            )
+            .get(), (3, 24, 2)
+        )
+        sql = str(queryset.query).upper()
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_filter_and_order_by(self):
+        from django.db.models import Q
+        from django_permanent.aggregates import LiveCount
+
+        self.assertEqual(
+            PermanentInvoice.objects.annotate(
+                big=LiveCount('lines', filter=Q(amount__gt=1))
+            ).get(pk=self.invoice.pk).big,
+            1
+        )
+        self.assertEqual(
+            list(PermanentInvoice.objects.filter(
+                pk__in=[self.invoice.pk, self.empty.pk]
+            ).order_by(LiveCount('lines').desc())),
+            [self.invoice, self.empty]
+        )
+        self.assertEqual(
+            list(PermanentInvoice.objects.alias(
+                lines_count=LiveCount('lines')
+            ).filter(lines_count=0)),
+            [self.empty]
+        )
+
+    def test_outer_managers(self):
+        from django_permanent.aggregates import DeletedCount, LiveCount
+
+        self.invoice.delete()
+        self.assertEqual(
+            PermanentInvoice.deleted_objects.annotate(
+                live=LiveCount('lines'), deleted=DeletedCount('lines')
+            ).values_list('live', 'deleted').get(),
+            (0, 3)
+        )
+        self.assertEqual(
+            dict(PermanentInvoice.all_objects.annotate(
+                deleted=DeletedCount('lines')
+            ).values_list('name', 'deleted')),
+            {'a': 3, 'b': 0}
+        )
+
+    def test_other_relations(self):
+        from django_permanent.aggregates import DeletedCount, LiveCount
+
+        # Many-to-many to a regular model
+        tagged = TaggedPermanent.objects.create()
+        tagged.tags.add(RegularModel.objects.create())
+        self.assertEqual(
+            TaggedPermanent.objects.annotate(
+                tags_count=LiveCount('tags')
+            ).get().tags_count,
+            1
+        )
+        with self.assertRaises(FieldError):
+            TaggedPermanent.objects.annotate(
+                tags_count=DeletedCount('tags')
+            ).get()
+        # Generic relation
+        obj = CommentedPermanent.objects.create()
+        other = CommentedRegular.objects.create(pk=obj.pk)
+        for target in (obj, obj, other):
+            PermanentComment.objects.create(content_object=target)
+        PermanentComment.objects.filter(object_id=obj.pk).first().delete()
+        self.assertEqual(
+            CommentedPermanent.objects.annotate(
+                live=LiveCount('comments'), deleted=DeletedCount('comments')
+            ).values_list('live', 'deleted').get(),
+            (1, 1)
+        )
+        with self.assertRaises(FieldError):
+            PermanentInvoice.objects.annotate(n=LiveCount('name')).get()
+
+
+class MakePermanentTestCase(TransactionTestCase):
+    app_label = 'permanent_operations'
+
+    def setUp(self):
+        from django.db import connection, migrations
+        from django.db.migrations.state import ProjectState
+
+        self.state = ProjectState()
+        create = migrations.CreateModel('Legacy', [
+            ('id', models.BigAutoField(primary_key=True)),
+            ('is_deleted', models.BooleanField(default=False)),
+        ])
+        self.legacy_state = self.state.clone()
+        create.state_forwards(self.app_label, self.legacy_state)
+        with connection.schema_editor() as editor:
+            create.database_forwards(
+                self.app_label, editor, self.state, self.legacy_state
+            )
+        self.addCleanup(self.drop, create)
+
+        Legacy = self.legacy_state.apps.get_model(self.app_label, 'Legacy')
+        Legacy.objects.bulk_create([
+            Legacy(is_deleted=i % 7 == 0) for i in range(20000)
+        ], batch_size=5000)
+
+    def drop(self, create):
+        from django.db import connection
+        with connection.schema_editor() as editor:
+            create.database_backwards(
+                self.app_label, editor, self.legacy_state, self.state
+            )
+
+    def constraints(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(
+                cursor, 'permanent_operations_legacy'
+            )
+
+    def test_forwards_backwards(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django_permanent.operations import MakePermanent
+
+        operation = MakePermanent(
+            'Legacy', legacy_field='is_deleted', batch_size=1000
+        )
+        new_state = self.legacy_state.clone()
+        operation.state_forwards(self.app_label, new_state)
+        with CaptureQueriesContext(connection) as queries:
+            with connection.schema_editor() as editor:
+                operation.database_forwards(
+                    self.app_label, editor, self.legacy_state, new_state
+                )
+        statements = [query['sql'] for query in queries]
+        if not settings.FLAG_FIELD:
+            # The column is added in place, the table isn't rebuilt.
+            # SQLite rebuilds it to make the flag column NOT NULL.
+            self.assertFalse(any(
+                sql.startswith('CREATE TABLE') for sql in statements
+            ))
+        # 2858 flagged rows in batches of 1000
+        self.assertEqual(sum(
+            sql.startswith('UPDATE') and '"removed" = ' in sql
+            for sql in statements
+        ), 3)
+
+        Legacy = new_state.apps.get_model(self.app_label, 'Legacy')
+        self.assertEqual(
+            Legacy.objects.filter(removed__isnull=False).count(), 2858
+        )
+        self.assertFalse(
+            Legacy.objects.filter(is_deleted=True, removed=None).exists()
+        )
+        self.assertEqual(Legacy.objects.filter(**{
+            settings.LOOKUP_FIELD: settings.LOOKUP_DEFAULT
+        }).count(), 20000 - 2858)
+        indexes = [
+            name for name, info in self.constraints().items()
+            if info['index'] and info['columns'] == [settings.LOOKUP_FIELD]
+        ]
+        self.assertEqual(len(indexes), 1)
+
+        with connection.schema_editor() as editor:
+            operation.database_backwards(
+                self.app_label, editor, new_state, self.legacy_state
+            )
+        self.assertFalse(any(
+            settings.LOOKUP_FIELD in info['columns']
+            for info in self.constraints().values()
+        ))
+        with connection.cursor() as cursor:
+            columns = [
+                column.name for column in
+                connection.introspection.get_table_description(
+                    cursor, 'permanent_operations_legacy'
+                )
+            ]
+        self.assertEqual(columns, ['id', 'is_deleted'])
+
+    def test_deconstruct(self):
+        from django_permanent.operations import MakePermanent
+
+        operation = MakePermanent('Legacy', legacy_field='is_deleted')
+        self.assertEqual(operation.deconstruct(), (
+            'MakePermanent', [],
+            {'model_name': 'Legacy', 'legacy_field': 'is_deleted'}
+        ))
+        self.assertEqual(
+            operation.migration_name_fragment, 'make_permanent_legacy'
+        )
+
+
+class GenericRelationTestCase(TestCase):
+    def setUp(self):
+        self.parent = CommentedPermanent.objects.create(name='parent')
+        self.regular = CommentedRegular.objects.create(name='regular')
+        for owner in (self.parent, self.regular):
+            PermanentComment.objects.create(content_object=owner, text='live')
+            PermanentComment.objects.create(
+                content_object=owner, text='deleted'
+            ).delete()
+
+    def test_joins(self):
+        from django.db.models import Count
+        from django_permanent.related import show_all_context
+
+        for model in (CommentedPermanent, CommentedRegular):
+            self.assertTrue(
+                model.objects.filter(comments__text='live').exists()
+            )
+            self.assertFalse(
+                model.objects.filter(comments__text='deleted').exists()
+            )
+            self.assertEqual(model.objects.annotate(
+                count=Count('comments')
+            ).get().count, 1)
+            with show_all_context():
+                self.assertTrue(
+                    model.objects.filter(comments__text='deleted').exists()
+                )
+
+    def test_reverse_joins(self):
+        self.assertEqual(PermanentComment.objects.filter(
+            commented_permanent__name='parent'
+        ).get().text, 'live')
+        self.assertEqual(PermanentComment.objects.filter(
+            commented_regular__name='regular'
+        ).get().text, 'live')
+
+        self.parent.delete()
+        PermanentComment.all_objects.restore()
+        self.assertFalse(PermanentComment.objects.filter(
+            commented_permanent__name='parent'
+        ).exists())
+        self.assertEqual(PermanentComment.objects.filter(
+            commented_regular__name='regular'
+        ).count(), 2)
+
+    def test_prefetch(self):
+        for model in (CommentedPermanent, CommentedRegular):
+            owner = model.objects.prefetch_related('comments').get()
+            self.assertEqual(
+                [comment.text for comment in owner.comments.all()], ['live']
+            )
+
+    def test_soft_cascade(self):
+        from django.db import connection
+        from django.db.models.deletion import Collector
+        from django.test.utils import CaptureQueriesContext
+
+        parents = [self.parent] + [
+            CommentedPermanent.objects.create() for _ in range(3)
+        ]
+        for parent in parents[1:]:
+            PermanentComment.objects.create(content_object=parent)
+
+        # Collected per parent, deleted with one UPDATE
+        collector = Collector(using='default')
+        for parent in parents:
+            collector.collect([parent])
+        with CaptureQueriesContext(connection) as queries:
+            collector.delete()
+        table = PermanentComment._meta.db_table
+        self.assertEqual(len([
+            query for query in queries
+            if query['sql'].startswith('UPDATE "%s"' % table)
+        ]), 1)
+        self.assertEqual(PermanentComment.objects.filter(
+            object_id__in=[parent.pk for parent in parents],
+            content_type__model='commentedpermanent',
+        ).count(), 0)
+        self.assertEqual(PermanentComment.deleted_objects.count(), 6)
+        self.assertEqual(PermanentComment.objects.get().text, 'live')
+
+    def test_forced_delete(self):
+        self.parent.delete(force=True)
+        self.assertEqual(PermanentComment.all_objects.filter(
+            content_type__model='commentedpermanent'
+        ).count(), 0)
+        self.assertEqual(PermanentComment.all_objects.count(), 2)
+
+
+class DeleteAcrossTestCase(TransactionTestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        for alias in sorted(self.databases):
+            for _ in range(2):
+                PermanentDepended.objects.using(alias).create(
+                    dependence=MyPermanentModel.objects.using(alias).create()
+                )
+
+    def test_delete_across(self):
+        import threading
+        from django.db.models.signals import pre_delete
+        from django_permanent.across import permanent_delete_across
+
+        threads = set()
+
+        def record(sender, using, **kwargs):
+            threads.add((using, threading.current_thread().name))
+
+        pre_delete.connect(record, sender=MyPermanentModel)
+        try:
+            count, rows_count = permanent_delete_across({
+                'default': MyPermanentModel.objects.all(),
+                'other': [MyPermanentModel.objects.filter(
+                    pk=MyPermanentModel.objects.using('other').first().pk
+                )],
+            })
+        finally:
+            pre_delete.disconnect(record, sender=MyPermanentModel)
+
+        self.assertEqual(count, 6)
+        self.assertEqual(rows_count, {
+            'django_permanent.MyPermanentModel': 3,
+            'django_permanent.PermanentDepended': 3,
+        })
+        self.assertEqual(
+            MyPermanentModel.deleted_objects.using('default').count(), 2
+        )
+        self.assertEqual(
+            MyPermanentModel.deleted_objects.using('other').count(), 1
+        )
+        self.assertEqual({using for using, name in threads},
+                         {'default', 'other'})
+        self.assertTrue(all(
+            name.startswith('permanent') for using, name in threads
+        ))
+
+    def test_failure(self):
+        from django.db.models.signals import pre_delete
+        from django_permanent.across import (
+            AcrossError, permanent_delete_across
+        )
+
+        def fail(sender, using, **kwargs):
+            if using == 'other':
+                raise ValueError('shard down')
+
+        pre_delete.connect(fail, sender=PermanentDepended)
+        try:
+            with self.assertRaises(AcrossError) as raised:
+                permanent_delete_across({
+                    alias: MyPermanentModel.objects.all()
+                    for alias in self.databases
+                }, max_workers=1, force=True)
+        finally:
+            pre_delete.disconnect(fail, sender=PermanentDepended)
+
+        error = raised.exception
+        self.assertEqual(list(error.errors), ['other'])
+        self.assertIn('other (ValueError: shard down)', str(error))
+        self.assertEqual(error.results['default'][0], 4)
+        self.assertFalse(
+            MyPermanentModel.all_objects.using('default').exists()
+        )
+        # Rolled back
+        self.assertEqual(MyPermanentModel.objects.using('other').count(), 2)
+        self.assertEqual(PermanentDepended.objects.using('other').count(), 2)
+
+    def test_purge_command(self):
+        for alias in sorted(self.databases):
+            MyPermanentModel.objects.using(alias).schedule_purge()
+        out = StringIO()
+        call_command(
+            'process_purge_queue', '--database', 'default',
+            '--database', 'other', '--parallel', stdout=out
+        )
+        self.assertIn('default: Purged 2 objects', out.getvalue())
+        self.assertIn('other: Purged 2 objects', out.getvalue())
+        for alias in self.databases:
+            self.assertFalse(
+                MyPermanentModel.all_objects.using(alias).exists()
+            )
@@ -0,0 +1,252 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from .test_app.models import (
+    LazyReferencePermanent,
+    MyPermanentModel,
+    NonRemovableDepended,
+    NonRemovableNullableDepended,
+    PermanentDepended,
+    PermanentGrandChild,
+    PermanentInvoice,
+    PermanentInvoiceLine,
+    PermanentParent,
+    RemovableDepended,
+    RemovableNullableDepended,
+    RestoreOnCreateModel,
+    UniqueNamePermanent,
+)
+
+
+FAN_OUT = (1, 10, 100)
+
+# Deleting a MyPermanentModel touches every reverse relation once
+PARENT_DELETE = [
+    ('DELETE', RemovableDepended),
+    ('UPDATE', PermanentDepended),
+    ('UPDATE', LazyReferencePermanent),
+    ('UPDATE', NonRemovableNullableDepended),
+    ('UPDATE', RemovableNullableDepended),
+    ('UPDATE', MyPermanentModel),
+]
+
+# Statement budgets of every public operation as (statement, table model)
+# pairs: the ones issued once and the ones issued for every object
+# of the fan-out.
+QUERY_BUDGETS = {
+    'single_delete': ([('UPDATE', UniqueNamePermanent)], []),
+    'cascade_delete': (PARENT_DELETE, []),
+    'fast_delete': ([('UPDATE', UniqueNamePermanent)], []),
+    'queryset_delete': (
+        [('SELECT', MyPermanentModel)] + PARENT_DELETE, []
+    ),
+    'instance_restore': ([('UPDATE', MyPermanentModel)], []),
+    'queryset_restore': ([('UPDATE', MyPermanentModel)], []),
+    # Claims don't cascade
+    'claim': ([('UPDATE', MyPermanentModel)], []),
+    # Related aggregates are subqueries of a single SELECT, the first
+    # FROM is the one of the related table
+    'live_aggregates': ([('SELECT', PermanentInvoiceLine)], []),
+    'restore_on_create': (
+        [('SELECT', RestoreOnCreateModel), ('UPDATE', RestoreOnCreateModel)],
+        []
+    ),
+    'fk_traversal': (
+        [('SELECT', NonRemovableDepended)], [('SELECT', MyPermanentModel)]
+    ),
+    'fk_traversal_select_related': (
+        [('SELECT', NonRemovableDepended)], []
+    ),
+    # The marker of a multi-table inheritance chain lives in one table
+    'mti_delete': ([('UPDATE', PermanentParent)], []),
+    'mti_queryset_delete': (
+        [('SELECT', PermanentGrandChild), ('UPDATE', PermanentParent)], []
+    ),
+    'mti_instance_restore': ([('UPDATE', PermanentParent)], []),
+    'mti_queryset_restore': ([('UPDATE', PermanentParent)], []),
+}
+
+TABLE_RE = re.compile(r'^(?:UPDATE|.*?\b(?:FROM|INTO))\s+"?(\w+)"?', re.S)
+
+
+def statement_shape(sql):
+    """Return (statement, table) of a captured query."""
+    match = TABLE_RE.match(sql)
+    return sql.split()[0].upper(), match and match.group(1)
+
+
+class QueryBudgetTestCase(TestCase):
+    def assertBudget(self, name, n, func):
+        once, per_object = QUERY_BUDGETS[name]
+        expected = [
+            (statement, model._meta.db_table)
+            for statement, model in once + per_object * n
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        statements = [statement_shape(query['sql']) for query in ctx]
+        self.assertEqual(
+            statements, expected,
+            '%s with fan-out %d:\n%s' % (name, n, '\n'.join(
+                query['sql'] for query in ctx
+            ))
+        )
+
+    def test_single_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                obj = UniqueNamePermanent.objects.create(name=str(n))
+                self.assertBudget('single_delete', n, obj.delete)
+
+    def test_cascade_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                parent = MyPermanentModel.objects.create()
+                PermanentDepended.objects.bulk_create(
+                    PermanentDepended(dependence=parent) for _ in range(n)
+                )
+                self.assertBudget('cascade_delete', n, parent.delete)
+                self.assertFalse(
+                    PermanentDepended.objects.filter(
+                        dependence=parent
+                    ).exists()
+                )
+
+    def test_fast_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                UniqueNamePermanent.objects.bulk_create(
+                    UniqueNamePermanent(name='%d-%d' % (n, i))
+                    for i in range(n)
+                )
+                self.assertBudget(
+                    'fast_delete', n, UniqueNamePermanent.objects.all().delete
+                )
+
+    def test_queryset_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                MyPermanentModel.objects.bulk_create(
+                    MyPermanentModel() for _ in range(n)
+                )
+                self.assertBudget(
+                    'queryset_delete', n, MyPermanentModel.objects.all().delete
+                )
+
+    def test_instance_restore(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                obj = MyPermanentModel.objects.create(removed=now())
+                self.assertBudget('instance_restore', n, obj.restore)
+
+    def test_queryset_restore(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                MyPermanentModel.objects.bulk_create(
+                    MyPermanentModel(removed=now()) for _ in range(n)
+                )
+                self.assertBudget(
+                    'queryset_restore', n,
+                    MyPermanentModel.deleted_objects.all().restore
+                )
+
+    def test_claim(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                MyPermanentModel.objects.bulk_create(
+                    MyPermanentModel() for _ in range(n)
+                )
+                self.assertBudget(
+                    'claim', n, lambda: MyPermanentModel.objects.claim(n)
+                )
+                self.assertFalse(MyPermanentModel.objects.exists())
+
+    def test_live_aggregates(self):
+        from django_permanent.aggregates import LiveCount, LiveSum
+
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                invoice = PermanentInvoice.objects.create()
+                PermanentInvoiceLine.objects.bulk_create(
+                    PermanentInvoiceLine(invoice=invoice, amount=1)
+                    for _ in range(n)
+                )
+                queryset = PermanentInvoice.objects.annotate(
+                    count=LiveCount('lines'), total=LiveSum('lines__amount')
+                ).filter(pk=invoice.pk)
+                self.assertBudget(
+                    'live_aggregates', n,
+                    lambda: self.assertEqual(
+                        queryset.values_list('count', 'total').get(), (n, n)
+                    )
+                )
+
+    def test_restore_on_create(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                RestoreOnCreateModel.objects.create(
+                    name=str(n), removed=now()
+                )
+                self.assertBudget(
+                    'restore_on_create', n,
+                    lambda: RestoreOnCreateModel.objects.create(name=str(n))
+                )
+
+    def test_fk_traversal(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                parent = MyPermanentModel.objects.create(removed=now())
+                NonRemovableDepended.objects.bulk_create(
+                    NonRemovableDepended(dependence=parent, removed=now())
+                    for _ in range(n)
+                )
+                qs = NonRemovableDepended.deleted_objects.filter(
+                    dependence=parent
+                )
+                self.assertBudget(
+                    'fk_traversal', n,
+                    lambda: [obj.dependence for obj in qs.all()]
+                )
+                self.assertBudget(
+                    'fk_traversal_select_related', n,
+                    lambda: [
+                        obj.dependence
+                        for obj in qs.select_related('dependence')
+                    ]
+                )
+
+    def test_mti_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                obj = PermanentGrandChild.objects.create()
+                self.assertBudget('mti_delete', n, obj.delete)
+
+    def test_mti_queryset_delete(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                for _ in range(n):
+                    PermanentGrandChild.objects.create()
+                self.assertBudget(
+                    'mti_queryset_delete', n,
+                    PermanentGrandChild.objects.all().delete
+                )
+
+    def test_mti_instance_restore(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                obj = PermanentGrandChild.objects.create(removed=now())
+                self.assertBudget('mti_instance_restore', n, obj.restore)
+
+    def test_mti_queryset_restore(self):
+        for n in FAN_OUT:
+            with self.subTest(n=n):
+                for _ in range(n):
+                    PermanentGrandChild.objects.create(removed=now())
+                self.assertBudget(
+                    'mti_queryset_restore', n,
+                    PermanentGrandChild.deleted_objects.all().restore
+                )
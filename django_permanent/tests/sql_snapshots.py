@@ -0,0 +1,232 @@
+import re
+
+from django.test import TestCase
+from django.utils.timezone import now
+
+from django_permanent import settings
+from django_permanent.related import as_of_context, show_all_context
+from django_permanent.tests.test_app.models import (
+    CountedChild,
+    M2MFrom,
+    M2MTo,
+    MyPermanentModel,
+    NonRemovableNullableDepended,
+    PermanentChild,
+    PermanentChildHolder,
+    PermanentDepended,
+    PermanentGrandChild,
+    RegularModel,
+)
+
+
+PREFIX = 'django_permanent_'
+
+KEYWORD_RE = re.compile(r' ON \(| WHERE ')
+# Live rows of the dual-column mode are matched by NOT "flag"
+PREDICATE_RE = re.compile(
+    r'(NOT )?(?:"(\w+)"|\b(U\d+))\."(?:%s)"(?: (IS NULL|>))?' % '|'.join(
+        settings.MARKER_FIELDS
+    )
+)
+
+
+def visibility_predicates(queryset):
+    """
+    Return the (clause, table, lookup) of every marker predicate in the
+    SQL of the queryset, where clause is the ON or WHERE keyword
+    preceding it.
+    """
+    sql = str(queryset.query)
+    keywords = [(m.start(), m.group().strip(' (')) for m in
+                KEYWORD_RE.finditer(sql)]
+    predicates = []
+    for match in PREDICATE_RE.finditer(sql):
+        negated, table, alias, lookup = match.groups()
+        if lookup is None:
+            if not negated:
+                # Selected column
+                continue
+            lookup = 'IS NULL'
+        clause = [word for start, word in keywords if start < match.start()]
+        table = table or alias
+        predicates.append((
+            clause[-1] if clause else None,
+            table[len(PREFIX):] if table.startswith(PREFIX) else table,
+            lookup,
+        ))
+    return predicates
+
+
+# Every joined table is restricted once, in the ON clause of its join.
+# The base table is restricted by the manager in the WHERE clause.
+SNAPSHOTS = {
+    'forward': (
+        lambda: PermanentDepended.objects.filter(dependence__name='x'),
+        [
+            ('ON', 'mypermanentmodel', 'IS NULL'),
+            ('WHERE', 'permanentdepended', 'IS NULL'),
+        ],
+    ),
+    'reverse': (
+        lambda: MyPermanentModel.objects.filter(permanentdepended__id=1),
+        [
+            ('ON', 'permanentdepended', 'IS NULL'),
+            ('WHERE', 'mypermanentmodel', 'IS NULL'),
+        ],
+    ),
+    'select_related': (
+        lambda: PermanentDepended.objects.select_related('dependence'),
+        [
+            ('ON', 'mypermanentmodel', 'IS NULL'),
+            ('WHERE', 'permanentdepended', 'IS NULL'),
+        ],
+    ),
+    'nullable_select_related': (
+        lambda: NonRemovableNullableDepended.objects.select_related(
+            'dependence'
+        ),
+        [
+            ('ON', 'mypermanentmodel', 'IS NULL'),
+            ('WHERE', 'nonremovablenullabledepended', 'IS NULL'),
+        ],
+    ),
+    'chained': (
+        lambda: CountedChild.objects.filter(
+            parent__countednullablechild__id=1
+        ),
+        [
+            ('ON', 'countedparent', 'IS NULL'),
+            ('ON', 'countednullablechild', 'IS NULL'),
+            ('WHERE', 'countedchild', 'IS NULL'),
+        ],
+    ),
+    'm2m': (
+        lambda: M2MTo.objects.filter(m2m_from__id=1),
+        [('ON', 'permanentm2mthrough', 'IS NULL')],
+    ),
+    'm2m_reverse': (
+        lambda: M2MFrom.objects.filter(m2mto__id=1),
+        [('ON', 'permanentm2mthrough', 'IS NULL')],
+    ),
+    'exclude': (
+        lambda: MyPermanentModel.objects.exclude(permanentdepended__id=1),
+        [
+            ('WHERE', 'mypermanentmodel', 'IS NULL'),
+            ('WHERE', 'U1', 'IS NULL'),
+        ],
+    ),
+    'deleted': (
+        lambda: PermanentDepended.deleted_objects.filter(
+            dependence__name='x'
+        ),
+        [
+            ('ON', 'mypermanentmodel', 'IS NULL'),
+            ('WHERE', 'permanentdepended', 'IS NULL'),
+        ],
+    ),
+    'mti': (
+        lambda: PermanentGrandChild.deleted_objects.all(),
+        [('WHERE', 'permanentparent', 'IS NULL')],
+    ),
+    # Joined multi-table inheritance children are restricted in the ON
+    # clause of their join by a subquery of the parent table holding the
+    # marker, whose WHERE is the one reported. Parent link joins aren't
+    # restricted again.
+    'mti_forward': (
+        lambda: PermanentChildHolder.objects.filter(child__color='red'),
+        [('WHERE', 'permanentparent', 'IS NULL')],
+    ),
+    'mti_forward_parent_field': (
+        lambda: PermanentChildHolder.objects.filter(child__name='x'),
+        [('WHERE', 'permanentparent', 'IS NULL')],
+    ),
+    'mti_select_related': (
+        lambda: PermanentChildHolder.objects.select_related('child'),
+        [('WHERE', 'permanentparent', 'IS NULL')],
+    ),
+    'mti_reverse': (
+        lambda: RegularModel.objects.filter(owned_children__name='x'),
+        [('WHERE', 'permanentparent', 'IS NULL')],
+    ),
+}
+
+MTI_JOIN_RE = re.compile(
+    r'JOIN "%s(\w+)" ON \([^()]*AND \("%s\1"\."\w+" IN \(SELECT ' % (
+        PREFIX, PREFIX
+    )
+)
+
+
+class SQLSnapshotTestCase(TestCase):
+    def test_snapshots(self):
+        for name, (queryset, expected) in SNAPSHOTS.items():
+            with self.subTest(name):
+                self.assertEqual(visibility_predicates(queryset()), expected)
+
+    def test_mti_join(self):
+        for name, child in (
+            ('mti_forward', 'permanentchild'),
+            ('mti_forward_parent_field', 'permanentchild'),
+            ('mti_select_related', 'permanentchild'),
+            ('mti_reverse', 'permanentownedchild'),
+        ):
+            with self.subTest(name):
+                sql = str(SNAPSHOTS[name][0]().query)
+                self.assertEqual(MTI_JOIN_RE.findall(sql), [child])
+        self.assertIn('LEFT OUTER JOIN', str(
+            PermanentChildHolder.objects.select_related('child').query
+        ))
+
+    def test_nullable_join_keeps_outer_join(self):
+        sql = str(NonRemovableNullableDepended.objects.select_related(
+            'dependence'
+        ).query)
+        self.assertIn('LEFT OUTER JOIN', sql)
+
+    def test_show_all(self):
+        with show_all_context():
+            self.assertEqual(visibility_predicates(
+                PermanentDepended.all_objects.filter(dependence__name='x')
+            ), [])
+
+    def test_as_of(self):
+        with as_of_context(now()):
+            predicates = visibility_predicates(
+                PermanentDepended.objects.filter(dependence__name='x')
+            )
+        self.assertEqual(predicates, [
+            ('ON', 'mypermanentmodel', 'IS NULL'),
+            ('ON', 'mypermanentmodel', '>'),
+            ('WHERE', 'permanentdepended', 'IS NULL'),
+        ])
+
+    def test_mti_results(self):
+        deleted = PermanentChild.objects.create(name='x', color='red')
+        live = PermanentChild.objects.create(name='x', color='red')
+        for child in (deleted, live):
+            PermanentChildHolder.objects.create(child=child)
+        deleted.delete()
+        for name in ('mti_forward', 'mti_forward_parent_field'):
+            with self.subTest(name):
+                self.assertEqual(
+                    [holder.child_id for holder in SNAPSHOTS[name][0]()],
+                    [live.pk]
+                )
+
+    def test_results(self):
+        parent = MyPermanentModel.objects.create(name='x')
+        PermanentDepended.objects.create(dependence=parent)
+        deleted = PermanentDepended.objects.create(dependence=parent)
+        deleted.delete()
+        self.assertEqual(
+            list(MyPermanentModel.objects.filter(
+                permanentdepended__isnull=False
+            )),
+            [parent]
+        )
+        self.assertEqual(
+            list(PermanentDepended.deleted_objects.filter(
+                dependence__name='x'
+            )),
+            [deleted]
+        )
@@ -1,3 +1,7 @@
+from django.contrib.contenttypes.fields import (
+    GenericForeignKey, GenericRelation
+)
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models import Model
 
@@ -118,3 +122,147 @@ class LazyReferencePermanent(PermanentModel, BaseTestModel):
     regular = models.ForeignKey(
         'RegularModel', on_delete=models.SET_NULL, null=True
     )
+
+
+class UniqueNamePermanent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'],
+                condition=models.Q(removed=None),
+                name='unique_live_name',
+            ),
+        ]
+
+
+class TimestampedPermanent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+    created = models.DateTimeField()
+
+    class Permanent:
+        created_field = 'created'
+
+
+class TimestampedDepended(PermanentModel, BaseTestModel):
+    dependence = models.ForeignKey(
+        TimestampedPermanent, on_delete=models.CASCADE
+    )
+    created = models.DateTimeField()
+
+    class Permanent:
+        created_field = 'created'
+
+
+class DeferringPermanent(PermanentModel, BaseTestModel):
+    class Permanent:
+        defer_field_updates = True
+
+
+class DeferredNullableDepended(PermanentModel, BaseTestModel):
+    dependence = models.ForeignKey(
+        DeferringPermanent, on_delete=models.SET_NULL, null=True
+    )
+
+
+class CachedPermanent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+
+    class Permanent:
+        cache = True
+
+
+class TaggedPermanent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+    created = models.DateTimeField(null=True)
+    tags = models.ManyToManyField(RegularModel)
+
+
+class CountedParent(PermanentModel, BaseTestModel):
+    live_children = models.PositiveIntegerField(default=0)
+    live_nullable_children = models.PositiveIntegerField(default=0)
+
+
+class CountedChild(PermanentModel, BaseTestModel):
+    parent = models.ForeignKey(CountedParent, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, blank=True, null=True)
+
+    class Permanent:
+        counters = {'parent': 'live_children'}
+        restore_on_create = True
+
+
+class CountedNullableChild(PermanentModel, BaseTestModel):
+    parent = models.ForeignKey(
+        CountedParent, on_delete=models.SET_NULL, null=True
+    )
+
+    class Permanent:
+        counters = {'parent': 'live_nullable_children'}
+
+
+class PermanentParent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+
+
+class PermanentChild(PermanentParent):
+    color = models.CharField(max_length=255, blank=True, null=True)
+
+
+class PermanentGrandChild(PermanentChild):
+    size = models.IntegerField(default=0)
+
+
+class PermanentChildHolder(BaseTestModel):
+    # Doesn't take part in the cascade plans of the inheritance chain
+    child = models.ForeignKey(
+        PermanentChild, on_delete=models.DO_NOTHING, null=True,
+        db_constraint=False, related_name='holders'
+    )
+
+
+class PermanentOwnedChild(PermanentParent):
+    owner = models.ForeignKey(
+        RegularModel, on_delete=models.SET_NULL, null=True,
+        related_name='owned_children'
+    )
+
+
+class PermanentComment(PermanentModel, BaseTestModel):
+    content_type = models.ForeignKey(ContentType, on_delete=models.PROTECT)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey()
+    text = models.CharField(max_length=255, blank=True, null=True)
+
+
+class CommentedPermanent(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+    comments = GenericRelation(
+        PermanentComment, related_query_name='commented_permanent'
+    )
+
+
+class CommentedRegular(BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+    comments = GenericRelation(
+        PermanentComment, related_query_name='commented_regular'
+    )
+
+
+class PermanentInvoice(PermanentModel, BaseTestModel):
+    name = models.CharField(max_length=255, blank=True, null=True)
+
+
+class PermanentInvoiceLine(PermanentModel, BaseTestModel):
+    invoice = models.ForeignKey(
+        PermanentInvoice, on_delete=models.CASCADE, related_name='lines'
+    )
+    amount = models.IntegerField(default=0)
+
+
+class PermanentInvoicePayment(PermanentModel, BaseTestModel):
+    invoice = models.ForeignKey(
+        PermanentInvoice, on_delete=models.CASCADE, related_name='payments'
+    )
+    amount = models.IntegerField(default=0)
@@ -9,17 +9,29 @@ import django.conf
 
 DEFAULT_SETTINGS = dict(
     INSTALLED_APPS=(
+        'django.contrib.contenttypes',
         'django_permanent',
+        'django_permanent.purge',
     ),
     DATABASES={
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-        }
+        },
+        # A second shard for the operations across database aliases
+        'other': {
+            'ENGINE': 'django.db.backends.sqlite3',
+        },
     },
     MIDDLEWARE_CLASSES=[],
     DEFAULT_AUTO_FIELD='django.db.models.BigAutoField',
 )
 
+# PERMANENT_FLAG_FIELD=is_removed runs the suite in dual-column mode
+if os.environ.get('PERMANENT_FLAG_FIELD'):
+    DEFAULT_SETTINGS['PERMANENT_FLAG_FIELD'] = os.environ[
+        'PERMANENT_FLAG_FIELD'
+    ]
+
 
 def runtests(*test_args):
     if not django.conf.settings.configured: